@@ -0,0 +1,39 @@
+import argparse
+import asyncio
+import json
+import sys
+
+from bench.replay import IDLE_SECONDS, replay
+from bench.scenarios import SCENARIOS
+from bench.session import Session
+
+
+async def run_suite(names, rate: float, idle_seconds: float) -> list:
+    reports = []
+    for name in names:
+        report = await replay(name, Session(SCENARIOS[name]()), rate=rate, idle_seconds=idle_seconds)
+        print(report, flush=True)
+        reports.append(report)
+    return reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description="replay every generated scenario against main.py")
+    parser.add_argument("scenarios", nargs="*", help=f"any of {', '.join(sorted(SCENARIOS))} (default: all)")
+    parser.add_argument("--rate", type=float, default=0, help="1 replays in real time, 0 as fast as possible")
+    parser.add_argument("--idle", type=float, default=IDLE_SECONDS, help="seconds without webhooks before stopping")
+    parser.add_argument("--json", help="write the reports as JSON here")
+    args = parser.parse_args()
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(sorted(unknown))}")
+
+    reports = asyncio.run(run_suite(args.scenarios or sorted(SCENARIOS), args.rate, args.idle))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump([report.as_dict() for report in reports], f, indent=2)
+    if not all(report.ok for report in reports):
+        sys.exit(1)
+
+
+main()
@@ -0,0 +1,113 @@
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import List
+
+from bench.scenarios import AUCTION_HOUSE_ADDRESS, CREATE_BID_SELECTOR, address, topic, tx_hash
+from bench.stubs import selector
+from helpers import fastjson
+from helpers.events import selector_prefilter
+from helpers.w3 import ChainClient
+
+SUBSCRIPTION_ID = "0x9ce59a13059e417087c02d3236a0b1cc"
+END_SUBSCRIPTION_ID = "0xend"
+NOISE_SELECTORS = [selector("transfer(address,uint256)"), selector("approve(address,uint256)"), "0x5ae401dc"]
+
+
+def pending_frames(count: int, relevant: float, seed: int = 1) -> List[str]:
+    rng = random.Random(seed)
+    frames = []
+    for index in range(count):
+        if rng.random() < relevant:
+            data = CREATE_BID_SELECTOR + topic(700)[2:]
+        else:
+            # unrelated calls carry much larger calldata than a bid
+            data = rng.choice(NOISE_SELECTORS) + "ab" * rng.randint(64, 1024)
+        transaction = {
+            "blockHash": None,
+            "blockNumber": None,
+            "from": address(f"sender-{index % 500}"),
+            "gas": "0x3d090",
+            "gasPrice": "0x2540be400",
+            "hash": tx_hash(f"mempool-{index}"),
+            "input": data,
+            "nonce": hex(index),
+            "to": AUCTION_HOUSE_ADDRESS,
+            "transactionIndex": None,
+            "value": hex(10**18),
+            "type": "0x2",
+            "v": "0x1",
+            "r": tx_hash(f"r-{index}"),
+            "s": tx_hash(f"s-{index}"),
+        }
+        params = {"result": transaction, "subscription": SUBSCRIPTION_ID}
+        frames.append(json.dumps({"jsonrpc": "2.0", "method": "eth_subscription", "params": params}))
+    return frames
+
+
+class FrameSource:
+    # stands in for the websocket: hands out the frames, then an end marker, then waits forever
+    def __init__(self, frames: List[str]):
+        end = {"jsonrpc": "2.0", "method": "eth_subscription", "params": {"subscription": END_SUBSCRIPTION_ID}}
+        self._frames = iter(frames + [json.dumps(end)])
+
+    async def recv(self) -> str:
+        frame = next(self._frames, None)
+        if frame is None:
+            await asyncio.Future()
+        return frame
+
+
+async def measure(frames: List[str], use_orjson: bool, use_prefilter: bool) -> float:
+    orjson = fastjson.orjson
+    fastjson.orjson = orjson if use_orjson else None
+    client = ChainClient("ws://127.0.0.1")
+    if use_prefilter:
+        client.prefilters[SUBSCRIPTION_ID] = selector_prefilter([CREATE_BID_SELECTOR])
+
+    notifications = asyncio.Queue()
+    started_at = time.perf_counter()
+    reader = asyncio.ensure_future(client._reader(FrameSource(frames), notifications))
+    try:
+        while True:
+            message = await notifications.get()
+            if message.get("params").get("subscription") == END_SUBSCRIPTION_ID:
+                break
+        return time.perf_counter() - started_at
+    finally:
+        reader.cancel()
+        await asyncio.gather(reader, return_exceptions=True)
+        fastjson.orjson = orjson
+
+
+async def run(count: int, relevant: float, rounds: int):
+    frames = pending_frames(count, relevant)
+    size = sum(len(frame) for frame in frames) / len(frames)
+    print(f"{count} pending transaction frames, {relevant:.0%} relevant, {size:.0f} bytes on average")
+
+    modes = [("stdlib json, every frame parsed", False, False), ("stdlib json, prefiltered", False, True)]
+    if fastjson.orjson is not None:
+        modes += [("orjson, every frame parsed", True, False), ("orjson, prefiltered", True, True)]
+    else:
+        print("orjson is not installed, skipping the fast JSON backend")
+
+    baseline = None
+    for name, use_orjson, use_prefilter in modes:
+        elapsed = min([await measure(frames, use_orjson, use_prefilter) for _ in range(rounds)])
+        baseline = baseline or elapsed
+        print(f"  {name:<34} {count / elapsed:>10.0f} frames/s  ({baseline / elapsed:.1f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="measure websocket ingestion of a busy mempool stream")
+    parser.add_argument("--frames", type=int, default=50_000)
+    parser.add_argument("--relevant", type=float, default=0.05, help="share of frames that call createBid")
+    parser.add_argument("--rounds", type=int, default=3, help="best of this many runs per mode")
+    args = parser.parse_args()
+    asyncio.run(run(args.frames, args.relevant, args.rounds))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+import argparse
+import asyncio
+import json
+import logging
+import time
+from typing import Optional
+
+import aiohttp
+import websockets
+from aiohttp import web
+
+import settings
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+FORWARDED_HEADERS = ["If-None-Match", "If-Modified-Since", "Content-Type"]
+
+
+class SessionRecorder:
+    # sits between the listener and its providers, writing every frame and HTTP exchange to a session file
+    def __init__(
+        self,
+        out_path: str,
+        upstream_url: str,
+        subgraph_url: str,
+        notes_url: str,
+        webhook_url: Optional[str] = None,
+    ):
+        self.out_path = out_path
+        self.upstream_url = upstream_url
+        self.subgraph_url = subgraph_url
+        self.notes_url = notes_url
+        self.webhook_url = webhook_url
+        self.started_at = time.monotonic()
+        self.recorded = 0
+        self._file = None
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def write(self, entry: dict):
+        entry["t"] = round(time.monotonic() - self.started_at, 4)
+        self._file.write(json.dumps(entry) + "\n")
+        self._file.flush()
+        self.recorded += 1
+
+    async def _pump(self, source, destination, direction: str):
+        async for frame in source:
+            self.write({"type": "ws", "direction": direction, "frame": frame})
+            await destination.send(frame)
+
+    async def _proxy_websocket(self, client, path=None):
+        logger.info(f"listener connected, opening upstream connection to {self.upstream_url}")
+        async with websockets.connect(self.upstream_url, max_size=None) as upstream:
+            pumps = [
+                asyncio.ensure_future(self._pump(client, upstream, "out")),
+                asyncio.ensure_future(self._pump(upstream, client, "in")),
+            ]
+            _, pending = await asyncio.wait(pumps, return_when=asyncio.FIRST_COMPLETED)
+            for pump in pending:
+                pump.cancel()
+        logger.info("listener disconnected")
+
+    async def _forward(self, request: web.Request, service: str, url: Optional[str]) -> web.Response:
+        body = await request.text()
+        if url is None:
+            status, text, headers = 200, "{}", {}
+        else:
+            request_headers = {name: request.headers[name] for name in FORWARDED_HEADERS if name in request.headers}
+            async with self._session.request(request.method, url, data=body, headers=request_headers) as response:
+                status, text = response.status, await response.text()
+                headers = {
+                    name: response.headers[name] for name in ["ETag", "Last-Modified"] if name in response.headers
+                }
+
+        self.write(
+            {
+                "type": "http",
+                "service": service,
+                "method": request.method,
+                "path": request.path,
+                "request": body,
+                "status": status,
+                "etag": headers.get("ETag"),
+                "response": text,
+            }
+        )
+        return web.Response(status=status, text=text, content_type="application/json", headers=headers)
+
+    async def _subgraph(self, request: web.Request) -> web.Response:
+        return await self._forward(request, "subgraph", self.subgraph_url)
+
+    async def _notes(self, request: web.Request) -> web.Response:
+        return await self._forward(request, "notes", f"{self.notes_url}{request.path}")
+
+    async def _webhook(self, request: web.Request) -> web.Response:
+        return await self._forward(request, "webhook", self.webhook_url)
+
+    async def run(self, ws_port: int, http_port: int, host: str = "127.0.0.1"):
+        self._file = open(self.out_path, "a")
+        self._session = aiohttp.ClientSession()
+
+        app = web.Application()
+        app.router.add_post("/subgraph", self._subgraph)
+        app.router.add_get("/notes/{noun_id}", self._notes)
+        app.router.add_post("/hook", self._webhook)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, host, http_port).start()
+
+        try:
+            async with websockets.serve(self._proxy_websocket, host, ws_port, max_size=None):
+                logger.info(
+                    f"recording to {self.out_path}. run the listener with:\n"
+                    f"  W3_WS_PROVIDER_URL=ws://{host}:{ws_port} NS_WEBHOOK_URL=http://{host}:{http_port}/hook "
+                    f"NOUNS_SUBGRAPH_URL=http://{host}:{http_port}/subgraph NOUN_O_CLOCK_URL=http://{host}:{http_port} "
+                    f"python main.py"
+                )
+                await asyncio.Future()
+        finally:
+            logger.info(f"recorded {self.recorded} entries")
+            await runner.cleanup()
+            await self._session.close()
+            self._file.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="record a live listener session for bench.replay")
+    parser.add_argument("out", help="session file to append to")
+    parser.add_argument("--upstream", default=settings.W3_WS_PROVIDER_URL, help="websocket provider to proxy")
+    parser.add_argument("--subgraph-url", default=settings.NOUNS_SUBGRAPH_URL)
+    parser.add_argument("--notes-url", default=settings.NOUN_O_CLOCK_URL)
+    parser.add_argument("--webhook-url", default=None, help="forward webhook posts here (default: only record them)")
+    parser.add_argument("--ws-port", type=int, default=8765)
+    parser.add_argument("--http-port", type=int, default=8766)
+    args = parser.parse_args()
+
+    recorder = SessionRecorder(args.out, args.upstream, args.subgraph_url, args.notes_url, args.webhook_url)
+    try:
+        asyncio.run(recorder.run(args.ws_port, args.http_port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
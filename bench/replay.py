@@ -0,0 +1,276 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import re
+import signal
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict, deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from web3 import Web3
+
+from bench.scenarios import AUCTION_BID_TOPIC, CREATE_BID_SELECTOR, SCENARIOS
+from bench.session import Session, read_session
+from bench.stubs import StubChain, StubServices, decode
+from helpers.images import decode_token_metadata, prepare_image
+
+logging.basicConfig(level=logging.INFO)
+logging.getLogger("websockets").setLevel(logging.WARNING)
+logger = logging.getLogger(__name__)
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TOKEN_URI_PREFIX = "data:application/json;base64,"
+AMOUNT_PATTERN = re.compile(r"Ξ(\d+\.\d\d)")
+OWNER_PATTERN = re.compile(r"(\S+) is the owner of noun (\d+) at\s+Ξ(\d+\.\d\d)")
+IDLE_SECONDS = 5
+TIMEOUT_SECONDS = 600
+
+
+def bid_amount(key: tuple, result: dict) -> Optional[str]:
+    # the amount a bid message will show, to match webhook posts back to the notification they announce
+    if key == ("logs", AUCTION_BID_TOPIC):
+        value = int(result.get("data", "0x")[66:130] or "0", 16)
+    elif key == ("alchemy_pendingTransactions",) and (result.get("input") or "").startswith(CREATE_BID_SELECTOR):
+        value = int(result.get("value") or "0x0", 16)
+    else:
+        return None
+
+    return f"{Web3.fromWei(value, 'ether'):.2f}" if value else None
+
+
+def message_text(message: dict) -> str:
+    return " ".join(child.get("text", "") for block in message.get("blocks", []) for child in block.get("children", []))
+
+
+def message_amounts(message: dict) -> List[str]:
+    return AMOUNT_PATTERN.findall(message_text(message))
+
+
+def expected_owners(chain: StubChain) -> Optional[List[Tuple[str, str, str]]]:
+    # generated scenarios know their auction: once the replayed blocks pass its end, one message names the winner
+    if "auction" not in chain.session.meta:
+        return None
+
+    synthetic = chain.synthetic
+    auction = synthetic.auction
+    if int(synthetic.header.get("timestamp"), 16) < auction.get("end_time"):
+        return []
+
+    bidder = Web3.toChecksumAddress(auction.get("bidder"))
+    name = synthetic.ens.get(bidder.lower()) or f"{bidder[:5]}...{bidder[-4:]}"
+    amount = f"{Web3.fromWei(int(auction.get('wei_amount')), 'ether'):.2f}"
+    return [(name, str(auction.get("noun_id")), amount)]
+
+
+def seed_image_cache(session: Session, path: str):
+    # recorded tokenURI answers are pre-uploaded so a replayed new auction never reaches cloudinary
+    uploads = {}
+    for responses in session.responses.values():
+        for response in responses:
+            try:
+                (token_uri,) = decode(["string"], response.get("result") or "0x")
+            except Exception:
+                continue
+            if not token_uri.startswith(TOKEN_URI_PREFIX):
+                continue
+
+            content_hash, _ = prepare_image(decode_token_metadata(token_uri).get("image"))
+            uploads[content_hash] = f"https://example.invalid/{content_hash}.png"
+
+    with open(path, "w") as f:
+        json.dump(uploads, f)
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+class Report:
+    def __init__(self, name: str, chain: StubChain, services: StubServices, exit_code: Optional[int]):
+        self.name = name
+        self.exit_code = exit_code
+        self.notifications = len(chain.sent)
+        self.webhooks = len(services.webhooks)
+        self.rpc_calls = Counter(chain.calls)
+        self.http_calls = Counter(services.calls)
+
+        sent_amounts: Dict[str, Deque[float]] = defaultdict(deque)
+        for sent_at, key, result in chain.sent:
+            amount = bid_amount(key, result)
+            if amount is not None:
+                sent_amounts[amount].append(sent_at)
+
+        self.latencies = []
+        for received_at, message in services.webhooks:
+            # the settlement message quotes the top bids again
+            if OWNER_PATTERN.search(message_text(message)):
+                continue
+            for amount in message_amounts(message):
+                if sent_amounts.get(amount):
+                    self.latencies.append(received_at - sent_amounts[amount].popleft())
+
+        self.problems: List[str] = []
+        if exit_code not in (None, 0, -signal.SIGTERM):
+            self.problems.append(f"listener exited with {exit_code}")
+        self.owners = [
+            match.groups()
+            for _, message in services.webhooks
+            for match in [OWNER_PATTERN.search(message_text(message))]
+            if match is not None
+        ]
+        expected = expected_owners(chain)
+        if expected is not None and self.owners != expected:
+            self.problems.append(f"expected finalize message(s) {expected}, got {self.owners}")
+
+        first_sent = chain.sent[0][0] if chain.sent else None
+        last_seen = max(filter(None, [chain.finished_at, services.last_webhook_at]), default=None)
+        self.duration = last_seen - first_sent if first_sent is not None and last_seen is not None else 0
+
+    @property
+    def ok(self) -> bool:
+        return not self.problems
+
+    @property
+    def throughput(self) -> float:
+        return self.notifications / self.duration if self.duration else 0
+
+    def as_dict(self) -> dict:
+        return {
+            "scenario": self.name,
+            "exit_code": self.exit_code,
+            "notifications": self.notifications,
+            "webhooks": self.webhooks,
+            "duration_seconds": self.duration,
+            "events_per_second": self.throughput,
+            "matched_bids": len(self.latencies),
+            "latency_p50_seconds": percentile(self.latencies, 0.5),
+            "latency_p99_seconds": percentile(self.latencies, 0.99),
+            "latency_max_seconds": max(self.latencies, default=None),
+            "rpc_calls": dict(self.rpc_calls),
+            "http_calls": dict(self.http_calls),
+            "problems": self.problems,
+        }
+
+    def __str__(self) -> str:
+        def seconds(value: Optional[float]) -> str:
+            return "-" if value is None else f"{value * 1000:.1f}ms"
+
+        rpc_total = sum(count for method, count in self.rpc_calls.items() if method != "eth_subscribe")
+        lines = [
+            f"{self.name}: {self.notifications} notifications in {self.duration:.2f}s "
+            f"({self.throughput:.1f} events/s), {self.webhooks} webhook posts",
+            f"  bid latency (first notification -> webhook), {len(self.latencies)} matched: "
+            f"p50 {seconds(percentile(self.latencies, 0.5))}, p99 {seconds(percentile(self.latencies, 0.99))}, "
+            f"max {seconds(max(self.latencies, default=None))}",
+            f"  rpc: {rpc_total} calls ({rpc_total / max(self.notifications, 1):.2f}/notification) "
+            + " ".join(f"{method}={count}" for method, count in sorted(self.rpc_calls.items())),
+            "  http: " + (" ".join(f"{name}={count}" for name, count in sorted(self.http_calls.items())) or "none"),
+        ]
+        lines.extend(f"  FAILED: {problem}" for problem in self.problems)
+        return "\n".join(lines)
+
+
+def listener_env(chain: StubChain, services: StubServices, **overrides) -> dict:
+    # main.py talking to the stubs only, with nothing persisted between runs
+    return dict(
+        os.environ,
+        W3_WS_PROVIDER_URL=chain.url,
+        W3_WS_EXTRA_PROVIDER_URLS="",
+        NS_WEBHOOK_URL=f"{services.url}/hook",
+        NOUNS_SUBGRAPH_URL=f"{services.url}/subgraph",
+        NOUN_O_CLOCK_URL=services.url,
+        DEDUP_DB_PATH="",
+        BLOCK_CURSOR_PATH="",
+        METRICS_PORT="0",
+        **overrides,
+    )
+
+
+async def start_listener(env: dict, log_file) -> asyncio.subprocess.Process:
+    return await asyncio.create_subprocess_exec(
+        sys.executable, "main.py", cwd=ROOT_DIR, env=env, stdout=log_file, stderr=log_file
+    )
+
+
+async def stop_listener(process: asyncio.subprocess.Process):
+    if process.returncode is None:
+        process.send_signal(signal.SIGTERM)
+        try:
+            await asyncio.wait_for(process.wait(), timeout=10)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+
+
+async def replay(
+    name: str,
+    session: Session,
+    rate: float = 0,
+    idle_seconds: float = IDLE_SECONDS,
+    timeout_seconds: float = TIMEOUT_SECONDS,
+    log_path: Optional[str] = None,
+) -> Report:
+    chain, services = StubChain(session, rate=rate), StubServices(session)
+    await chain.start()
+    await services.start()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        image_cache_path = os.path.join(tmp_dir, "images.json")
+        seed_image_cache(session, image_cache_path)
+        env = listener_env(chain, services, IMAGE_CACHE_PATH=image_cache_path)
+
+        log_path = log_path or os.path.join(tmp_dir, "listener.log")
+        with open(log_path, "w") as log_file:
+            process = await start_listener(env, log_file)
+            started_at = time.monotonic()
+            while process.returncode is None and time.monotonic() - started_at < timeout_seconds:
+                await asyncio.sleep(0.1)
+                if chain.finished_at is None:
+                    continue
+                # done once everything was replayed and the webhook went quiet
+                last_activity = max(filter(None, [chain.finished_at, services.last_webhook_at]))
+                if time.monotonic() - last_activity > idle_seconds:
+                    break
+
+            await stop_listener(process)
+
+    await chain.close()
+    await services.close()
+    return Report(name, chain, services, process.returncode)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="replay a recorded session or a scenario against main.py")
+    parser.add_argument("session", nargs="?", help="session file from bench.record")
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), help="generated scenario to replay instead")
+    parser.add_argument("--rate", type=float, default=0, help="1 replays at recorded speed, 0 as fast as possible")
+    parser.add_argument("--idle", type=float, default=IDLE_SECONDS, help="seconds without webhooks before stopping")
+    parser.add_argument("--log", help="write the listener output here")
+    parser.add_argument("--json", help="write the report as JSON here")
+    args = parser.parse_args()
+
+    if args.scenario:
+        name, entries = args.scenario, SCENARIOS[args.scenario]()
+    elif args.session:
+        name, entries = os.path.basename(args.session), read_session(args.session)
+    else:
+        parser.error("pass a session file or --scenario")
+
+    report = asyncio.run(replay(name, Session(entries), rate=args.rate, idle_seconds=args.idle, log_path=args.log))
+    print(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report.as_dict(), f, indent=2)
+    if not report.ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
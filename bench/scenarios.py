@@ -0,0 +1,200 @@
+import itertools
+import json
+import math
+from typing import Callable, Dict, List, Optional
+
+from web3 import Web3
+
+from bench.stubs import AUCTION_BID_TOPIC, AUCTION_EXTENDED_TOPIC, encode, selector
+
+AUCTION_HOUSE_ADDRESS = "0x830BD73E4184ceF73443C15111a1DF14e495C706"
+CREATE_BID_SELECTOR = selector("createBid(uint256)")
+
+BLOCK_SECONDS = 12
+TIME_BUFFER_SECONDS = 300
+CHAIN_START_TIME = 1_700_000_000
+CHAIN_START_BLOCK = 18_000_000
+
+
+def address(seed: str) -> str:
+    return Web3.toChecksumAddress(Web3.keccak(text=seed)[-20:])
+
+
+def tx_hash(seed: str) -> str:
+    return Web3.keccak(text=seed).hex()
+
+
+def topic(value: int) -> str:
+    return "0x" + value.to_bytes(32, "big").hex()
+
+
+class ScenarioBuilder:
+    def __init__(self, noun_id: int, end_in_seconds: int, auction_house: str = AUCTION_HOUSE_ADDRESS):
+        self.noun_id = noun_id
+        self.auction_house = auction_house
+        self.end_time = CHAIN_START_TIME + end_in_seconds
+        self.block_number = CHAIN_START_BLOCK
+        self.entries: List[dict] = []
+        self.notes: Dict[str, str] = {}
+        self.ens: Dict[str, str] = {}
+        self._request_ids = itertools.count(1)
+        self._subscriptions: Dict[str, str] = {}
+        self._nonces: Dict[str, int] = {}
+        self._meta = {
+            "type": "meta",
+            "auction": {
+                "noun_id": noun_id,
+                "wei_amount": 0,
+                "start_time": self.end_time - 86_400,
+                "end_time": self.end_time,
+                "bidder": "0x0000000000000000000000000000000000000000",
+                "settled": False,
+            },
+            "block": self.header(0),
+        }
+
+    def header(self, t: float) -> dict:
+        number = self.block_number
+        return {"number": hex(number), "timestamp": hex(CHAIN_START_TIME + int(t)), "hash": tx_hash(f"block-{number}")}
+
+    def notify(self, t: float, params: list, result: dict):
+        name = json.dumps(params)
+        subscription_id = self._subscriptions.get(name)
+        if subscription_id is None:
+            request_id = next(self._request_ids)
+            subscription_id = self._subscriptions[name] = hex(request_id)
+            request = {"jsonrpc": "2.0", "id": request_id, "method": "eth_subscribe", "params": params}
+            self.entries.append({"t": 0, "type": "ws", "direction": "out", "frame": json.dumps(request)})
+            response = {"jsonrpc": "2.0", "id": request_id, "result": subscription_id}
+            self.entries.append({"t": 0, "type": "ws", "direction": "in", "frame": json.dumps(response)})
+
+        params = {"subscription": subscription_id, "result": result}
+        frame = {"jsonrpc": "2.0", "method": "eth_subscription", "params": params}
+        self.entries.append({"t": round(t, 4), "type": "ws", "direction": "in", "frame": json.dumps(frame)})
+
+    def new_head(self, t: float):
+        self.block_number += 1
+        self.notify(t, ["newHeads"], self.header(t))
+
+    def log(self, t: float, event_topic: str, data: str, tx: str, log_index: int):
+        log = {
+            "address": self.auction_house,
+            "topics": [event_topic, topic(self.noun_id)],
+            "data": data,
+            "blockNumber": hex(self.block_number),
+            "blockHash": tx_hash(f"block-{self.block_number}"),
+            "transactionHash": tx,
+            "transactionIndex": hex(log_index),
+            "logIndex": hex(log_index),
+            "removed": False,
+        }
+        self.notify(t, ["logs", {"address": self.auction_house, "topics": [event_topic]}], log)
+
+    def pending_transaction(
+        self,
+        t: float,
+        tx: str,
+        sender: str,
+        value: int,
+        data: str,
+        nonce: Optional[int] = None,
+        gas_price: int = 10**10,
+    ) -> int:
+        # senders count their nonces up unless a transaction replaces an earlier one
+        if nonce is None:
+            nonce = self._nonces[sender] = self._nonces.get(sender, -1) + 1
+        transaction = {
+            "hash": tx,
+            "from": sender,
+            "to": self.auction_house,
+            "value": hex(value),
+            "input": data,
+            "nonce": hex(nonce),
+            "gas": hex(200_000),
+            "maxFeePerGas": hex(gas_price),
+        }
+        self.notify(t, ["alchemy_pendingTransactions", {"toAddress": [self.auction_house]}], transaction)
+        return nonce
+
+    def mined_bid(self, t: float, block_t: float, tx: str, sender: str, value: int, log_index: int):
+        # the contract extends auctions that get a bid within the time buffer of their end
+        block_timestamp = CHAIN_START_TIME + int(block_t)
+        extended = self.end_time - block_timestamp < TIME_BUFFER_SECONDS
+        data = encode(["address", "uint256", "bool"], [sender, value, extended])
+        self.log(t, AUCTION_BID_TOPIC, data, tx, log_index)
+        if extended:
+            self.end_time = block_timestamp + TIME_BUFFER_SECONDS
+            self.log(t, AUCTION_EXTENDED_TOPIC, encode(["uint256"], [self.end_time]), tx, log_index + 1)
+
+    def build(self) -> List[dict]:
+        self._meta.update({"notes": {str(self.noun_id): self.notes}, "ens": self.ens})
+        return [self._meta] + sorted(self.entries, key=lambda entry: entry.get("t"))
+
+
+def bid_war(bids: int = 100, bidders: int = 20, seconds: float = 60, noun_id: int = 700) -> List[dict]:
+    # the final minute of an auction: every bid is seen pending first, then mined in the next block
+    builder = ScenarioBuilder(noun_id, end_in_seconds=int(seconds))
+    wallets = [address(f"bidder-{index}") for index in range(bidders)]
+    for index, wallet in enumerate(wallets[::2]):
+        builder.ens[wallet.lower()] = f"bidder{index}.eth"
+
+    mined: Dict[int, list] = {}
+    for index in range(bids):
+        t = index * seconds / bids
+        wallet, tx = wallets[index % bidders], tx_hash(f"bid-{noun_id}-{index}")
+        # unique to the cent so the harness can match webhook messages back to bids
+        value = (3_000 + 37 * index) * 10**16
+        if index % 10 == 0:
+            builder.notes[f"{noun_id}-{wallet.lower()}-{value}"] = f"gm from bidder {index}"
+
+        builder.pending_transaction(t, tx, wallet, value, CREATE_BID_SELECTOR + topic(noun_id)[2:])
+        block = math.ceil((t + 1) / BLOCK_SECONDS)
+        mined.setdefault(block, []).append((tx, wallet, value))
+
+    block = 1
+    while mined or CHAIN_START_TIME + block * BLOCK_SECONDS <= builder.end_time:
+        block_t = block * BLOCK_SECONDS
+        builder.new_head(block_t)
+        for log_index, (tx, wallet, value) in enumerate(mined.pop(block, [])):
+            builder.mined_bid(block_t + 0.1, block_t, tx, wallet, value, log_index * 2)
+        block += 1
+    builder.new_head(block * BLOCK_SECONDS)
+
+    return builder.build()
+
+
+def pending_flood(
+    transactions: int = 500, seconds: float = 30, noise: float = 0.3, speedups: float = 0.2, noun_id: int = 700
+) -> List[dict]:
+    # a busy mempool in the last half hour: bids nobody mines yet, some sped up with more gas,
+    # plus unrelated calls to the auction house
+    builder = ScenarioBuilder(noun_id, end_in_seconds=600)
+    noisy_every = max(1, round(1 / noise)) if noise else 0
+    next_block_t = 0
+    for index in range(transactions):
+        t = index * seconds / transactions
+        if t >= next_block_t:
+            builder.new_head(t)
+            next_block_t += BLOCK_SECONDS
+
+        wallet, tx = address(f"mempool-{index % 50}"), tx_hash(f"pending-{noun_id}-{index}")
+        if noisy_every and index % noisy_every == 0:
+            # settlement attempts are handled, other auction house calls are filtered out on arrival
+            noise = "settleCurrentAndCreateNewAuction()" if index % (2 * noisy_every) == 0 else "settleAuction()"
+            builder.pending_transaction(t, tx, wallet, 0, selector(noise))
+            continue
+
+        value, data = (1_000 + 13 * index) * 10**16, CREATE_BID_SELECTOR + topic(noun_id)[2:]
+        nonce = builder.pending_transaction(t, tx, wallet, value, data)
+        if speedups and index % max(1, round(1 / speedups)) == 1:
+            # same nonce and amount, more gas: replaces the bid without being a new one
+            speedup_tx = tx_hash(f"speedup-{noun_id}-{index}")
+            builder.pending_transaction(t + 0.5, speedup_tx, wallet, value, data, nonce=nonce, gas_price=2 * 10**10)
+
+    return builder.build()
+
+
+SCENARIOS: Dict[str, Callable[[], List[dict]]] = {
+    "bid-war": bid_war,
+    "pending-flood": pending_flood,
+}
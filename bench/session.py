@@ -0,0 +1,116 @@
+import json
+import re
+from typing import Dict, List, Optional, Tuple
+
+# a recorded session is a JSON lines file of:
+#   {"t": seconds, "type": "ws", "direction": "in" | "out", "frame": raw websocket frame}
+#   {"t": seconds, "type": "http", "service": "subgraph" | "notes" | "webhook", "method", "path", "request",
+#    "status", "etag", "response"}
+#   {"type": "meta", ...} for generated scenarios: the auction and chain state the stub falls back to
+
+SUBGRAPH_FIELDS = re.compile(r"a(\d+): (\w+)\(")
+
+
+def subscription_key(params: list) -> tuple:
+    # subscriptions are matched by what they listen to, not by exact filter, so addresses can differ
+    if params[0] == "logs":
+        topics = (params[1] if len(params) > 1 else {}).get("topics") or [None]
+        return "logs", (topics[0] or "").lower()
+    return (params[0],)
+
+
+def request_key(method: str, params) -> str:
+    return f"{method} {json.dumps(params, sort_keys=True)}"
+
+
+def read_session(path: str) -> List[dict]:
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def write_session(path: str, entries: List[dict]):
+    with open(path, "w") as f:
+        for entry in entries:
+            f.write(json.dumps(entry) + "\n")
+
+
+def split_subgraph_batch(body: dict) -> List[Tuple[str, str, str]]:
+    # (alias, field, variable value) for each lookup in a batched subgraph query
+    variables = body.get("variables") or {}
+    return [
+        (f"a{index}", field, json.dumps(variables.get(f"v{index}")))
+        for index, field in SUBGRAPH_FIELDS.findall(body.get("query", ""))
+    ]
+
+
+class Session:
+    def __init__(self, entries: List[dict]):
+        self.meta: dict = {}
+        # recorded notifications as (t, subscription key, result)
+        self.notifications: List[Tuple[float, tuple, dict]] = []
+        # request key -> recorded results, in order
+        self.responses: Dict[str, List[dict]] = {}
+        self.notes: Dict[str, dict] = {}
+        self.subgraph: Dict[Tuple[str, str], object] = {}
+
+        requests: Dict[object, dict] = {}
+        subscriptions: Dict[str, tuple] = {}
+        for entry in entries:
+            if entry.get("type") == "meta":
+                self.meta.update(entry)
+            elif entry.get("type") == "ws":
+                self._add_frame(entry, requests, subscriptions)
+            elif entry.get("type") == "http":
+                self._add_http(entry)
+
+        self.notifications.sort(key=lambda notification: notification[0])
+
+    def _add_frame(self, entry: dict, requests: Dict[object, dict], subscriptions: Dict[str, tuple]):
+        frame = json.loads(entry.get("frame"))
+        if entry.get("direction") == "out":
+            requests[frame.get("id")] = frame
+            return
+
+        if frame.get("method") == "eth_subscription":
+            params = frame.get("params")
+            key = subscriptions.get(params.get("subscription"))
+            if key is not None:
+                self.notifications.append((entry.get("t"), key, params.get("result")))
+            return
+
+        request = requests.pop(frame.get("id"), None)
+        if request is None:
+            return
+
+        if request.get("method") == "eth_subscribe":
+            subscriptions[frame.get("result")] = subscription_key(request.get("params"))
+            return
+
+        response = {key: frame[key] for key in ("result", "error") if key in frame}
+        self.responses.setdefault(request_key(request.get("method"), request.get("params")), []).append(response)
+
+    def _add_http(self, entry: dict):
+        if entry.get("status") != 200:
+            return
+
+        if entry.get("service") == "notes":
+            self.notes[entry.get("path")] = entry
+        elif entry.get("service") == "subgraph":
+            data = json.loads(entry.get("response")).get("data") or {}
+            for alias, field, value in split_subgraph_batch(json.loads(entry.get("request"))):
+                self.subgraph[(field, value)] = data.get(alias)
+
+    @property
+    def subscription_keys(self) -> set:
+        return {key for _, key, _ in self.notifications}
+
+    def response_for(self, method: str, params, served: Dict[str, int]) -> Optional[dict]:
+        key = request_key(method, params)
+        responses = self.responses.get(key)
+        if not responses:
+            return None
+
+        # replay recorded answers in order, repeating the last one once they run out
+        index = served.get(key, 0)
+        served[key] = index + 1
+        return responses[min(index, len(responses) - 1)]
@@ -0,0 +1,88 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+from bench.replay import listener_env, start_listener, stop_listener
+from bench.scenarios import ScenarioBuilder
+from bench.session import Session
+from bench.stubs import StubChain, StubServices
+
+logging.basicConfig(level=logging.INFO)
+logging.getLogger("websockets").setLevel(logging.WARNING)
+logger = logging.getLogger(__name__)
+
+PROVIDER_LATENCY_SECONDS = 0.05
+# subscriptions confirmed this long after the last one are taken to be all of them
+SETTLE_SECONDS = 1
+TIMEOUT_SECONDS = 30
+
+
+async def measure_startup(session: Session, latency: float, log_path: str) -> Dict[str, Optional[float]]:
+    chain, services = StubChain(session, latency=latency), StubServices(session)
+    await chain.start()
+    await services.start()
+
+    with open(log_path, "w") as log_file:
+        started_at = time.monotonic()
+        process = await start_listener(listener_env(chain, services), log_file)
+        while process.returncode is None and time.monotonic() - started_at < TIMEOUT_SECONDS:
+            await asyncio.sleep(0.01)
+            if chain.subscribed_at and time.monotonic() - chain.subscribed_at[-1] > SETTLE_SECONDS:
+                break
+        await stop_listener(process)
+
+    await chain.close()
+    await services.close()
+
+    def since_start(at: Optional[float]) -> Optional[float]:
+        return None if at is None else at - started_at
+
+    return {
+        "connected": since_start(chain.connected_at),
+        "first_subscription": since_start(chain.subscribed_at[0] if chain.subscribed_at else None),
+        "all_subscriptions": since_start(chain.subscribed_at[-1] if chain.subscribed_at else None),
+        "subscriptions": len(chain.subscribed_at),
+    }
+
+
+async def run(runs: int, latency: float) -> List[dict]:
+    session = Session(ScenarioBuilder(noun_id=700, end_in_seconds=600).build())
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for index in range(runs):
+            results.append(await measure_startup(session, latency, os.path.join(tmp_dir, f"listener-{index}.log")))
+
+    print(f"process start -> provider, {runs} run(s) with a {latency * 1000:.0f}ms provider round trip:")
+    for name in ["connected", "first_subscription", "all_subscriptions"]:
+        values = [result.get(name) for result in results if result.get(name) is not None]
+        if not values:
+            print(f"  {name:<20} never")
+            continue
+        print(
+            f"  {name:<20} median {statistics.median(values) * 1000:>6.0f}ms  "
+            f"min {min(values) * 1000:>6.0f}ms  max {max(values) * 1000:>6.0f}ms"
+        )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="time main.py from process start to its first subscriptions")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=PROVIDER_LATENCY_SECONDS, help="provider round trip")
+    parser.add_argument("--json", help="write every run as JSON here")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.runs, args.latency))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,299 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+import websockets
+from aiohttp import web
+from web3 import Web3
+
+from bench.session import Session, split_subgraph_batch, subscription_key
+
+logger = logging.getLogger(__name__)
+
+SUBSCRIBE_TIMEOUT_SECONDS = 10
+# tcp, tls and the websocket upgrade, each a round trip to a remote provider
+HANDSHAKE_ROUND_TRIPS = 3
+ZERO_ADDRESS = "0x0000000000000000000000000000000000000000"
+AUCTION_BID_TOPIC = "0x1159164c56f277e6fc99c11731bd380e0347deb969b75523398734c252706ea3"
+AUCTION_EXTENDED_TOPIC = "0x6e912a3a9105bdd2af817ba5adc14e6c127c1035b5b648faa29ca0d58ab8ff4e"
+
+w3 = Web3()
+
+
+def selector(signature: str) -> str:
+    return Web3.keccak(text=signature)[:4].hex()
+
+
+def encode(types: List[str], values: list) -> str:
+    return Web3.toHex(w3.codec.encode_abi(types, values))
+
+
+def decode(types: List[str], data: str) -> list:
+    return w3.codec.decode_abi(types, Web3.toBytes(hexstr=data))
+
+
+class SyntheticChain:
+    # answers calls the session has no recording for, from the scenario's meta entry
+    def __init__(self, meta: dict):
+        # a copy, the replayed logs move it along and sessions are replayed more than once
+        self.auction = dict(meta.get("auction") or {})
+        self.header = meta.get("block") or {"number": "0x1", "timestamp": hex(int(time.time())), "hash": "0x0"}
+        self.ens: Dict[str, str] = meta.get("ens") or {}
+        self.balance = int(meta.get("balance_wei", 100 * 10**18))
+        self.handlers = {
+            selector("auction()"): self._auction,
+            selector("getNames(address[])"): self._get_names,
+            selector("getEthBalance(address)"): lambda data: encode(["uint256"], [self.balance]),
+            selector("balanceOf(address)"): lambda data: encode(["uint256"], [0]),
+            selector("aggregate3((address,bool,bytes)[])"): self._aggregate3,
+        }
+
+    def call(self, data: str) -> str:
+        handler = self.handlers.get(data[:10])
+        if handler is None:
+            raise ValueError(f"no synthetic answer for selector {data[:10]}")
+        return handler(data)
+
+    def apply(self, key: tuple, result: dict):
+        # the contract follows the replayed blocks and logs, so calls made after them see the same auction
+        if key == ("newHeads",):
+            self.header = result
+        elif key == ("logs", AUCTION_BID_TOPIC):
+            bidder, wei_amount, _ = decode(["address", "uint256", "bool"], result.get("data"))
+            self.auction.update(bidder=bidder, wei_amount=wei_amount)
+        elif key == ("logs", AUCTION_EXTENDED_TOPIC):
+            (self.auction["end_time"],) = decode(["uint256"], result.get("data"))
+
+    def _auction(self, data: str) -> str:
+        auction = self.auction
+        return encode(
+            ["uint256", "uint256", "uint256", "uint256", "address", "bool"],
+            [
+                auction.get("noun_id", 1),
+                int(auction.get("wei_amount", 0)),
+                auction.get("start_time", 0),
+                auction.get("end_time", 0),
+                auction.get("bidder", ZERO_ADDRESS),
+                auction.get("settled", False),
+            ],
+        )
+
+    def _get_names(self, data: str) -> str:
+        (addresses,) = decode(["address[]"], "0x" + data[10:])
+        return encode(["string[]"], [[self.ens.get(address.lower(), "") for address in addresses]])
+
+    def _aggregate3(self, data: str) -> str:
+        (calls,) = decode(["(address,bool,bytes)[]"], "0x" + data[10:])
+        results = []
+        for _, _, call_data in calls:
+            try:
+                results.append((True, Web3.toBytes(hexstr=self.call(Web3.toHex(call_data)))))
+            except ValueError:
+                results.append((False, b""))
+        return encode(["(bool,bytes)[]"], [results])
+
+
+class StubChain:
+    def __init__(self, session: Session, rate: float = 0, latency: float = 0, host: str = "127.0.0.1", port: int = 0):
+        self.session = session
+        self.rate = rate
+        # simulated round trip to the provider, added to the handshake and to every response
+        self.latency = latency
+        self.host = host
+        self.port = port
+        self.synthetic = SyntheticChain(session.meta)
+        self.calls: Counter = Counter()
+        # (monotonic time sent, subscription key, result) for every notification pushed to the client
+        self.sent: List[Tuple[float, tuple, dict]] = []
+        self.finished_at: Optional[float] = None
+        self.connected_at: Optional[float] = None
+        # monotonic time each eth_subscribe was confirmed
+        self.subscribed_at: List[float] = []
+        self._served: Dict[str, int] = {}
+        self._server = None
+        self._replay_task: Optional[asyncio.Task] = None
+        self._subscriptions: Dict[tuple, str] = {}
+        self._subscribed: Optional[asyncio.Event] = None
+        self._synced: Optional[asyncio.Event] = None
+        self._ws = None
+
+    @property
+    def url(self) -> str:
+        return f"ws://{self.host}:{self.port}"
+
+    async def start(self):
+        self._subscribed = asyncio.Event()
+        self._synced = asyncio.Event()
+        self._server = await websockets.serve(
+            self._handle, self.host, self.port, max_size=None, process_request=self._handshake
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._replay_task = asyncio.ensure_future(self._replay())
+
+    async def close(self):
+        if self._replay_task is not None:
+            self._replay_task.cancel()
+            await asyncio.gather(self._replay_task, return_exceptions=True)
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _handshake(self, path, headers):
+        if self.latency:
+            await asyncio.sleep(HANDSHAKE_ROUND_TRIPS * self.latency)
+
+    async def _respond(self, ws, response: dict, subscription: bool = False):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        try:
+            await ws.send(json.dumps(response))
+        except websockets.ConnectionClosed:
+            return
+        if subscription:
+            self.subscribed_at.append(time.monotonic())
+            if ws is self._ws and self.session.subscription_keys <= set(self._subscriptions):
+                self._subscribed.set()
+
+    async def _handle(self, ws, path=None):
+        if self.connected_at is None:
+            self.connected_at = time.monotonic()
+        subscriptions: Dict[tuple, str] = {}
+        async for raw in ws:
+            request = json.loads(raw)
+            method, params = request.get("method"), request.get("params")
+            self.calls[method] += 1
+            response = {"jsonrpc": "2.0", "id": request.get("id")}
+
+            if method == "eth_subscribe":
+                subscription_id = hex(sum(self.calls.values()))
+                subscriptions[subscription_key(params)] = subscription_id
+                response["result"] = subscription_id
+                # notifications go to the latest connection, starting once it listens to everything replayed
+                self._ws, self._subscriptions = ws, subscriptions
+            else:
+                response.update(self._answer(method, params))
+                if method == "eth_getBlockByNumber":
+                    self._synced.set()
+
+            # responses go out concurrently, like a provider working on several requests at once
+            asyncio.ensure_future(self._respond(ws, response, subscription=method == "eth_subscribe"))
+
+    def _answer(self, method: str, params) -> dict:
+        recorded = self.session.response_for(method, params, self._served)
+        if recorded is not None:
+            return recorded
+
+        if method == "eth_call":
+            try:
+                return {"result": self.synthetic.call(params[0].get("data"))}
+            except ValueError as e:
+                return {"error": {"code": 3, "message": f"execution reverted: {e}"}}
+        if method == "eth_blockNumber":
+            return {"result": self.synthetic.header.get("number")}
+        if method == "eth_getBlockByNumber":
+            return {"result": self.synthetic.header}
+        if method == "eth_getLogs":
+            return {"result": []}
+        if method == "eth_unsubscribe":
+            return {"result": True}
+        return {"error": {"code": -32601, "message": f"{method} not stubbed"}}
+
+    async def _replay(self):
+        try:
+            await asyncio.wait_for(self._subscribed.wait(), timeout=SUBSCRIBE_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            logger.warning("client never subscribed to every replayed stream, replaying what it did subscribe to")
+        # blocks replayed before the listener read the head would end its auction before it started tracking it
+        try:
+            await asyncio.wait_for(self._synced.wait(), timeout=SUBSCRIBE_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            logger.warning("client never asked for the latest block, replaying anyway")
+
+        notifications = self.session.notifications
+        started_at = time.monotonic()
+        first_t = notifications[0][0] if notifications else 0
+        for t, key, result in notifications:
+            if self.rate:
+                delay = (t - first_t) / self.rate - (time.monotonic() - started_at)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+            self.synthetic.apply(key, result)
+            subscription_id = self._subscriptions.get(key)
+            if subscription_id is None or self._ws is None:
+                continue
+
+            params = {"subscription": subscription_id, "result": result}
+            try:
+                await self._ws.send(json.dumps({"jsonrpc": "2.0", "method": "eth_subscription", "params": params}))
+            except websockets.ConnectionClosed:
+                logger.warning("client disconnected during replay")
+                continue
+            self.sent.append((time.monotonic(), key, result))
+
+        self.finished_at = time.monotonic()
+
+
+class StubServices:
+    # the subgraph, the noun-o-clock notes API and the webhook on one local HTTP server
+    def __init__(self, session: Session, host: str = "127.0.0.1", port: int = 0):
+        self.session = session
+        self.host = host
+        self.port = port
+        self.calls: Counter = Counter()
+        # (monotonic time received, message) for every webhook post
+        self.webhooks: List[Tuple[float, dict]] = []
+        self._runner: Optional[web.AppRunner] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    @property
+    def last_webhook_at(self) -> Optional[float]:
+        return self.webhooks[-1][0] if self.webhooks else None
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post("/subgraph", self._subgraph)
+        app.router.add_get("/notes/{noun_id}", self._notes)
+        app.router.add_post("/hook", self._webhook)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        self.port = self._runner.addresses[0][1]
+
+    async def close(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    async def _subgraph(self, request: web.Request) -> web.Response:
+        self.calls["subgraph"] += 1
+        data = {}
+        for alias, field, value in split_subgraph_batch(await request.json()):
+            self.calls["subgraph lookups"] += 1
+            data[alias] = self.session.subgraph.get((field, value), [] if field == "nouns" else None)
+        return web.json_response({"data": data})
+
+    async def _notes(self, request: web.Request) -> web.Response:
+        self.calls["notes"] += 1
+        recorded = self.session.notes.get(request.path)
+        if recorded is not None:
+            body, etag = recorded.get("response"), recorded.get("etag")
+        else:
+            body = json.dumps(self.session.meta.get("notes", {}).get(request.match_info["noun_id"], {}))
+            etag = f'"{hashlib.sha1(body.encode()).hexdigest()}"'
+
+        if etag and request.headers.get("If-None-Match") == etag:
+            self.calls["notes not modified"] += 1
+            return web.Response(status=304)
+
+        return web.Response(text=body, content_type="application/json", headers={"ETag": etag} if etag else None)
+
+    async def _webhook(self, request: web.Request) -> web.Response:
+        self.webhooks.append((time.monotonic(), await request.json()))
+        return web.json_response({})
@@ -0,0 +1,55 @@
+from typing import Dict, List, Tuple
+
+from eth_abi import decode_abi, encode_abi
+from eth_utils import function_abi_to_4byte_selector, to_checksum_address
+from eth_utils.abi import collapse_if_tuple
+
+# just the calls and results of contract functions. a web3 contract needs all of web3, which takes most of startup
+
+
+class ContractFunction:
+    def __init__(self, address: str, abi: dict, selector: bytes, args: tuple):
+        self.address = address
+        self.abi = abi
+        self.fn_name = abi.get("name")
+        self.selector = selector
+        self.args = args
+
+    def encode(self) -> bytes:
+        input_types = [collapse_if_tuple(abi_input) for abi_input in self.abi.get("inputs", [])]
+        return self.selector + encode_abi(input_types, self.args)
+
+    def decode_output(self, data: bytes):
+        output_types = [collapse_if_tuple(output) for output in self.abi.get("outputs", [])]
+        decoded = [
+            to_checksum_address(value) if output_type == "address" else value
+            for output_type, value in zip(output_types, decode_abi(output_types, data))
+        ]
+        if len(decoded) == 1:
+            return decoded[0]
+
+        return decoded
+
+
+class ContractFunctions:
+    def __init__(self, address: str, abi: List[dict]):
+        self._address = address
+        self._functions: Dict[str, Tuple[dict, bytes]] = {
+            entry.get("name"): (entry, function_abi_to_4byte_selector(entry))
+            for entry in abi
+            if entry.get("type") == "function"
+        }
+
+    def __getattr__(self, name: str):
+        if name not in self._functions:
+            raise AttributeError(f"contract {self._address} has no function {name}")
+
+        abi, selector = self._functions[name]
+        return lambda *args: ContractFunction(self._address, abi, selector, args)
+
+
+class Contract:
+    def __init__(self, address: str, abi: List[dict]):
+        self.address = to_checksum_address(address)
+        self.abi = abi
+        self.functions = ContractFunctions(self.address, abi)
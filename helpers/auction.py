@@ -0,0 +1,133 @@
+import logging
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+import settings
+from helpers.clock import chain_clock
+from helpers.nouns import get_current_auction
+
+logger = logging.getLogger(__name__)
+
+ZERO_ADDRESS = "0x0000000000000000000000000000000000000000"
+# settlements are only looked up by the finalize message of the auction that just ended
+MAX_SETTLEMENTS = 8
+
+
+class AuctionState:
+    def __init__(self, auction_house_address: str = settings.AUCTION_HOUSE_CONTRACT_ADDRESS):
+        self.auction_house_address = auction_house_address
+        self.noun_id: Optional[int] = None
+        self.wei_amount: int = 0
+        self.start_time: int = 0
+        self.end_time: int = 0
+        self.bidder: Optional[str] = None
+        self.settled: bool = False
+        # whether the new auction message went out, auctions found on chain rather than from their log count as done
+        self.announced: bool = True
+        self.stale: bool = True
+        # noun id -> (winner, wei amount) from AuctionSettled logs. the same transaction creates the next auction,
+        # so by the time an auction is finalized the contract and the fields above may have moved on
+        self.settlements: "OrderedDict[int, Tuple[str, int]]" = OrderedDict()
+
+    @property
+    def remaining_seconds(self) -> int:
+        return int(self.end_time - chain_clock.now())
+
+    def seed(self, auction: dict):
+        self.noun_id = auction.get("noun_id")
+        self.wei_amount = auction.get("wei_amount")
+        self.start_time = auction.get("start_time")
+        self.end_time = auction.get("end_time")
+        self.bidder = auction.get("bidder")
+        self.settled = auction.get("settled")
+        self.announced = auction.get("announced", True)
+        self.stale = False
+
+    def as_dict(self) -> dict:
+        return {
+            "noun_id": self.noun_id,
+            "wei_amount": self.wei_amount,
+            "start_time": self.start_time,
+            "end_time": self.end_time,
+            "bidder": self.bidder,
+            "settled": self.settled,
+            "announced": self.announced,
+        }
+
+    def _mark_stale(self, reason: str):
+        logger.warning(f"auction state out of sync ({reason}). will refresh from chain")
+        self.stale = True
+
+    def apply_bid(self, noun_id: int, bidder: str, wei_amount: int) -> bool:
+        if noun_id != self.noun_id:
+            if self.noun_id is None or noun_id > self.noun_id:
+                self._mark_stale(f"bid for noun {noun_id} while tracking {self.noun_id}")
+            return False
+
+        # replayed or out-of-order logs never lower the high bid
+        if wei_amount <= self.wei_amount:
+            return False
+
+        self.wei_amount = wei_amount
+        self.bidder = bidder
+        return True
+
+    def apply_extended(self, noun_id: int, end_time: int) -> bool:
+        if noun_id != self.noun_id:
+            if self.noun_id is None or noun_id > self.noun_id:
+                self._mark_stale(f"extension for noun {noun_id} while tracking {self.noun_id}")
+            return False
+
+        if end_time <= self.end_time:
+            return False
+
+        self.end_time = end_time
+        return True
+
+    def apply_created(self, noun_id: int, start_time: int, end_time: int) -> bool:
+        if self.noun_id is not None and noun_id <= self.noun_id:
+            return False
+
+        self.seed(
+            {
+                "noun_id": noun_id,
+                "wei_amount": 0,
+                "start_time": start_time,
+                "end_time": end_time,
+                "bidder": ZERO_ADDRESS,
+                "settled": False,
+                "announced": False,
+            }
+        )
+        return True
+
+    def apply_settled(self, noun_id: int, winner: str, wei_amount: int) -> bool:
+        self.settlements[noun_id] = (winner, wei_amount)
+        self.settlements.move_to_end(noun_id)
+        while len(self.settlements) > MAX_SETTLEMENTS:
+            self.settlements.popitem(last=False)
+
+        if noun_id != self.noun_id:
+            if self.noun_id is None or noun_id > self.noun_id:
+                self._mark_stale(f"settlement for noun {noun_id} while tracking {self.noun_id}")
+            return False
+
+        self.settled = True
+        self.bidder = winner
+        self.wei_amount = wei_amount
+        return True
+
+
+auction_state = AuctionState()
+
+
+async def refresh_auction_state(state: AuctionState = auction_state) -> AuctionState:
+    state.seed(await get_current_auction(state.auction_house_address))
+    return state
+
+
+async def get_auction_state(state: AuctionState = auction_state) -> AuctionState:
+    if state.stale:
+        await refresh_auction_state(state)
+
+    return state
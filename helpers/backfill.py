@@ -0,0 +1,126 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import Counter
+from typing import List, Optional, Union
+
+from eth_utils import to_int
+
+import settings
+from helpers.w3 import chain_client
+
+logger = logging.getLogger(__name__)
+
+LOGS_CHUNK_BLOCKS = 2_000
+MAX_CONCURRENT_CHUNKS = 4
+MAX_BACKFILL_BLOCKS = 50_000
+CHECKPOINT_INTERVAL_SECONDS = 10
+
+
+class BlockCursor:
+    def __init__(self, path: Optional[str] = settings.BLOCK_CURSOR_PATH):
+        self.path = path
+        self.block_number: Optional[int] = None
+        # blocks with logs still queued or being handled -> how many
+        self.in_flight: Counter = Counter()
+        self._processed: Optional[int] = None
+        self._saved_at = 0.0
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+
+        with open(self.path) as f:
+            self.block_number = json.load(f).get("block_number")
+        logger.info(f"resuming from block {self.block_number}")
+
+    def save(self):
+        if not self.path or self.block_number is None:
+            return
+
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"block_number": self.block_number}, f)
+        os.replace(tmp_path, self.path)
+        self._saved_at = time.time()
+
+    def track(self, block_number) -> Optional[int]:
+        if isinstance(block_number, str):
+            block_number = to_int(hexstr=block_number)
+        if block_number is not None:
+            self.in_flight[block_number] += 1
+        return block_number
+
+    def release(self, block_number: Optional[int]):
+        if block_number is None:
+            return
+
+        self.in_flight[block_number] -= 1
+        if self.in_flight[block_number] <= 0:
+            del self.in_flight[block_number]
+        self._processed = max(self._processed or block_number, block_number)
+        self.advance(self._processed)
+
+    def advance(self, block_number):
+        if block_number is None:
+            return
+
+        if isinstance(block_number, str):
+            block_number = to_int(hexstr=block_number)
+        # never past a block with logs still to handle, the backfill starts again from the cursor block
+        if self.in_flight:
+            block_number = min(block_number, min(self.in_flight))
+        if self.block_number is not None and block_number <= self.block_number:
+            return
+
+        self.block_number = block_number
+        if time.time() - self._saved_at > CHECKPOINT_INTERVAL_SECONDS:
+            self.save()
+
+
+block_cursor = BlockCursor()
+
+
+async def get_logs(
+    address: Union[str, List[str]],
+    topics: list,
+    from_block: int,
+    to_block: int,
+    chunk_blocks: int = LOGS_CHUNK_BLOCKS,
+    max_concurrent_chunks: int = MAX_CONCURRENT_CHUNKS,
+) -> List[dict]:
+    semaphore = asyncio.Semaphore(max_concurrent_chunks)
+
+    async def get_chunk(start: int, end: int) -> List[dict]:
+        log_filter = {"address": address, "topics": topics, "fromBlock": hex(start), "toBlock": hex(end)}
+        async with semaphore:
+            return await chain_client.request("eth_getLogs", [log_filter])
+
+    chunks = [
+        get_chunk(start, min(start + chunk_blocks - 1, to_block))
+        for start in range(from_block, to_block + 1, chunk_blocks)
+    ]
+    logs = [log for chunk in await asyncio.gather(*chunks) for log in chunk if not log.get("removed")]
+    return sorted(logs, key=lambda log: (to_int(hexstr=log.get("blockNumber")), to_int(hexstr=log.get("logIndex"))))
+
+
+async def get_missed_logs(address: Union[str, List[str]], topics: list) -> List[dict]:
+    head = to_int(hexstr=await chain_client.request("eth_blockNumber", []))
+    if block_cursor.block_number is None:
+        block_cursor.advance(head)
+        return []
+
+    # the cursor block may only have been partially processed, so it is fetched again and de-duplicated downstream
+    from_block = max(block_cursor.block_number, head - MAX_BACKFILL_BLOCKS)
+    if from_block > head:
+        return []
+
+    started_at = time.time()
+    logs = await get_logs(address, topics, from_block, head)
+    # with logs to replay, the cursor follows them as they are handled
+    if not logs:
+        block_cursor.advance(head)
+    logger.info(f"backfilled {len(logs)} log(s) from blocks {from_block}-{head} in {time.time() - started_at:.2f}s")
+    return logs
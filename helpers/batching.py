@@ -0,0 +1,62 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, List
+
+logger = logging.getLogger(__name__)
+
+
+class BatchLoader:
+    def __init__(
+        self,
+        load_batch: Callable[[List[Hashable]], Awaitable[List[Any]]],
+        window_seconds: float = 0.02,
+        max_batch_size: int = 50,
+    ):
+        self._load_batch = load_batch
+        self.window_seconds = window_seconds
+        self.max_batch_size = max_batch_size
+        self._futures: Dict[Hashable, asyncio.Future] = {}
+        self._batch: List[Hashable] = []
+        self._flush_handle = None
+
+    async def load(self, key: Hashable):
+        future = self._futures.get(key)
+        if future is None:
+            future = asyncio.get_event_loop().create_future()
+            self._futures[key] = future
+            self._batch.append(key)
+            if len(self._batch) >= self.max_batch_size:
+                self._flush()
+            elif self._flush_handle is None:
+                self._flush_handle = asyncio.get_event_loop().call_later(self.window_seconds, self._flush)
+
+        # a cancelled caller must not cancel the lookup for everyone else waiting on it
+        return await asyncio.shield(future)
+
+    async def load_many(self, keys: List[Hashable]) -> List[Any]:
+        return list(await asyncio.gather(*(self.load(key) for key in keys)))
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        batch, self._batch = self._batch, []
+        if batch:
+            asyncio.ensure_future(self._run_batch(batch))
+
+    async def _run_batch(self, batch: List[Hashable]):
+        try:
+            results = await self._load_batch(batch)
+        except Exception as e:
+            logger.debug(f"batch of {len(batch)} lookups failed: {e}")
+            for key in batch:
+                future = self._futures.pop(key)
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for key, result in zip(batch, results):
+            future = self._futures.pop(key)
+            if not future.done():
+                future.set_result(result)
@@ -0,0 +1,148 @@
+import asyncio
+import functools
+import logging
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Hashable, Optional, Set
+
+from eth_utils import to_int
+
+logger = logging.getLogger(__name__)
+
+# how long to wait for the first block past a deadline before firing from the local clock
+BLOCK_GRACE_SECONDS = 15
+# about an hour of blocks, enough to stamp live logs without asking for their block
+MAX_BLOCK_TIMESTAMPS = 300
+# an auction whose on_end failed, e.g. on an RPC error at the deadline, is ended again after this delay
+END_RETRY_DELAY_SECONDS = 3
+MAX_END_ATTEMPTS = 5
+
+
+class ChainClock:
+    def __init__(self):
+        self.block_number: Optional[int] = None
+        self.block_timestamp: Optional[int] = None
+        self.offset = 0.0
+        # block number -> timestamp of recent blocks
+        self.block_timestamps: "OrderedDict[int, int]" = OrderedDict()
+
+    def observe(self, header: dict) -> int:
+        block_number = to_int(hexstr=header.get("number"))
+        block_timestamp = to_int(hexstr=header.get("timestamp"))
+        self.remember(block_number, block_timestamp)
+        if self.block_number is None or block_number > self.block_number:
+            self.block_number = block_number
+            self.block_timestamp = block_timestamp
+            self.offset = block_timestamp - time.time()
+        return block_timestamp
+
+    def now(self) -> float:
+        return time.time() + self.offset
+
+    def remember(self, block_number: int, block_timestamp: int):
+        self.block_timestamps[block_number] = block_timestamp
+        self.block_timestamps.move_to_end(block_number)
+        while len(self.block_timestamps) > MAX_BLOCK_TIMESTAMPS:
+            self.block_timestamps.popitem(last=False)
+
+    def block_time(self, block_number: int) -> Optional[int]:
+        return self.block_timestamps.get(block_number)
+
+
+chain_clock = ChainClock()
+
+
+class AuctionEndScheduler:
+    # on_end returns the new end time of an auction that turns out to still be running, None once it's over
+    def __init__(
+        self,
+        on_end: Callable[[Hashable], Awaitable[Optional[int]]],
+        clock: ChainClock = chain_clock,
+        grace_seconds: float = BLOCK_GRACE_SECONDS,
+        retry_delay_seconds: float = END_RETRY_DELAY_SECONDS,
+        max_attempts: int = MAX_END_ATTEMPTS,
+    ):
+        self.on_end = on_end
+        self.clock = clock
+        self.grace_seconds = grace_seconds
+        self.retry_delay_seconds = retry_delay_seconds
+        self.max_attempts = max_attempts
+        self.deadlines: Dict[Hashable, int] = {}
+        self._fired: Set[Hashable] = set()
+        self._attempts: Dict[Hashable, int] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.ensure_future(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    def schedule(self, key: Hashable, end_time: int):
+        # each auction ends once, later extension logs for it are only checked by on_end
+        if key in self._fired or self.deadlines.get(key) == end_time:
+            return
+
+        self.deadlines[key] = end_time
+        logger.info(f"auction end for {key} scheduled in {end_time - self.clock.now():.0f}s of chain time")
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def on_block(self, block_timestamp: int):
+        # auctions accept bids while block.timestamp < endTime, so this block closes them
+        for key, end_time in list(self.deadlines.items()):
+            if block_timestamp >= end_time:
+                self._fire(key)
+
+    def _fire(self, key: Hashable):
+        self.deadlines.pop(key, None)
+        self._fired.add(key)
+        self._attempts[key] = self._attempts.get(key, 0) + 1
+        task = asyncio.ensure_future(self.on_end(key))
+        task.add_done_callback(functools.partial(self._on_end_done, key))
+
+    def _on_end_done(self, key: Hashable, task: asyncio.Task):
+        if task.cancelled():
+            return
+        if task.exception() is not None:
+            attempts = self._attempts.get(key, 0)
+            if attempts >= self.max_attempts:
+                logger.error(f"problems ending auction for {key}: {task.exception()}. giving up after {attempts} tries")
+                self._attempts.pop(key, None)
+                return
+
+            logger.warning(
+                f"problems ending auction for {key}: {task.exception()}. retrying in {self.retry_delay_seconds}s"
+            )
+            asyncio.get_event_loop().call_later(self.retry_delay_seconds, self._fire, key)
+            return
+
+        self._attempts.pop(key, None)
+        end_time = task.result()
+        if end_time is not None:
+            self._fired.discard(key)
+            self.schedule(key, end_time)
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            timeout = None
+            if self.deadlines:
+                now = self.clock.now()
+                for key, end_time in list(self.deadlines.items()):
+                    if end_time + self.grace_seconds <= now:
+                        logger.warning(f"no block seen past the end of {key}. ending it from the local clock")
+                        self._fire(key)
+
+                if self.deadlines:
+                    timeout = min(self.deadlines.values()) + self.grace_seconds - now
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
@@ -0,0 +1,106 @@
+import json
+import logging
+import os
+from typing import Dict
+
+from eth_abi import decode_abi, decode_single
+from eth_utils import event_abi_to_log_topic, function_abi_to_4byte_selector, to_bytes, to_checksum_address, to_hex
+from eth_utils.abi import collapse_if_tuple
+
+from helpers.abi import Contract
+
+logger = logging.getLogger(__name__)
+
+CONTRACTS_DIR = "contracts"
+
+
+class EventDecoder:
+    def __init__(self, event_abi: dict):
+        self.name = event_abi.get("name")
+        self.topic = to_hex(event_abi_to_log_topic(event_abi))
+        self.indexed_inputs = [i for i in event_abi.get("inputs") if i.get("indexed")]
+        self.data_inputs = [i for i in event_abi.get("inputs") if not i.get("indexed")]
+        self.data_types = [collapse_if_tuple(i) for i in self.data_inputs]
+        self.address_names = [i.get("name") for i in event_abi.get("inputs") if i.get("type") == "address"]
+
+    def decode(self, log: dict) -> dict:
+        topics = log.get("topics")
+        if not topics or topics[0] != self.topic:
+            raise ValueError(f"log is not a {self.name} event: {topics}")
+
+        args = {}
+        for abi_input, topic in zip(self.indexed_inputs, topics[1:]):
+            args[abi_input.get("name")] = decode_single(abi_input.get("type"), to_bytes(hexstr=topic))
+
+        data_values = decode_abi(self.data_types, to_bytes(hexstr=log.get("data")))
+        for abi_input, value in zip(self.data_inputs, data_values):
+            args[abi_input.get("name")] = value
+
+        for name in self.address_names:
+            args[name] = to_checksum_address(args[name])
+
+        return args
+
+
+class ContractRegistry:
+    def __init__(self, contracts_dir: str = CONTRACTS_DIR):
+        self.contracts_dir = contracts_dir
+        self.contracts = {}
+        self.abis: Dict[str, list] = {}
+        self.event_decoders: Dict[str, Dict[str, EventDecoder]] = {}
+        self.event_names: Dict[str, Dict[str, str]] = {}
+        self.function_selectors: Dict[str, Dict[str, str]] = {}
+
+    def load(self):
+        for file_name in sorted(os.listdir(self.contracts_dir)):
+            address, extension = os.path.splitext(file_name)
+            if extension != ".json":
+                continue
+
+            with open(os.path.join(self.contracts_dir, file_name), "r") as f:
+                self.register(address, json.load(f))
+
+        logger.debug(f"loaded {len(self.contracts)} contract ABIs")
+
+    def register(self, contract_address: str, contract_abi: list):
+        contract_address = to_checksum_address(contract_address)
+        self.abis[contract_address] = contract_abi
+        self.contracts[contract_address] = Contract(contract_address, contract_abi)
+
+        decoders = {}
+        event_names = {}
+        selectors = {}
+        for entry in contract_abi:
+            if entry.get("type") == "event" and not entry.get("anonymous"):
+                decoder = EventDecoder(entry)
+                decoders[decoder.topic] = decoder
+                event_names[decoder.name] = decoder.topic
+            elif entry.get("type") == "function":
+                selectors[entry.get("name")] = to_hex(function_abi_to_4byte_selector(entry))
+
+        self.event_decoders[contract_address] = decoders
+        self.event_names[contract_address] = event_names
+        self.function_selectors[contract_address] = selectors
+
+    def register_like(self, contract_address: str, template_address: str):
+        # forks deploy the same contracts, so an unknown fork address reuses the ABI of the original
+        if to_checksum_address(contract_address) not in self.contracts:
+            self.register(contract_address, self.abis[to_checksum_address(template_address)])
+
+    def get_contract(self, contract_address: str):
+        return self.contracts[to_checksum_address(contract_address)]
+
+    def get_event_decoder(self, contract_address: str, event_name: str) -> EventDecoder:
+        contract_address = to_checksum_address(contract_address)
+        return self.event_decoders[contract_address][self.event_names[contract_address][event_name]]
+
+    def get_function_selector(self, contract_address: str, function_name: str) -> str:
+        return self.function_selectors[to_checksum_address(contract_address)][function_name]
+
+
+contract_registry = ContractRegistry()
+contract_registry.load()
+
+
+def get_contract(contract_address):
+    return contract_registry.get_contract(contract_address)
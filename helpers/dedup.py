@@ -0,0 +1,139 @@
+import logging
+import sqlite3
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import settings
+
+logger = logging.getLogger(__name__)
+
+MAX_TRACKED_AUCTIONS = 3
+PENDING_LOG_INDEX = -1
+
+STATUS_PENDING = "pending"
+STATUS_CONFIRMED = "confirmed"
+
+
+class EventDeduplicator:
+    def __init__(
+        self,
+        path: Optional[str] = settings.DEDUP_DB_PATH,
+        max_auctions: int = MAX_TRACKED_AUCTIONS,
+        scope: str = settings.AUCTION_HOUSE_CONTRACT_ADDRESS,
+    ):
+        self.path = path
+        self.scope = scope
+        self.max_auctions = max_auctions
+        # noun id -> (tx hash, log index) -> status, oldest auction first
+        self._seen: "OrderedDict[int, Dict[Tuple[str, int], str]]" = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+
+    def open(self):
+        if not self.path or self._db is not None:
+            return
+
+        self._db = sqlite3.connect(self.path, isolation_level=None)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS seen_events (scope TEXT, noun_id INTEGER, tx_hash TEXT, log_index INTEGER, "
+            "status TEXT, PRIMARY KEY (scope, noun_id, tx_hash, log_index))"
+        )
+        rows = self._db.execute(
+            "SELECT noun_id, tx_hash, log_index, status FROM seen_events WHERE scope = ? AND noun_id IN "
+            "(SELECT DISTINCT noun_id FROM seen_events WHERE scope = ? ORDER BY noun_id DESC LIMIT ?) ORDER BY noun_id",
+            (self.scope, self.scope, self.max_auctions),
+        ).fetchall()
+        for noun_id, tx_hash, log_index, status in rows:
+            self._auction(noun_id)[(tx_hash, log_index)] = status
+
+        logger.info(f"loaded {len(rows)} seen event(s) for {len(self._seen)} {self.scope} auction(s) from {self.path}")
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+        self._db = None
+
+    def export(self) -> list:
+        return [
+            [noun_id, tx_hash, log_index, status]
+            for noun_id, seen in self._seen.items()
+            for (tx_hash, log_index), status in seen.items()
+        ]
+
+    def restore(self, rows: list):
+        for noun_id, tx_hash, log_index, status in rows:
+            self._auction(noun_id).setdefault((tx_hash, log_index), status)
+
+    def _auction(self, noun_id: int) -> Dict[Tuple[str, int], str]:
+        seen = self._seen.get(noun_id)
+        if seen is not None:
+            return seen
+
+        seen = self._seen[noun_id] = {}
+        self._seen = OrderedDict(sorted(self._seen.items()))
+        while len(self._seen) > self.max_auctions:
+            evicted, _ = self._seen.popitem(last=False)
+            if self._db is not None:
+                self._db.execute("DELETE FROM seen_events WHERE scope = ? AND noun_id <= ?", (self.scope, evicted))
+
+        return seen
+
+    def _store(self, noun_id: int, keys: List[Tuple[str, int]], status: str):
+        seen = self._auction(noun_id)
+        for key in keys:
+            seen[key] = status
+        if self._db is None:
+            return
+
+        # one commit for all of them, this runs on the event loop
+        with self._db:
+            self._db.execute("BEGIN")
+            self._db.executemany(
+                "INSERT OR REPLACE INTO seen_events VALUES (?, ?, ?, ?, ?)",
+                [(self.scope, noun_id, *key, status) for key in keys],
+            )
+
+    def _discard(self, noun_id: int, key: Tuple[str, int]):
+        seen = self._seen.get(noun_id)
+        if seen is not None:
+            seen.pop(key, None)
+        if self._db is not None:
+            self._db.execute(
+                "DELETE FROM seen_events WHERE scope = ? AND noun_id = ? AND tx_hash = ? AND log_index = ?",
+                (self.scope, noun_id, *key),
+            )
+
+    def claim_bid(self, noun_id: int, tx_hash: str, log_index: int) -> bool:
+        tx_hash = tx_hash.lower()
+        key = (tx_hash, log_index)
+        seen = self._auction(noun_id)
+        if key in seen:
+            return False
+
+        if seen.get((tx_hash, PENDING_LOG_INDEX)) == STATUS_PENDING:
+            logger.debug("confirmed bid %s was announced while pending", tx_hash)
+
+        # link the mempool sighting to the log so both are tracked as one event
+        self._store(noun_id, [(tx_hash, PENDING_LOG_INDEX), key], STATUS_CONFIRMED)
+        return True
+
+    def claim_pending_bid(self, noun_id: int, tx_hash: str) -> bool:
+        tx_hash = tx_hash.lower()
+        seen = self._auction(noun_id)
+        # the pending entry is flipped to confirmed once the log lands, so a late mempool echo is ignored too
+        if (tx_hash, PENDING_LOG_INDEX) in seen:
+            return False
+
+        self._store(noun_id, [(tx_hash, PENDING_LOG_INDEX)], STATUS_PENDING)
+        return True
+
+    def release_bid(self, noun_id: int, tx_hash: str, log_index: int = PENDING_LOG_INDEX):
+        tx_hash = tx_hash.lower()
+        if log_index == PENDING_LOG_INDEX:
+            if self._seen.get(noun_id, {}).get((tx_hash, PENDING_LOG_INDEX)) == STATUS_PENDING:
+                self._discard(noun_id, (tx_hash, PENDING_LOG_INDEX))
+            return
+
+        self._discard(noun_id, (tx_hash, log_index))
+
+
+event_deduplicator = EventDeduplicator()
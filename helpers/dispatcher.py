@@ -0,0 +1,203 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Dict, Hashable, Optional
+
+import aiohttp
+
+import settings
+from helpers.metrics import current_trace, metrics
+from helpers.sessions import get_http_session
+
+logger = logging.getLogger(__name__)
+
+MAX_SEND_ATTEMPTS = 5
+RETRY_BASE_SECONDS = 1
+RETRY_MAX_SECONDS = 30
+RETRYABLE_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+
+
+class WebhookError(Exception):
+    def __init__(self, status: int, text: str, retry_after: Optional[float] = None):
+        super().__init__(f"{status} {text}")
+        self.status = status
+        self.retry_after = retry_after
+
+    @property
+    def retryable(self) -> bool:
+        return self.status in RETRYABLE_STATUSES
+
+
+class TokenBucket:
+    def __init__(self, rate_per_second: float, burst: int):
+        self.rate_per_second = rate_per_second
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate_per_second)
+        self._updated_at = now
+
+    async def acquire(self):
+        while True:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+
+            await asyncio.sleep((1 - self._tokens) / self.rate_per_second)
+
+
+class OutboundMessage:
+    def __init__(self, data: dict, noun_id=None, coalesce_key: Optional[Hashable] = None):
+        self.data = data
+        self.noun_id = noun_id
+        self.coalesce_key = coalesce_key
+        self.attempts = 0
+        self.merged = 1
+        self.trace = current_trace.get()
+
+    def merge(self, other: "OutboundMessage"):
+        self.data.setdefault("blocks", []).extend(other.data.get("blocks", []))
+        self.merged += other.merged
+
+
+class MessageDispatcher:
+    def __init__(
+        self,
+        webhook_url: str = settings.NS_WEBHOOK_URL,
+        queue_size: int = settings.NS_WEBHOOK_QUEUE_SIZE,
+        rate_per_second: float = settings.NS_WEBHOOK_RATE_PER_SECOND,
+        burst: int = settings.NS_WEBHOOK_BURST,
+    ):
+        self.webhook_url = webhook_url
+        self.queue_size = queue_size
+        self.rate_limiter = TokenBucket(rate_per_second, burst) if rate_per_second > 0 else None
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.retried = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        # coalescable messages still waiting in the queue, so later notices can fold into them
+        self._queued_notices: Dict[Hashable, OutboundMessage] = {}
+
+    @property
+    def queue(self) -> asyncio.Queue:
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.queue_size)
+        return self._queue
+
+    def start(self):
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.ensure_future(self._run())
+
+    async def close(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            await asyncio.gather(self._worker, return_exceptions=True)
+        self._worker = None
+
+        if self._queue is not None and not self._queue.empty():
+            logger.warning(f"dropping {self._queue.qsize()} unsent webhook message(s)")
+        self._queue = None
+        self._queued_notices.clear()
+
+    async def drain(self):
+        if self._queue is not None:
+            await self._queue.join()
+
+    async def send(self, data: dict, noun_id=None, coalesce_key: Optional[Hashable] = None):
+        message = OutboundMessage(data, noun_id=noun_id, coalesce_key=coalesce_key)
+
+        if coalesce_key is not None:
+            queued = self._queued_notices.get(coalesce_key)
+            if queued is not None:
+                queued.merge(message)
+                self.coalesced += 1
+                logger.debug("coalesced webhook message into %s (%d merged)", coalesce_key, queued.merged)
+                return
+
+            # notices are best effort: never hold up event processing for them
+            try:
+                self.queue.put_nowait(message)
+            except asyncio.QueueFull:
+                self.dropped += 1
+                logger.warning(f"outbound queue full, dropping {coalesce_key} message")
+                return
+
+            self._queued_notices[coalesce_key] = message
+            return
+
+        await self.queue.put(message)
+
+    async def _run(self):
+        queue = self.queue
+        while True:
+            message = await queue.get()
+            if message.coalesce_key is not None and self._queued_notices.get(message.coalesce_key) is message:
+                del self._queued_notices[message.coalesce_key]
+
+            try:
+                await self._deliver(message)
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"giving up on webhook message for noun {message.noun_id}: {e}")
+            finally:
+                queue.task_done()
+
+    async def _deliver(self, message: OutboundMessage):
+        # messages go out one at a time, in order, so retries never reorder an auction's thread
+        while True:
+            if self.rate_limiter is not None:
+                await self.rate_limiter.acquire()
+            message.attempts += 1
+            try:
+                with metrics.time("stage_seconds", stage="dispatch"):
+                    await self._post(message.data)
+                self.sent += 1
+                if message.trace is not None:
+                    metrics.observe(
+                        "event_latency_seconds",
+                        time.monotonic() - message.trace.received_at,
+                        type=message.trace.message_type,
+                    )
+                return
+            except WebhookError as e:
+                if not e.retryable or message.attempts >= MAX_SEND_ATTEMPTS:
+                    raise
+                delay = e.retry_after or self._backoff(message.attempts)
+                error = e
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if message.attempts >= MAX_SEND_ATTEMPTS:
+                    raise
+                delay = self._backoff(message.attempts)
+                error = e
+
+            self.retried += 1
+            logger.warning(f"webhook delivery failed ({error}). retry {message.attempts} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+    @staticmethod
+    def _backoff(attempts: int) -> float:
+        return random.uniform(0, min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2**attempts))
+
+    async def _post(self, data: dict):
+        async with get_http_session().post(self.webhook_url, json=data) as response:
+            if response.ok:
+                return
+
+            text = await response.text()
+            retry_after = response.headers.get("Retry-After")
+            raise WebhookError(
+                response.status,
+                text,
+                retry_after=float(retry_after) if retry_after and retry_after.isdigit() else None,
+            )
+
+
+message_dispatcher = MessageDispatcher()
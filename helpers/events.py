@@ -0,0 +1,49 @@
+import re
+from typing import Callable, Iterable, NamedTuple, Optional
+
+from eth_utils import to_int
+
+from helpers.contracts import contract_registry
+from helpers.metrics import metrics
+
+INPUT_SELECTOR_PATTERN = re.compile(r'"input"\s*:\s*"(0x[0-9a-fA-F]{8})')
+
+
+class AuctionBid(NamedTuple):
+    noun_id: int
+    bidder: str
+    wei_amount: int
+    extended: bool
+    tx_hash: str
+    log_index: int
+    block_number: int
+
+
+def decode_event(event_name: str, log: dict, contract_address: Optional[str] = None) -> dict:
+    contract_address = contract_address or log.get("address")
+    with metrics.time("stage_seconds", stage="decode"):
+        return contract_registry.get_event_decoder(contract_address, event_name).decode(log)
+
+
+def decode_auction_bid(log: dict) -> AuctionBid:
+    args = decode_event("AuctionBid", log)
+    return AuctionBid(
+        noun_id=args.get("nounId"),
+        bidder=args.get("sender"),
+        wei_amount=args.get("value"),
+        extended=args.get("extended"),
+        tx_hash=log.get("transactionHash"),
+        log_index=to_int(hexstr=log.get("logIndex")),
+        block_number=to_int(hexstr=log.get("blockNumber")),
+    )
+
+
+def selector_prefilter(selectors: Iterable[str]) -> Callable[[str], bool]:
+    # matches raw pending transaction frames calling one of the selectors, without parsing them
+    selectors = {selector.lower() for selector in selectors}
+
+    def prefilter(frame: str) -> bool:
+        match = INPUT_SELECTOR_PATTERN.search(frame)
+        return match is not None and match.group(1).lower() in selectors
+
+    return prefilter
@@ -0,0 +1,219 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+from urllib.parse import urlparse
+
+from websockets.exceptions import ConnectionClosed
+
+from helpers.cache import MISSING, TTLCache
+from helpers.w3 import ChainClient
+
+logger = logging.getLogger(__name__)
+
+MAX_PROVIDER_FAILURES = 10
+MAX_PROVIDER_LAG_SECONDS = 3
+MIN_LAG_SAMPLES = 20
+LAG_SMOOTHING = 0.1
+PROVIDER_COOLDOWN_SECONDS = 300
+LAG_REPORT_INTERVAL_SECONDS = 300
+SEEN_EVENTS_CACHE_SIZE = 10_000
+SEEN_EVENTS_TTL_SECONDS = 600
+
+
+class ProviderLagging(Exception):
+    pass
+
+
+class Provider:
+    def __init__(self, client: ChainClient):
+        self.client = client
+        self.name = urlparse(client.provider_url).hostname or client.provider_url
+        self.task: Optional[asyncio.Task] = None
+        self.failures = 0
+        self.benched = False
+        self.arrivals = 0
+        self.first_arrivals = 0
+        self.lag_samples = 0
+        self.average_lag = 0.0
+
+    @property
+    def active(self) -> bool:
+        return self.task is not None and not self.task.done() and not self.benched and self.client.connected
+
+    def record_lag(self, lag: float):
+        self.lag_samples += 1
+        if self.lag_samples == 1:
+            self.average_lag = lag
+        else:
+            self.average_lag += LAG_SMOOTHING * (lag - self.average_lag)
+
+    def reset_stats(self):
+        self.arrivals = 0
+        self.first_arrivals = 0
+        self.lag_samples = 0
+        self.average_lag = 0.0
+
+
+def event_key(result) -> Optional[tuple]:
+    if not isinstance(result, dict):
+        return None
+
+    tx_hash = result.get("transactionHash") or result.get("hash")
+    if tx_hash is None:
+        return None
+
+    # a reorg re-sends a log with removed set, which is news rather than a duplicate
+    return tx_hash.lower(), result.get("logIndex"), bool(result.get("removed"))
+
+
+class ProviderFanIn:
+    def __init__(
+        self,
+        clients: List[ChainClient],
+        subscriptions: List[dict],
+        on_connect: Optional[Callable[[], Awaitable[None]]] = None,
+        prefilters: Optional[Dict[str, Callable[[str], bool]]] = None,
+    ):
+        self.providers = [Provider(client) for client in clients]
+        self.subscriptions = subscriptions
+        self.on_connect = on_connect
+        # subscription type -> check on raw frames, so irrelevant notifications are never parsed
+        self.prefilters = prefilters or {}
+        # event key -> monotonic time of its first arrival from any provider
+        self.seen = TTLCache(maxsize=SEEN_EVENTS_CACHE_SIZE, ttl_seconds=SEEN_EVENTS_TTL_SECONDS)
+        self._queue: Optional[asyncio.Queue] = None
+        self._report_task: Optional[asyncio.Task] = None
+
+    @property
+    def active_providers(self) -> List[Provider]:
+        return [provider for provider in self.providers if provider.active]
+
+    def start(self):
+        self._queue = asyncio.Queue()
+        for provider in self.providers:
+            provider.task = asyncio.ensure_future(self._run_provider(provider))
+        self._report_task = asyncio.ensure_future(self._report_lag())
+
+    async def stop(self):
+        # no more notifications, but the connections stay up for requests still being made
+        tasks = [provider.task for provider in self.providers if provider.task is not None]
+        if self._report_task is not None:
+            tasks.append(self._report_task)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for provider in self.providers:
+            provider.task = None
+        self._report_task = None
+
+    async def close(self):
+        await self.stop()
+        await asyncio.gather(*(provider.client.close() for provider in self.providers), return_exceptions=True)
+
+    async def messages(self):
+        while True:
+            message = await self._queue.get()
+            if isinstance(message, Exception):
+                raise message
+            yield message
+
+    def publish(self, message_type: str, result, provider: Optional[Provider] = None):
+        now = time.monotonic()
+        key = event_key(result)
+        if provider is not None:
+            provider.arrivals += 1
+
+        if key is not None:
+            first_arrival = self.seen.get(key)
+            if first_arrival is not MISSING:
+                if provider is not None:
+                    provider.record_lag(now - first_arrival)
+                return
+            self.seen.set(key, now)
+
+        if provider is not None:
+            provider.first_arrivals += 1
+            provider.record_lag(0)
+        self._queue.put_nowait((message_type, result))
+
+    def _is_lagging(self, provider: Provider) -> bool:
+        return (
+            provider.lag_samples >= MIN_LAG_SAMPLES
+            and provider.average_lag > MAX_PROVIDER_LAG_SECONDS
+            and len(self.active_providers) > 1
+        )
+
+    async def _subscribe(self, provider: Provider) -> dict:
+        # one round trip for all of them, the client matches the responses by request id
+        subscription_ids = await asyncio.gather(
+            *(provider.client.subscribe(subscription.get("params")) for subscription in self.subscriptions)
+        )
+        subs = {}
+        for subscription, subscription_id in zip(self.subscriptions, subscription_ids):
+            subs[subscription_id] = subscription.get("type")
+            prefilter = self.prefilters.get(subscription.get("type"))
+            if prefilter is not None:
+                provider.client.prefilters[subscription_id] = prefilter
+        logger.info(f"subscribed to {len(subs)} stream(s) on {provider.name}")
+        return subs
+
+    async def _bench(self, provider: Provider, subs: dict):
+        logger.warning(
+            f"{provider.name} is lagging by {provider.average_lag:.2f}s on average. "
+            f"dropping it for {PROVIDER_COOLDOWN_SECONDS}s"
+        )
+        provider.benched = True
+        for subscription_id in subs:
+            try:
+                await provider.client.request("eth_unsubscribe", [subscription_id])
+            except Exception as e:
+                logger.debug(f"couldn't unsubscribe {subscription_id} on {provider.name}: {e}")
+
+        await asyncio.sleep(PROVIDER_COOLDOWN_SECONDS)
+        provider.benched = False
+        provider.reset_stats()
+
+    async def _run_provider(self, provider: Provider):
+        while True:
+            subs = {}
+            try:
+                await provider.client.ensure_connected()
+                subs = await self._subscribe(provider)
+                provider.failures = 0
+                if self.on_connect is not None:
+                    await self.on_connect()
+
+                async for message in provider.client.notifications():
+                    params = message.get("params")
+                    message_type = subs.get(params.get("subscription"))
+                    if message_type is None:
+                        continue
+
+                    self.publish(message_type, params.get("result"), provider=provider)
+                    if self._is_lagging(provider):
+                        raise ProviderLagging()
+
+            except ProviderLagging:
+                await self._bench(provider, subs)
+            except (ConnectionClosed, OSError, asyncio.TimeoutError, ValueError) as e:
+                provider.failures += 1
+                if provider.failures >= MAX_PROVIDER_FAILURES:
+                    logger.error(f"connection to {provider.name} failed {provider.failures} times. giving up on it")
+                    await provider.client.close()
+                    if not any(p.task is not None and not p.task.done() for p in self.providers if p is not provider):
+                        self._queue.put_nowait(ConnectionError("all websocket providers failed"))
+                    return
+
+                backoff = max(3, min(60, 2**provider.failures))
+                logger.info(f"connection to {provider.name} was closed ({e}), retry in {backoff} seconds")
+                await asyncio.sleep(backoff)
+
+    async def _report_lag(self):
+        while True:
+            await asyncio.sleep(LAG_REPORT_INTERVAL_SECONDS)
+            for provider in self.providers:
+                logger.info(
+                    f"{provider.name}: {provider.first_arrivals}/{provider.arrivals} first arrivals, "
+                    f"average lag {provider.average_lag * 1000:.0f}ms{' (benched)' if provider.benched else ''}"
+                )
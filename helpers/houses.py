@@ -0,0 +1,143 @@
+import json
+import logging
+from typing import Dict, List, Optional
+
+from eth_utils import to_checksum_address
+
+import settings
+from helpers.auction import AuctionState, auction_state
+from helpers.contracts import contract_registry
+from helpers.dedup import EventDeduplicator, event_deduplicator
+from helpers.dispatcher import MessageDispatcher, message_dispatcher
+from helpers.ledger import BidLedger
+from helpers.mempool import PendingPool
+from helpers.ownership import OwnershipIndex
+
+logger = logging.getLogger(__name__)
+
+# ABIs shipped in contracts/, reused for forks that deploy the same contracts
+NOUNS_AUCTION_HOUSE_ADDRESS = "0x830BD73E4184ceF73443C15111a1DF14e495C706"
+NOUNS_TOKEN_ADDRESS = "0x9C8fF314C9Bc7F6e59A9d9225Fb22946427eDC03"
+DEFAULT_NOUN_URL = "https://nouns.wtf/noun/{noun_id}"
+
+
+class AuctionHouse:
+    def __init__(
+        self,
+        name: str,
+        auction_house_address: str,
+        token_address: str,
+        dispatcher: MessageDispatcher,
+        state: Optional[AuctionState] = None,
+        deduplicator: Optional[EventDeduplicator] = None,
+        noun_url: str = DEFAULT_NOUN_URL,
+        bid_notes: bool = False,
+        subgraph: bool = False,
+        token_start_block: int = settings.OWNERSHIP_START_BLOCK,
+    ):
+        self.name = name
+        self.address = to_checksum_address(auction_house_address)
+        self.token_address = to_checksum_address(token_address)
+        self.dispatcher = dispatcher
+        self.state = state or AuctionState(self.address)
+        self.deduplicator = deduplicator or EventDeduplicator(scope=self.address)
+        self.noun_url = noun_url
+        self.bid_notes = bid_notes
+        self.subgraph = subgraph
+        self.pending = PendingPool()
+        self.ledger = BidLedger(self.address)
+        self.ownership = OwnershipIndex(self.token_address, start_block=token_start_block)
+        # set to the name when the webhook is shared with other houses, so its messages can be told apart
+        self.label: Optional[str] = None
+
+        contract_registry.register_like(self.address, NOUNS_AUCTION_HOUSE_ADDRESS)
+        contract_registry.register_like(self.token_address, NOUNS_TOKEN_ADDRESS)
+
+    def get_noun_url(self, noun_id) -> str:
+        return self.noun_url.format(noun_id=noun_id)
+
+
+class AuctionHouses:
+    def __init__(self, houses: List[AuctionHouse]):
+        self.houses = houses
+        self._by_address = {house.address.lower(): house for house in houses}
+        # houses selling the same token share its ownership index
+        self._ownership: Dict[str, OwnershipIndex] = {}
+        for house in houses:
+            house.ownership = self._ownership.setdefault(house.token_address.lower(), house.ownership)
+        for house in houses:
+            if sum(other.dispatcher is house.dispatcher for other in houses) > 1:
+                house.label = house.name
+
+    def __iter__(self):
+        return iter(self.houses)
+
+    def __len__(self):
+        return len(self.houses)
+
+    @property
+    def addresses(self) -> List[str]:
+        return [house.address for house in self.houses]
+
+    @property
+    def token_addresses(self) -> List[str]:
+        return [index.token_address for index in self._ownership.values()]
+
+    @property
+    def ownership_indexes(self) -> List[OwnershipIndex]:
+        return list(self._ownership.values())
+
+    @property
+    def dispatchers(self) -> List[MessageDispatcher]:
+        return list({id(house.dispatcher): house.dispatcher for house in self.houses}.values())
+
+    def get(self, address: Optional[str]) -> Optional[AuctionHouse]:
+        return self._by_address.get((address or "").lower())
+
+    def get_ownership(self, token_address: Optional[str]) -> Optional[OwnershipIndex]:
+        return self._ownership.get((token_address or "").lower())
+
+
+def load_auction_houses(config_path: Optional[str] = settings.AUCTION_HOUSES_CONFIG) -> AuctionHouses:
+    if not config_path:
+        house = AuctionHouse(
+            "nouns",
+            settings.AUCTION_HOUSE_CONTRACT_ADDRESS,
+            settings.TOKEN_CONTRACT_ADDRESS,
+            message_dispatcher,
+            state=auction_state,
+            deduplicator=event_deduplicator,
+            bid_notes=True,
+            subgraph=True,
+        )
+        return AuctionHouses([house])
+
+    with open(config_path, "r") as f:
+        config = json.load(f)
+
+    # houses posting to the same webhook share one dispatcher, and so its queue and rate limit
+    dispatchers: Dict[str, MessageDispatcher] = {settings.NS_WEBHOOK_URL: message_dispatcher}
+    houses = []
+    for entry in config:
+        webhook_url = entry.get("webhook_url", settings.NS_WEBHOOK_URL)
+        if webhook_url not in dispatchers:
+            dispatchers[webhook_url] = MessageDispatcher(webhook_url)
+
+        houses.append(
+            AuctionHouse(
+                entry.get("name"),
+                entry.get("auction_house_address"),
+                entry.get("token_address"),
+                dispatchers[webhook_url],
+                noun_url=entry.get("noun_url", DEFAULT_NOUN_URL),
+                bid_notes=entry.get("bid_notes", False),
+                subgraph=entry.get("subgraph", False),
+                token_start_block=entry.get("token_start_block", settings.OWNERSHIP_START_BLOCK),
+            )
+        )
+
+    logger.info(f"tracking {len(houses)} auction house(s): {', '.join(house.name for house in houses)}")
+    return AuctionHouses(houses)
+
+
+auction_houses = load_auction_houses()
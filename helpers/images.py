@@ -0,0 +1,118 @@
+import asyncio
+import base64
+import functools
+import hashlib
+import io
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+
+import settings
+
+try:
+    import cairosvg
+except ImportError:
+    cairosvg = None
+
+logger = logging.getLogger(__name__)
+
+IMAGE_SIZE_PIXELS = 320
+SVG_DATA_URI_PREFIX = "data:image/svg+xml;base64,"
+
+
+def decode_token_metadata(token_uri: str) -> dict:
+    token_metadata_base64 = token_uri.split(";")[1][7:]
+    return json.loads(base64.b64decode(token_metadata_base64))
+
+
+def prepare_image(image: str) -> Tuple[str, object]:
+    if not image.startswith(SVG_DATA_URI_PREFIX):
+        return hashlib.sha256(image.encode()).hexdigest(), image
+
+    svg = base64.b64decode(image[len(SVG_DATA_URI_PREFIX) :])
+    content_hash = hashlib.sha256(svg).hexdigest()
+    if cairosvg is None:
+        return content_hash, image
+
+    png = cairosvg.svg2png(bytestring=svg, output_width=IMAGE_SIZE_PIXELS, output_height=IMAGE_SIZE_PIXELS)
+    logger.debug(f"rasterized {len(svg)} byte svg to {len(png)} byte png")
+    return content_hash, io.BytesIO(png)
+
+
+class ImagePipeline:
+    def __init__(self, cache_path: Optional[str] = settings.IMAGE_CACHE_PATH, max_workers: int = 2):
+        self.cache_path = cache_path
+        self.max_workers = max_workers
+        # content hash -> uploaded image url
+        self.uploads: Dict[str, str] = {}
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="images")
+        return self._executor
+
+    def load(self):
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return
+
+        with open(self.cache_path) as f:
+            self.uploads = json.load(f)
+        logger.info(f"loaded {len(self.uploads)} uploaded image(s) from {self.cache_path}")
+
+    def save(self):
+        if not self.cache_path:
+            return
+
+        tmp_path = f"{self.cache_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.uploads, f)
+        os.replace(tmp_path, self.cache_path)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        self._executor = None
+        self.save()
+
+    async def _run(self, func, *args, **kwargs):
+        return await asyncio.get_event_loop().run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+
+    async def upload_token_image(self, image_id: str, token_uri: str) -> str:
+        metadata = await self._run(decode_token_metadata, token_uri)
+        content_hash, image = await self._run(prepare_image, metadata.get("image"))
+
+        image_url = self.uploads.get(content_hash)
+        if image_url is not None:
+            self.hits += 1
+            logger.debug(f"image {image_id} already uploaded")
+            return image_url
+
+        self.misses += 1
+
+        future = self._in_flight.get(content_hash)
+        if future is None:
+            future = asyncio.ensure_future(self._upload(content_hash, image_id, image))
+            self._in_flight[content_hash] = future
+            future.add_done_callback(lambda _: self._in_flight.pop(content_hash, None))
+
+        return await asyncio.shield(future)
+
+    async def _upload(self, content_hash: str, image_id: str, image) -> str:
+        # the cloudinary client pulls in requests, and most restarts upload nothing
+        from cloudinary.uploader import upload
+
+        result = await self._run(upload, file=image, public_id=image_id, overwrite=False)
+        image_url = result.get("secure_url")
+        self.uploads[content_hash] = image_url
+        self.save()
+        return image_url
+
+
+image_pipeline = ImagePipeline()
@@ -0,0 +1,153 @@
+import csv
+import logging
+import os
+from array import array
+from collections import OrderedDict
+from decimal import Decimal
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import settings
+
+logger = logging.getLogger(__name__)
+
+MAX_LEDGER_AUCTIONS = 3
+GWEI_PER_ETH = Decimal(10**9)
+CSV_HEADER = ["auction_house", "noun_id", "bid", "bidder", "amount_eth", "block_timestamp"]
+
+
+class BidStats(NamedTuple):
+    bid_count: int
+    bidder_bid_count: int
+    previous_gwei: Optional[int]
+    amount_gwei: int
+    timestamp: int
+
+    @property
+    def increase(self) -> Optional[float]:
+        if not self.previous_gwei:
+            return None
+        return self.amount_gwei / self.previous_gwei - 1
+
+
+class AuctionLedger:
+    def __init__(self, noun_id: int):
+        self.noun_id = noun_id
+        # one entry per bid in arrival order. the contract only accepts raises, so the last one is the high bid
+        self.amounts = array("Q")  # gwei, wei amounts overflow 64 bits
+        self.timestamps = array("L")  # of the block each bid was mined in
+        self.bidders = array("L")  # ids into BidLedger.bidders
+        # bidder id -> indexes of their bids
+        self.by_bidder: Dict[int, array] = {}
+
+    def __len__(self) -> int:
+        return len(self.amounts)
+
+    @property
+    def high_bid(self) -> Optional[Tuple[int, int]]:
+        if not self.amounts:
+            return None
+        return self.bidders[-1], self.amounts[-1]
+
+    def append(self, bidder_id: int, amount_gwei: int, timestamp: int) -> BidStats:
+        previous_gwei = self.amounts[-1] if self.amounts else None
+        self.amounts.append(amount_gwei)
+        self.timestamps.append(timestamp)
+        self.bidders.append(bidder_id)
+        history = self.by_bidder.setdefault(bidder_id, array("L"))
+        history.append(len(self.amounts) - 1)
+        return BidStats(len(self.amounts), len(history), previous_gwei, amount_gwei, timestamp)
+
+    def history(self, bidder_id: int) -> List[Tuple[int, int]]:
+        return [(self.amounts[index], self.timestamps[index]) for index in self.by_bidder.get(bidder_id, ())]
+
+    def leaderboard(self, size: int = 3) -> List[Tuple[int, int]]:
+        # every bidder's best bid is their last one, and later bids are higher
+        last_bids = sorted((indexes[-1] for indexes in self.by_bidder.values()), reverse=True)[:size]
+        return [(self.bidders[index], self.amounts[index]) for index in last_bids]
+
+
+class BidLedger:
+    def __init__(
+        self,
+        auction_house_address: str,
+        csv_path: Optional[str] = settings.BID_LEDGER_PATH,
+        max_auctions: int = MAX_LEDGER_AUCTIONS,
+    ):
+        self.auction_house_address = auction_house_address
+        self.csv_path = csv_path
+        self.max_auctions = max_auctions
+        # bidder addresses are interned, the auctions store their index
+        self.bidders: List[str] = []
+        self._bidder_ids: Dict[str, int] = {}
+        self.auctions: "OrderedDict[int, AuctionLedger]" = OrderedDict()
+
+    def bidder_id(self, bidder: str) -> int:
+        bidder = bidder.lower()
+        bidder_id = self._bidder_ids.get(bidder)
+        if bidder_id is None:
+            bidder_id = self._bidder_ids[bidder] = len(self.bidders)
+            self.bidders.append(bidder)
+        return bidder_id
+
+    def get(self, noun_id: int) -> Optional[AuctionLedger]:
+        return self.auctions.get(noun_id)
+
+    def _auction(self, noun_id: int) -> AuctionLedger:
+        auction = self.auctions.get(noun_id)
+        if auction is None:
+            auction = self.auctions[noun_id] = AuctionLedger(noun_id)
+            self.auctions = OrderedDict(sorted(self.auctions.items()))
+            while len(self.auctions) > self.max_auctions:
+                self.auctions.popitem(last=False)
+        return auction
+
+    def record(self, noun_id: int, bidder: str, wei_amount: int, timestamp: int) -> Optional[BidStats]:
+        auction = self._auction(noun_id)
+        amount_gwei = wei_amount // 10**9
+        # replayed and out-of-order logs never lower the high bid, so they aren't bids to count
+        if auction.amounts and amount_gwei <= auction.amounts[-1]:
+            return None
+        return auction.append(self.bidder_id(bidder), amount_gwei, int(timestamp))
+
+    def leaderboard(self, noun_id: int, size: int = 3) -> List[Tuple[str, Decimal]]:
+        auction = self.auctions.get(noun_id)
+        if auction is None:
+            return []
+        return [(self.bidders[bidder_id], amount / GWEI_PER_ETH) for bidder_id, amount in auction.leaderboard(size)]
+
+    def export(self) -> list:
+        return [
+            [auction.noun_id, self.bidders[auction.bidders[index]], auction.amounts[index], auction.timestamps[index]]
+            for auction in self.auctions.values()
+            for index in range(len(auction))
+        ]
+
+    def restore(self, rows: list):
+        for noun_id, bidder, amount_gwei, timestamp in rows:
+            auction = self._auction(noun_id)
+            if not auction.amounts or amount_gwei > auction.amounts[-1]:
+                auction.append(self.bidder_id(bidder), amount_gwei, timestamp)
+
+    def write_csv(self, noun_id: int):
+        # finished auctions are appended for offline analysis
+        auction = self.auctions.get(noun_id)
+        if not self.csv_path or auction is None or not len(auction):
+            return
+
+        new_file = not os.path.exists(self.csv_path)
+        with open(self.csv_path, "a", newline="") as f:
+            writer = csv.writer(f)
+            if new_file:
+                writer.writerow(CSV_HEADER)
+            for index in range(len(auction)):
+                writer.writerow(
+                    [
+                        self.auction_house_address,
+                        noun_id,
+                        index + 1,
+                        self.bidders[auction.bidders[index]],
+                        f"{auction.amounts[index] / GWEI_PER_ETH}",
+                        auction.timestamps[index],
+                    ]
+                )
+        logger.info(f"wrote {len(auction)} bid(s) on noun {noun_id} to {self.csv_path}")
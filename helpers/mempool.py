@@ -0,0 +1,107 @@
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from eth_utils import to_int
+
+logger = logging.getLogger(__name__)
+
+MAX_PENDING_TRANSACTIONS = 1_000
+PENDING_TRANSACTION_TTL_SECONDS = 600
+# the auction house rejects bids below the high bid plus this increment, so smaller raises aren't worth a message
+MIN_BID_INCREMENT_PERCENTAGE = 2
+
+
+class PendingBid:
+    __slots__ = ("tx_hash", "sender", "nonce", "noun_id", "wei_amount", "gas_price", "seen_at", "announced")
+
+    def __init__(self, tx_hash: str, sender: str, nonce: int, noun_id: int, wei_amount: int, gas_price: int):
+        self.tx_hash = tx_hash
+        self.sender = sender
+        self.nonce = nonce
+        self.noun_id = noun_id
+        self.wei_amount = wei_amount
+        self.gas_price = gas_price
+        self.seen_at = time.monotonic()
+        self.announced = False
+
+
+class PendingPool:
+    def __init__(self, maxsize: int = MAX_PENDING_TRANSACTIONS, ttl_seconds: float = PENDING_TRANSACTION_TTL_SECONDS):
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        # (sender, nonce) -> bid, oldest sighting first. a replacement reuses the key of the transaction it replaces
+        self._bids: "OrderedDict[Tuple[str, int], PendingBid]" = OrderedDict()
+        self._keys: Dict[str, Tuple[str, int]] = {}
+        # hashes of bids already mined, so a late mempool echo isn't tracked again
+        self._mined: "OrderedDict[str, None]" = OrderedDict()
+        self.replaced = 0
+        self.expired = 0
+        self.mined = 0
+
+    def __len__(self) -> int:
+        return len(self._bids)
+
+    def _remove(self, key: Tuple[str, int]) -> Optional[PendingBid]:
+        bid = self._bids.pop(key, None)
+        if bid is not None:
+            self._keys.pop(bid.tx_hash, None)
+        return bid
+
+    def expire(self):
+        expires_before = time.monotonic() - self.ttl_seconds
+        while self._bids:
+            key, bid = next(iter(self._bids.items()))
+            if bid.seen_at >= expires_before and len(self._bids) <= self.maxsize:
+                break
+            self._remove(key)
+            self.expired += 1
+
+    def add(self, tx: dict, noun_id: int, wei_amount: int) -> Tuple[Optional[PendingBid], Optional[PendingBid]]:
+        # returns the tracked bid and the one it replaces, no bid if the transaction was seen or mined already
+        tx_hash = tx.get("hash").lower()
+        if tx_hash in self._keys or tx_hash in self._mined:
+            return None, None
+
+        key = (tx.get("from").lower(), to_int(hexstr=tx.get("nonce", "0x0")))
+        gas_price = to_int(hexstr=tx.get("maxFeePerGas") or tx.get("gasPrice") or "0x0")
+        bid = PendingBid(tx_hash, key[0], key[1], noun_id, wei_amount, gas_price)
+
+        replaced = self._remove(key)
+        if replaced is not None:
+            self.replaced += 1
+            bid.announced = replaced.announced and wei_amount <= replaced.wei_amount
+        self._bids[key] = bid
+        self._keys[tx_hash] = key
+        self.expire()
+        return bid, replaced
+
+    def discard(self, tx_hash: str) -> Optional[PendingBid]:
+        # forget a bid whose handling failed, so a retry tracks it from scratch
+        key = self._keys.get(tx_hash.lower())
+        return self._remove(key) if key is not None else None
+
+    def remove_mined(self, tx_hash: str) -> Optional[PendingBid]:
+        tx_hash = tx_hash.lower()
+        self._mined[tx_hash] = None
+        while len(self._mined) > self.maxsize:
+            self._mined.popitem(last=False)
+
+        key = self._keys.get(tx_hash)
+        if key is None:
+            return None
+        self.mined += 1
+        return self._remove(key)
+
+    def highest_announced(self, noun_id: int) -> int:
+        return max(
+            (bid.wei_amount for bid in self._bids.values() if bid.announced and bid.noun_id == noun_id), default=0
+        )
+
+    def is_material(self, bid: PendingBid, high_bid_wei: int, replaced: Optional[PendingBid] = None) -> bool:
+        # worth announcing only if it beats both the confirmed high bid and what was already announced while pending
+        floor = max(high_bid_wei, self.highest_announced(bid.noun_id))
+        if replaced is not None and replaced.announced:
+            floor = max(floor, replaced.wei_amount)
+        return bid.wei_amount * 100 >= floor * (100 + MIN_BID_INCREMENT_PERCENTAGE) and bid.wei_amount > floor
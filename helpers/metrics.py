@@ -0,0 +1,219 @@
+import asyncio
+import logging
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Dict, Optional, Tuple
+
+from aiohttp import web
+
+import settings
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS_SECONDS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21)
+SUMMARY_INTERVAL_SECONDS = 300
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS_SECONDS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> Optional[float]:
+        # upper bound of the bucket holding the q-th observation, good enough for a log line
+        if not self.count:
+            return None
+
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+class EventTrace:
+    def __init__(self, message_type: str, received_at: float):
+        self.message_type = message_type
+        self.received_at = received_at
+        self.rpc_calls = 0
+
+
+# the event being handled by the current task, copied into any task or gather it spawns
+current_trace: ContextVar[Optional[EventTrace]] = ContextVar("current_trace", default=None)
+
+
+class _Timer:
+    __slots__ = ("registry", "name", "labels", "started_at")
+
+    def __init__(self, registry: "MetricsRegistry", name: str, labels: Labels):
+        self.registry = registry
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.started_at = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.registry.histogram(self.name, self.labels).observe(time.perf_counter() - self.started_at)
+
+
+class MetricsRegistry:
+    def __init__(self, namespace: str = "nounoclock"):
+        self.namespace = namespace
+        self.counters: Dict[str, Dict[Labels, float]] = {}
+        self.histograms: Dict[str, Dict[Labels, Histogram]] = {}
+        # read when scraped, so counters kept by other components cost nothing on the hot path
+        self.collected: Dict[str, Tuple[str, Dict[Labels, Callable[[], float]]]] = {}
+        self.help: Dict[str, str] = {}
+
+    def describe(self, name: str, help_text: str):
+        self.help[name] = help_text
+
+    def inc(self, name: str, value: float = 1, **labels):
+        series = self.counters.setdefault(name, {})
+        key = tuple(sorted(labels.items()))
+        series[key] = series.get(key, 0) + value
+
+    def histogram(self, name: str, labels: Labels = (), buckets: tuple = LATENCY_BUCKETS_SECONDS) -> Histogram:
+        series = self.histograms.setdefault(name, {})
+        histogram = series.get(labels)
+        if histogram is None:
+            histogram = series[labels] = Histogram(buckets)
+        return histogram
+
+    def observe(self, name: str, value: float, buckets: tuple = LATENCY_BUCKETS_SECONDS, **labels):
+        self.histogram(name, tuple(sorted(labels.items())), buckets).observe(value)
+
+    def time(self, name: str, **labels) -> _Timer:
+        return _Timer(self, name, tuple(sorted(labels.items())))
+
+    def collect(self, name: str, func: Callable[[], float], kind: str = "gauge", **labels):
+        _, series = self.collected.setdefault(name, (kind, {}))
+        series[tuple(sorted(labels.items()))] = func
+
+    def total(self, name: str) -> float:
+        return sum(self.counters.get(name, {}).values())
+
+    def merged_histogram(self, name: str) -> Histogram:
+        series = list(self.histograms.get(name, {}).values())
+        merged = Histogram(series[0].buckets if series else LATENCY_BUCKETS_SECONDS)
+        for histogram in series:
+            merged.counts = [a + b for a, b in zip(merged.counts, histogram.counts)]
+            merged.count += histogram.count
+            merged.sum += histogram.sum
+        return merged
+
+    def _header(self, lines: list, name: str, kind: str) -> str:
+        full_name = f"{self.namespace}_{name}"
+        if name in self.help:
+            lines.append(f"# HELP {full_name} {self.help[name]}")
+        lines.append(f"# TYPE {full_name} {kind}")
+        return full_name
+
+    def render(self) -> str:
+        lines = []
+        for name, series in sorted(self.counters.items()):
+            full_name = self._header(lines, name, "counter")
+            for labels, value in series.items():
+                lines.append(f"{full_name}{_format_labels(labels)} {value}")
+
+        for name, (kind, series) in sorted(self.collected.items()):
+            full_name = self._header(lines, name, kind)
+            for labels, func in series.items():
+                try:
+                    value = func()
+                except Exception as e:
+                    logger.debug(f"couldn't collect {name}: {e}")
+                    continue
+                lines.append(f"{full_name}{_format_labels(labels)} {value}")
+
+        for name, series in sorted(self.histograms.items()):
+            full_name = self._header(lines, name, "histogram")
+            for labels, histogram in series.items():
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f"{full_name}_bucket{_format_labels(labels + (('le', str(bound)),))} {cumulative}")
+                lines.append(f"{full_name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {histogram.count}")
+                lines.append(f"{full_name}_sum{_format_labels(labels)} {histogram.sum}")
+                lines.append(f"{full_name}_count{_format_labels(labels)} {histogram.count}")
+
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+
+    pairs = ",".join(f'{key}="{str(value)}"' for key, value in labels)
+    return f"{{{pairs}}}"
+
+
+metrics = MetricsRegistry()
+
+
+class MetricsExporter:
+    def __init__(
+        self,
+        registry: MetricsRegistry = metrics,
+        host: str = settings.METRICS_HOST,
+        port: Optional[int] = settings.METRICS_PORT,
+        summarize: Optional[Callable[[], str]] = None,
+        summary_interval_seconds: float = SUMMARY_INTERVAL_SECONDS,
+    ):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self.summarize = summarize
+        self.summary_interval_seconds = summary_interval_seconds
+        self._runner: Optional[web.AppRunner] = None
+        self._summary_task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if self.summarize is not None:
+            self._summary_task = asyncio.ensure_future(self._log_summaries())
+
+        if not self.port:
+            return
+
+        app = web.Application()
+        app.router.add_get("/metrics", self._handle_metrics)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logger.info(f"serving metrics on http://{self.host}:{self.port}/metrics")
+
+    async def close(self):
+        if self._summary_task is not None:
+            self._summary_task.cancel()
+            await asyncio.gather(self._summary_task, return_exceptions=True)
+        self._summary_task = None
+
+        if self._runner is not None:
+            await self._runner.cleanup()
+        self._runner = None
+
+    async def _handle_metrics(self, request: web.Request) -> web.Response:
+        return web.Response(text=self.registry.render(), content_type="text/plain", charset="utf-8")
+
+    async def _log_summaries(self):
+        while True:
+            await asyncio.sleep(self.summary_interval_seconds)
+            try:
+                logger.info(self.summarize())
+            except Exception as e:
+                logger.warning(f"couldn't summarize metrics: {e}")
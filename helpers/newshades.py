@@ -1,39 +1,72 @@
 import logging
 from decimal import Decimal
-from typing import Union
+from typing import List, Optional, Tuple, Union
 
-import requests
-
-import settings
-from helpers.w3 import get_wallet_short_name
+from helpers.dispatcher import MessageDispatcher, message_dispatcher
+from helpers.w3 import get_wallet_short_name, get_wallet_short_names
 
 logger = logging.getLogger(__name__)
 
 
-async def create_message(data):
-    response = requests.post(settings.NS_WEBHOOK_URL, json=data)
-    if not response.ok:
-        logger.error(f"problems creating message via webhook: {response.status_code} {response.text}")
-
-
-async def create_finalized_auction_message(noun_id: str, bidder: str, amount: Union[int, Decimal]):
+async def create_message(
+    data,
+    noun_id=None,
+    coalesce_key=None,
+    dispatcher: MessageDispatcher = message_dispatcher,
+    house_name: Optional[str] = None,
+):
+    # houses sharing a webhook say which one a message is about
+    if house_name:
+        data["blocks"][0]["children"].insert(0, {"text": f"[{house_name}] ", "bold": True})
+    await dispatcher.send(data, noun_id=noun_id, coalesce_key=coalesce_key)
+
+
+async def create_finalized_auction_message(
+    noun_id: str,
+    bidder: str,
+    amount: Union[int, Decimal],
+    leaderboard: Optional[List[Tuple[str, Decimal]]] = None,
+    bid_count: int = 0,
+    bidder_count: int = 0,
+    dispatcher: MessageDispatcher = message_dispatcher,
+    house_name: Optional[str] = None,
+):
     bidder = await get_wallet_short_name(address=bidder)
-    data = {
-        "blocks": [
+    blocks = [
+        {
+            "type": "paragraph",
+            "children": [
+                {"text": f"{bidder} is the owner of noun {noun_id} at "},
+                {"text": f"Ξ{amount:.2f}", "bold": True},
+            ],
+        }
+    ]
+
+    if leaderboard and bidder_count > 1:
+        names = await get_wallet_short_names([address for address, _ in leaderboard])
+        top_bids = ", ".join(f"{name} (Ξ{bid:.2f})" for name, (_, bid) in zip(names, leaderboard))
+        blocks.append(
             {
                 "type": "paragraph",
                 "children": [
-                    {"text": f"{bidder} is the owner of noun {noun_id} at "},
-                    {"text": f"Ξ{amount:.2f}", "bold": True},
+                    {"text": f"{bid_count} bids from {bidder_count} bidders. top bids: {top_bids}", "italic": True}
                 ],
             }
-        ]
-    }
+        )
+
+    data = {"blocks": blocks}
 
-    await create_message(data)
+    await create_message(data, noun_id=noun_id, dispatcher=dispatcher, house_name=house_name)
 
 
-async def create_new_auction_message(noun_id: str, image_url: str):
+async def create_new_auction_message(
+    noun_id: str,
+    image_url: str,
+    noun_url: Optional[str] = None,
+    dispatcher: MessageDispatcher = message_dispatcher,
+    house_name: Optional[str] = None,
+):
+    noun_url = noun_url or f"https://nouns.wtf/noun/{noun_id}"
     new_auction_message = {
         "type": "paragraph",
         "children": [
@@ -54,22 +87,33 @@ async def create_new_auction_message(noun_id: str, image_url: str):
                 "children": [
                     {
                         "type": "link",
-                        "url": f"https://nouns.wtf/noun/{noun_id}",
-                        "children": [{"text": f"https://nouns.wtf/noun/{noun_id}"}],
+                        "url": noun_url,
+                        "children": [{"text": noun_url}],
                     }
                 ],
             },
         ],
     }
-    await create_message(data)
-
-
-async def new_bid_message(amount, bidder, bid_note=None, stats_text=None):
+    await create_message(data, noun_id=noun_id, dispatcher=dispatcher, house_name=house_name)
+
+
+async def new_bid_message(
+    amount,
+    bidder,
+    bid_note=None,
+    stats_text=None,
+    ledger_text=None,
+    noun_id=None,
+    dispatcher: MessageDispatcher = message_dispatcher,
+    house_name: Optional[str] = None,
+):
     bidder = await get_wallet_short_name(address=bidder)
 
     bid_message = [{"text": f"Ξ{amount:.2f} bid from "}, {"text": f"{bidder}", "bold": True}]
     if stats_text and stats_text != "":
         bid_message.append({"text": f"\n[{stats_text}]", "italic": True})
+    if ledger_text:
+        bid_message.append({"text": f"\n{ledger_text}", "italic": True})
 
     blocks = [
         {
@@ -90,10 +134,17 @@ async def new_bid_message(amount, bidder, bid_note=None, stats_text=None):
         )
 
     data = {"blocks": blocks}
-    await create_message(data)
+    await create_message(data, noun_id=noun_id, dispatcher=dispatcher, house_name=house_name)
 
 
-async def new_pending_bid_message(amount, bidder):
+async def new_pending_bid_message(
+    amount,
+    bidder,
+    noun_id=None,
+    dispatcher: MessageDispatcher = message_dispatcher,
+    house_name: Optional[str] = None,
+    auction_house_address: Optional[str] = None,
+):
     bidder = await get_wallet_short_name(address=bidder)
     blocks = [
         {
@@ -103,10 +154,14 @@ async def new_pending_bid_message(amount, bidder):
     ]
 
     data = {"blocks": blocks}
-    await create_message(data)
+    # houses sharing a dispatcher can be on the same noun id
+    coalesce_key = ("pending-bids", auction_house_address, noun_id)
+    await create_message(data, noun_id=noun_id, coalesce_key=coalesce_key, dispatcher=dispatcher, house_name=house_name)
 
 
-async def new_pending_settlement_message(settler):
+async def new_pending_settlement_message(
+    settler, noun_id=None, dispatcher: MessageDispatcher = message_dispatcher, house_name: Optional[str] = None
+):
     settler = await get_wallet_short_name(address=settler)
     blocks = [
         {
@@ -119,4 +174,4 @@ async def new_pending_settlement_message(settler):
     ]
 
     data = {"blocks": blocks}
-    await create_message(data)
+    await create_message(data, noun_id=noun_id, dispatcher=dispatcher, house_name=house_name)
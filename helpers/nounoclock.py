@@ -1,27 +1,138 @@
+import asyncio
 import logging
-from typing import Optional
+import time
+from typing import Dict, Optional
 
-import aiohttp
+import settings
+from helpers.sessions import get_http_session
 
 logger = logging.getLogger(__name__)
 
-NOUN_O_CLOCK_ENDPOINT = "https://noc-app-prod.herokuapp.com"
+NOUN_O_CLOCK_ENDPOINT = settings.NOUN_O_CLOCK_URL
+NOTES_REFRESH_INTERVAL_SECONDS = 5
+NOTES_MIN_REFRESH_AGE_SECONDS = 1
 
 
-async def get_bid_notes(noun_id, bidder_address, bidder_weth) -> Optional[str]:
-    notes_endpoint = f"{NOUN_O_CLOCK_ENDPOINT}/notes/{noun_id}"
-    async with aiohttp.ClientSession() as session:
-        async with session.get(notes_endpoint) as response:
+class BidNotesCache:
+    def __init__(
+        self,
+        refresh_interval_seconds: float = NOTES_REFRESH_INTERVAL_SECONDS,
+        min_refresh_age_seconds: float = NOTES_MIN_REFRESH_AGE_SECONDS,
+    ):
+        self.refresh_interval_seconds = refresh_interval_seconds
+        self.min_refresh_age_seconds = min_refresh_age_seconds
+        self.noun_id: Optional[str] = None
+        self._notes: Dict[str, dict] = {}
+        self._validators: Dict[str, dict] = {}
+        self._fetched_at: Dict[str, float] = {}
+        self._refreshes: Dict[str, asyncio.Future] = {}
+        self._refresh_task: Optional[asyncio.Task] = None
+        self.hits = 0
+        self.misses = 0
+
+    def track(self, noun_id):
+        noun_id = str(noun_id)
+        if noun_id == self.noun_id and self._refresh_task is not None and not self._refresh_task.done():
+            return
+
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+
+        for cached_noun_id in list(self._notes):
+            if cached_noun_id != noun_id:
+                self._forget(cached_noun_id)
+
+        self.noun_id = noun_id
+        self._refresh_task = asyncio.ensure_future(self._refresh_periodically(noun_id))
+
+    def export(self) -> Optional[dict]:
+        if self.noun_id is None:
+            return None
+        return {
+            "noun_id": self.noun_id,
+            "notes": self._notes.get(self.noun_id, {}),
+            "validators": self._validators.get(self.noun_id, {}),
+        }
+
+    def restore(self, saved: Optional[dict]):
+        # the next refresh revalidates the restored notes with their etag, usually a cheap 304
+        if not saved:
+            return
+        self._notes[saved.get("noun_id")] = saved.get("notes")
+        self._validators[saved.get("noun_id")] = saved.get("validators")
+
+    def _forget(self, noun_id: str):
+        self._notes.pop(noun_id, None)
+        self._validators.pop(noun_id, None)
+        self._fetched_at.pop(noun_id, None)
+
+    async def _refresh_periodically(self, noun_id: str):
+        while True:
+            try:
+                await self.refresh(noun_id)
+            except Exception as e:
+                logger.warning(f"issue refreshing bid notes for noun {noun_id}: {e}")
+            await asyncio.sleep(self.refresh_interval_seconds)
+
+    async def refresh(self, noun_id: str) -> dict:
+        future = self._refreshes.get(noun_id)
+        if future is None:
+            future = asyncio.ensure_future(self._fetch(noun_id))
+            self._refreshes[noun_id] = future
+            future.add_done_callback(lambda _: self._refreshes.pop(noun_id, None))
+
+        return await asyncio.shield(future)
+
+    async def _fetch(self, noun_id: str) -> dict:
+        notes_endpoint = f"{NOUN_O_CLOCK_ENDPOINT}/notes/{noun_id}"
+        validators = self._validators.get(noun_id, {})
+        headers = {}
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators.get("etag")
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators.get("last_modified")
+
+        async with get_http_session().get(notes_endpoint, headers=headers) as response:
+            if response.status == 304:
+                self._fetched_at[noun_id] = time.time()
+                return self._notes.get(noun_id, {})
+
             if not response.ok:
                 text = await response.text()
                 logger.warning(f"problem with response: {response.status} {text}")
                 response.raise_for_status()
 
-            json_resp = await response.json()
-            note_id = f"{noun_id}-{bidder_address.lower()}-{bidder_weth}"
+            notes = await response.json()
+
+            self._notes[noun_id] = notes
+            self._fetched_at[noun_id] = time.time()
+            self._validators[noun_id] = {
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+            }
+            return notes
+
+    async def get_note(self, noun_id, bidder_address: str, bidder_weth) -> Optional[str]:
+        noun_id = str(noun_id)
+        note_id = f"{noun_id}-{bidder_address.lower()}-{bidder_weth}"
+
+        notes = self._notes.get(noun_id)
+        fetched_at = self._fetched_at.get(noun_id, 0)
+        if notes is None or (note_id not in notes and time.time() - fetched_at > self.min_refresh_age_seconds):
+            self.misses += 1
+            notes = await self.refresh(noun_id)
+        else:
+            self.hits += 1
 
-            note = json_resp.get(note_id, None)
-            if note:
-                logger.info(f"noun-o-clock app note: {note}")
+        return notes.get(note_id, None)
+
+
+bid_notes_cache = BidNotesCache()
+
+
+async def get_bid_notes(noun_id, bidder_address, bidder_weth) -> Optional[str]:
+    note = await bid_notes_cache.get_note(noun_id, bidder_address, bidder_weth)
+    if note:
+        logger.info(f"noun-o-clock app note: {note}")
 
-            return note
+    return note
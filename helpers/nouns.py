@@ -1,22 +1,25 @@
-import base64
-import json
-from datetime import datetime
+from typing import NamedTuple, Optional
 
 import settings
-from helpers.w3 import get_contract
+from helpers.contracts import get_contract
+from helpers.ownership import OwnershipIndex
+from helpers.w3 import chain_client, ens_resolver, multicall, multicall_contract
 
 
-async def get_noun_metadata(noun_id: str):
-    nouns_contract = get_contract(settings.TOKEN_CONTRACT_ADDRESS)
-    token_uri = nouns_contract.functions.tokenURI(noun_id).call()
-    token_metadata_base64 = token_uri.split(";")[1][7:]
-    token_metadata = json.loads(base64.b64decode(token_metadata_base64))
-    return token_metadata
+class BidderProfile(NamedTuple):
+    wallet_balance: Optional[int]
+    holding_nouns: Optional[int]
+    ens_name: Optional[str]
 
 
-async def get_current_auction():
-    contract = get_contract(settings.AUCTION_HOUSE_CONTRACT_ADDRESS)
-    curr_auction_info = contract.functions.auction().call()
+async def get_token_uri(noun_id: str, token_address: str = settings.TOKEN_CONTRACT_ADDRESS) -> str:
+    nouns_contract = get_contract(token_address)
+    return await chain_client.call(nouns_contract.functions.tokenURI(int(noun_id)))
+
+
+async def get_current_auction(auction_house_address: str = settings.AUCTION_HOUSE_CONTRACT_ADDRESS):
+    contract = get_contract(auction_house_address)
+    curr_auction_info = await chain_client.call(contract.functions.auction())
     noun_id, wei_amount, start_time, end_time, bidder, settled = curr_auction_info
     return {
         "noun_id": noun_id,
@@ -28,14 +31,26 @@ async def get_current_auction():
     }
 
 
-async def get_current_noun_id():
-    curr_auction = await get_current_auction()
-    return curr_auction.get("noun_id", None)
-
-
-async def get_curr_auction_remaining_seconds():
-    auction = await get_current_auction()
-    end_time = auction.get("end_time")
-    end_date = datetime.fromtimestamp(end_time)
-    seconds_remaining = int((end_date - datetime.now()).total_seconds())
-    return seconds_remaining
+async def get_bidder_profile(
+    wallet_address: str,
+    token_address: str = settings.TOKEN_CONTRACT_ADDRESS,
+    ownership: Optional[OwnershipIndex] = None,
+) -> BidderProfile:
+    calls = [
+        multicall_contract.functions.getEthBalance(wallet_address),
+        ens_resolver.reverse_records.functions.getNames([wallet_address]),
+    ]
+    # the local index answers holdings once it caught up, until then the token contract does
+    holding_nouns = ownership.holding_count(wallet_address) if ownership is not None else None
+    if holding_nouns is None:
+        calls.append(get_contract(token_address).functions.balanceOf(wallet_address))
+
+    wallet_balance, ens_names, *balance = await multicall(calls)
+    if balance:
+        holding_nouns = balance[0]
+
+    ens_name = ens_names[0] if ens_names else None
+    if ens_names is not None:
+        ens_resolver.remember(wallet_address, ens_name)
+
+    return BidderProfile(wallet_balance=wallet_balance, holding_nouns=holding_nouns, ens_name=ens_name or None)
@@ -0,0 +1,146 @@
+import json
+import logging
+import os
+import time
+from typing import Dict, Optional, Set, Tuple
+
+from eth_utils import to_checksum_address, to_int
+
+import settings
+from helpers.backfill import get_logs
+from helpers.w3 import chain_client
+
+logger = logging.getLogger(__name__)
+
+TRANSFER_TOPIC = "0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef"
+ZERO_ADDRESS = "0x0000000000000000000000000000000000000000"
+# transfers are sparse, so the bootstrap can ask for much wider ranges than the auction backfill
+TRANSFER_LOGS_CHUNK_BLOCKS = 100_000
+SNAPSHOT_VERSION = 1
+
+
+def _topic_address(topic: str) -> str:
+    return "0x" + topic[-40:].lower()
+
+
+class OwnershipIndex:
+    def __init__(
+        self,
+        token_address: str,
+        start_block: int = settings.OWNERSHIP_START_BLOCK,
+        snapshot_dir: Optional[str] = settings.OWNERSHIP_SNAPSHOT_DIR,
+    ):
+        self.token_address = to_checksum_address(token_address)
+        self.start_block = start_block
+        self.path = os.path.join(snapshot_dir, f"{self.token_address}.json") if snapshot_dir else None
+        # every transfer up to and including this block has been applied
+        self.block_number: Optional[int] = None
+        self.owners: Dict[int, str] = {}
+        self.holdings: Dict[str, Set[int]] = {}
+        self.ready = False
+        # token id -> (block, log index) of the last transfer applied, so replays and late logs can't go back in time
+        self._positions: Dict[int, Tuple[int, int]] = {}
+        self._loaded_position = (-1, -1)
+        self._syncing = False
+
+    def __len__(self) -> int:
+        return len(self.owners)
+
+    def holding_count(self, wallet_address: str) -> Optional[int]:
+        if not self.ready:
+            return None
+        return len(self.holdings.get(wallet_address.lower(), ()))
+
+    def _set_owner(self, token_id: int, owner: str):
+        previous = self.owners.pop(token_id, None)
+        if previous is not None:
+            tokens = self.holdings.get(previous)
+            tokens.discard(token_id)
+            if not tokens:
+                del self.holdings[previous]
+
+        if owner != ZERO_ADDRESS:
+            self.owners[token_id] = owner
+            self.holdings.setdefault(owner, set()).add(token_id)
+
+    def apply(self, log: dict) -> bool:
+        topics = log.get("topics")
+        if len(topics) != 4 or topics[0].lower() != TRANSFER_TOPIC:
+            return False
+
+        token_id = int(topics[3], 16)
+        position = (int(log.get("blockNumber"), 16), int(log.get("logIndex"), 16))
+        last_position = self._positions.get(token_id, self._loaded_position)
+        sender, recipient = _topic_address(topics[1]), _topic_address(topics[2])
+
+        if log.get("removed"):
+            # a reorg dropped the transfer we applied last: hand the token back
+            if position == last_position:
+                self._set_owner(token_id, sender)
+                self._positions.pop(token_id, None)
+            return True
+
+        if position <= last_position:
+            return False
+
+        self._set_owner(token_id, recipient)
+        self._positions[token_id] = position
+        return True
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+
+        with open(self.path) as f:
+            snapshot = json.load(f)
+        if snapshot.get("version") != SNAPSHOT_VERSION:
+            logger.warning(f"ignoring ownership snapshot {self.path} with unknown version {snapshot.get('version')}")
+            return
+
+        # owners are stored by token id, null for tokens that don't exist (anymore)
+        for token_id, owner in enumerate(snapshot.get("owners")):
+            if owner is not None:
+                self._set_owner(token_id, owner)
+        self.block_number = snapshot.get("block_number")
+        self._loaded_position = (self.block_number, 2**63)
+        logger.info(f"loaded owners of {len(self.owners)} token(s) up to block {self.block_number} from {self.path}")
+
+    def save(self):
+        if not self.path or self.block_number is None:
+            return
+
+        owners = [None] * (max(self.owners, default=-1) + 1)
+        for token_id, owner in self.owners.items():
+            owners[token_id] = owner
+
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"version": SNAPSHOT_VERSION, "block_number": self.block_number, "owners": owners}, f)
+        os.replace(tmp_path, self.path)
+
+    async def sync(self):
+        # catch up from the snapshot (or the token deployment) to the chain head, live transfers apply meanwhile
+        if self._syncing:
+            return
+
+        self._syncing = True
+        try:
+            head = to_int(hexstr=await chain_client.request("eth_blockNumber", []))
+            from_block = self.start_block if self.block_number is None else self.block_number + 1
+            if from_block <= head:
+                started_at = time.time()
+                logs = await get_logs(
+                    self.token_address, [TRANSFER_TOPIC], from_block, head, chunk_blocks=TRANSFER_LOGS_CHUNK_BLOCKS
+                )
+                for log in logs:
+                    self.apply(log)
+                logger.info(
+                    f"indexed {len(logs)} transfer(s) of {self.token_address} from blocks {from_block}-{head} "
+                    f"in {time.time() - started_at:.2f}s. {len(self.holdings)} holder(s) of {len(self.owners)} token(s)"
+                )
+
+            self.block_number = head
+            self.ready = True
+            self.save()
+        finally:
+            self._syncing = False
@@ -0,0 +1,206 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+MIN_WORKERS = 2
+MAX_WORKERS = 10
+JOBS_PER_WORKER = 4
+SCALE_INTERVAL_SECONDS = 1
+MAX_ATTEMPTS = 5
+RETRY_DELAY_SECONDS = 3
+DRAIN_POLL_SECONDS = 0.05
+
+
+class Lane:
+    def __init__(self, name: str, priority: int, maxsize: int, drop_oldest: bool = False, stale_seconds: float = 0):
+        self.name = name
+        self.priority = priority
+        self.maxsize = maxsize
+        self.drop_oldest = drop_oldest
+        self.stale_seconds = stale_seconds
+        self.jobs: Deque["Job"] = deque()
+        self.dropped = 0
+
+    def full(self) -> bool:
+        return len(self.jobs) >= self.maxsize
+
+
+class Job:
+    def __init__(self, lane: Lane, payload: Any):
+        self.lane = lane
+        self.payload = payload
+        self.attempts = 0
+        self.enqueued_at = time.monotonic()
+
+    @property
+    def stale(self) -> bool:
+        return self.lane.stale_seconds > 0 and time.monotonic() - self.enqueued_at > self.lane.stale_seconds
+
+
+class PriorityScheduler:
+    def __init__(
+        self,
+        handler: Callable[[Any], Awaitable[Any]],
+        lanes: List[Lane],
+        min_workers: int = MIN_WORKERS,
+        max_workers: int = MAX_WORKERS,
+        max_attempts: int = MAX_ATTEMPTS,
+        retry_delay_seconds: float = RETRY_DELAY_SECONDS,
+        on_done: Optional[Callable[[Any], None]] = None,
+    ):
+        self.handler = handler
+        # called once per job when it is handled, given up on or dropped, not after every attempt
+        self.on_done = on_done
+        self.lanes = sorted(lanes, key=lambda lane: lane.priority)
+        self.lanes_by_name = {lane.name: lane for lane in lanes}
+        self.min_workers = min_workers
+        self.max_workers = max_workers
+        self.max_attempts = max_attempts
+        self.retry_delay_seconds = retry_delay_seconds
+        self.failed = 0
+        self.retried = 0
+        self._ready: Optional[asyncio.Semaphore] = None
+        self._space_freed: Optional[asyncio.Event] = None
+        self._retry_wakeup: Optional[asyncio.Event] = None
+        self._retries: List[tuple] = []
+        self._retry_ids = itertools.count()
+        self._workers: Set[asyncio.Task] = set()
+        self._busy: Dict[asyncio.Task, bool] = {}
+        self._tasks: List[asyncio.Task] = []
+
+    @property
+    def depth(self) -> int:
+        return sum(len(lane.jobs) for lane in self.lanes)
+
+    def start(self):
+        self._ready = asyncio.Semaphore(0)
+        self._space_freed = asyncio.Event()
+        self._retry_wakeup = asyncio.Event()
+        self._tasks = [asyncio.ensure_future(self._run_retries()), asyncio.ensure_future(self._autoscale())]
+        for _ in range(self.min_workers):
+            self._spawn_worker()
+
+    async def close(self):
+        tasks = self._tasks + list(self._workers)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks = []
+        self._workers.clear()
+        self._busy.clear()
+
+    async def drain(self):
+        # until every queued job, pending retry and running handler is done
+        while self.depth or self._retries or any(self._busy.values()):
+            await asyncio.sleep(DRAIN_POLL_SECONDS)
+
+    async def put(self, lane_name: str, payload: Any):
+        lane = self.lanes_by_name[lane_name]
+        if lane.full():
+            if lane.drop_oldest:
+                self._done(lane.jobs.popleft())
+                lane.dropped += 1
+                logger.debug("%s lane full, dropped oldest job (%d dropped)", lane.name, lane.dropped)
+                lane.jobs.append(Job(lane, payload))
+                return
+
+            while lane.full():
+                self._space_freed.clear()
+                await self._space_freed.wait()
+
+        self._push(Job(lane, payload))
+
+    def _push(self, job: Job):
+        job.lane.jobs.append(job)
+        self._ready.release()
+
+    async def _next_job(self) -> Job:
+        while True:
+            await self._ready.acquire()
+            lane = next(lane for lane in self.lanes if lane.jobs)
+            job = lane.jobs.popleft()
+            self._space_freed.set()
+
+            if job.stale and job.attempts == 0:
+                lane.dropped += 1
+                logger.debug("dropping stale %s job", lane.name)
+                self._done(job)
+                continue
+
+            return job
+
+    def _spawn_worker(self):
+        task = asyncio.ensure_future(self._worker())
+        self._workers.add(task)
+        self._busy[task] = False
+        task.add_done_callback(self._workers.discard)
+        task.add_done_callback(lambda t: self._busy.pop(t, None))
+
+    async def _worker(self):
+        task = asyncio.current_task()
+        while True:
+            job = await self._next_job()
+            self._busy[task] = True
+            try:
+                await self.handler(job.payload)
+            except Exception as e:
+                self._retry_later(job, e)
+            else:
+                self._done(job)
+            finally:
+                self._busy[task] = False
+
+    def _done(self, job: Job):
+        if self.on_done is not None:
+            self.on_done(job.payload)
+
+    def _retry_later(self, job: Job, error: Exception):
+        job.attempts += 1
+        if job.attempts >= self.max_attempts:
+            self.failed += 1
+            logger.error(f"giving up on {job.lane.name} job after {job.attempts} attempts: {error}")
+            self._done(job)
+            return
+
+        self.retried += 1
+        delay = self.retry_delay_seconds * job.attempts
+        logger.warning(f"problems handling {job.lane.name} job: {error}. retrying in {delay}s")
+        heapq.heappush(self._retries, (time.monotonic() + delay, next(self._retry_ids), job))
+        self._retry_wakeup.set()
+
+    async def _run_retries(self):
+        while True:
+            self._retry_wakeup.clear()
+            timeout = None
+            now = time.monotonic()
+            while self._retries and self._retries[0][0] <= now:
+                _, _, job = heapq.heappop(self._retries)
+                self._push(job)
+            if self._retries:
+                timeout = self._retries[0][0] - now
+
+            try:
+                await asyncio.wait_for(self._retry_wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _autoscale(self):
+        while True:
+            await asyncio.sleep(SCALE_INTERVAL_SECONDS)
+            depth = self.depth
+            wanted = max(self.min_workers, min(self.max_workers, math.ceil(depth / JOBS_PER_WORKER)))
+            if len(self._workers) < wanted:
+                logger.info(f"queue depth {depth}: scaling up to {wanted} workers")
+                for _ in range(wanted - len(self._workers)):
+                    self._spawn_worker()
+            elif depth == 0 and len(self._workers) > wanted:
+                idle = [task for task, busy in self._busy.items() if not busy]
+                for task in idle[: len(self._workers) - wanted]:
+                    task.cancel()
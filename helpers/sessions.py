@@ -0,0 +1,61 @@
+import logging
+from typing import Optional
+
+import aiohttp
+
+import settings
+
+logger = logging.getLogger(__name__)
+
+DNS_CACHE_TTL_SECONDS = 300
+KEEPALIVE_TIMEOUT_SECONDS = 60
+
+
+class HTTPSessionManager:
+    def __init__(
+        self,
+        timeout_seconds: float = settings.HTTP_TIMEOUT_SECONDS,
+        connections_per_host: int = settings.HTTP_CONNECTIONS_PER_HOST,
+    ):
+        self.timeout_seconds = timeout_seconds
+        self.connections_per_host = connections_per_host
+        self._connector: Optional[aiohttp.TCPConnector] = None
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    @property
+    def connector(self) -> aiohttp.TCPConnector:
+        if self._connector is None or self._connector.closed:
+            self._connector = aiohttp.TCPConnector(
+                limit_per_host=self.connections_per_host,
+                ttl_dns_cache=DNS_CACHE_TTL_SECONDS,
+                keepalive_timeout=KEEPALIVE_TIMEOUT_SECONDS,
+            )
+        return self._connector
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=self.connector,
+                connector_owner=False,
+                timeout=aiohttp.ClientTimeout(total=self.timeout_seconds),
+            )
+        return self._session
+
+    def open(self):
+        return self.session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+        if self._connector is not None:
+            await self._connector.close()
+        self._session = None
+        self._connector = None
+
+
+http_sessions = HTTPSessionManager()
+
+
+def get_http_session() -> aiohttp.ClientSession:
+    return http_sessions.session
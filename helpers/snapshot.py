@@ -0,0 +1,58 @@
+import json
+import logging
+import os
+import time
+from typing import Optional
+
+import settings
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 1
+# older state would mostly be replayed from logs anyway, and a cold start is cheaper than a long backfill
+MAX_SNAPSHOT_AGE_SECONDS = 3_600
+
+
+class StateSnapshot:
+    def __init__(
+        self, path: Optional[str] = settings.STATE_SNAPSHOT_PATH, max_age_seconds: float = MAX_SNAPSHOT_AGE_SECONDS
+    ):
+        self.path = path
+        self.max_age_seconds = max_age_seconds
+
+    def load(self) -> dict:
+        if not self.path or not os.path.exists(self.path):
+            return {}
+
+        try:
+            with open(self.path) as f:
+                state = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"couldn't read state snapshot {self.path}: {e}. starting cold")
+            return {}
+
+        if state.get("version") != SNAPSHOT_VERSION:
+            logger.warning(f"ignoring state snapshot {self.path} with unknown version {state.get('version')}")
+            return {}
+
+        age = time.time() - state.get("saved_at", 0)
+        if age > self.max_age_seconds:
+            logger.info(f"state snapshot {self.path} is {age / 60:.0f} minutes old. starting cold")
+            return {}
+
+        return state
+
+    def save(self, state: dict):
+        if not self.path:
+            return
+
+        started_at = time.time()
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            # wei amounts don't fit the 64 bit integers of the fast JSON backend, and this runs once per restart
+            json.dump(dict(state, version=SNAPSHOT_VERSION, saved_at=time.time()), f, separators=(",", ":"))
+        os.replace(tmp_path, self.path)
+        logger.info(f"saved state snapshot to {self.path} in {(time.time() - started_at) * 1000:.1f}ms")
+
+
+state_snapshot = StateSnapshot()
@@ -1,44 +1,80 @@
+import asyncio
+import functools
 import logging
+from typing import List, Tuple
 
-from gql import Client, gql
-from gql.transport.aiohttp import AIOHTTPTransport
+import settings
+from helpers.batching import BatchLoader
+from helpers.sessions import http_sessions
 
 logging.getLogger("gql").setLevel(logging.WARN)
+logger = logging.getLogger(__name__)
 
-NOUNS_SUBGRAPH_ENDPOINT = "https://api.thegraph.com/subgraphs/name/nounsdao/nouns-subgraph"
+NOUNS_SUBGRAPH_ENDPOINT = settings.NOUNS_SUBGRAPH_URL
+
+BATCH_WINDOW_SECONDS = 0.02
+MAX_BATCH_SIZE = 50
+
+# lookup kind -> (variable type, aliased selection using $var)
+LOOKUPS = {
+    "bid": ("ID!", "bid(id: $var) { id amount bidder { id } }"),
+}
+
+
+@functools.lru_cache(maxsize=256)
+def build_batch_document(kinds: Tuple[str, ...]):
+    from gql import gql
+
+    variables = ", ".join(f"$v{i}: {LOOKUPS[kind][0]}" for i, kind in enumerate(kinds))
+    selections = "\n".join(f"  a{i}: {LOOKUPS[kind][1].replace('$var', f'$v{i}')}" for i, kind in enumerate(kinds))
+    return gql(f"query Batch({variables}) {{\n{selections}\n}}")
 
 
 class NounsSubgraphClient:
     def __init__(self):
-        self.client = Client(transport=AIOHTTPTransport(url=NOUNS_SUBGRAPH_ENDPOINT))
+        self.client = None
+        self._session = None
+        self._connect_lock = None
+        self.loader = BatchLoader(self._load_batch, window_seconds=BATCH_WINDOW_SECONDS, max_batch_size=MAX_BATCH_SIZE)
 
-    async def get_bid(self, transaction_hash: str):
-        async with self.client as session:
-            query = gql(
-                """
-                query Bid ($id: ID!) {
-                  bid(id: $id) {
-                    id
-                    amount
-                  }
-                }
-                """
-            )
+    async def get_session(self):
+        if self._connect_lock is None:
+            self._connect_lock = asyncio.Lock()
+
+        async with self._connect_lock:
+            if self._session is not None:
+                return self._session
 
-            result = await session.execute(query, variable_values={"id": transaction_hash})
-            return result.get("bid")
-
-    async def get_holding_nouns(self, wallet_address: str):
-        async with self.client as session:
-            query = gql(
-                """
-                query Nouns ($owner: String) {
-                  nouns(where: {owner: $owner}) {
-                    id
-                  }
-                }
-                """
+            # gql is only imported by the houses that query the subgraph, and only once they do
+            from gql import Client
+            from gql.transport.aiohttp import AIOHTTPTransport
+
+            transport = AIOHTTPTransport(
+                url=NOUNS_SUBGRAPH_ENDPOINT,
+                timeout=settings.HTTP_TIMEOUT_SECONDS,
+                client_session_args={"connector": http_sessions.connector, "connector_owner": False},
             )
+            self.client = Client(transport=transport)
+            self._session = await self.client.connect_async()
+            return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self.client.close_async()
+        self.client = None
+        self._session = None
+
+    async def _load_batch(self, lookups: List[Tuple[str, str]]) -> list:
+        session = await self.get_session()
+        document = build_batch_document(tuple(kind for kind, _ in lookups))
+        variables = {f"v{i}": key for i, (_, key) in enumerate(lookups)}
+        logger.debug(f"sending batch of {len(lookups)} subgraph lookups")
+
+        result = await session.execute(document, variable_values=variables)
+        return [result.get(f"a{i}") for i in range(len(lookups))]
+
+    async def get_bid(self, transaction_hash: str):
+        return await self.loader.load(("bid", transaction_hash))
+
 
-            result = await session.execute(query, variable_values={"owner": wallet_address})
-            return result.get("nouns")
+subgraph_client = NounsSubgraphClient()
@@ -1,33 +1,273 @@
-import json
+import asyncio
+import itertools
+import logging
+import re
+from typing import Any, Callable, Dict, List, Optional
 
-from ens import ENS
-from web3 import Web3
+import websockets
+from eth_utils import to_bytes, to_checksum_address, to_hex
+from websockets.exceptions import ConnectionClosed
 
 import settings
+from helpers import fastjson
+from helpers.abi import Contract
+from helpers.batching import BatchLoader
+from helpers.cache import MISSING, TTLCache
+from helpers.metrics import current_trace, metrics
 
-w3_client = Web3(Web3.WebsocketProvider(settings.W3_WS_PROVIDER_URL))
+logger = logging.getLogger(__name__)
 
+MAX_CONCURRENT_REQUESTS = 10
+REQUEST_TIMEOUT_SECONDS = 10
 
-def get_contract(contract_address):
-    contract_address = w3_client.toChecksumAddress(contract_address)
-    with open(f"contracts/{contract_address}.json", "r") as f:
-        contract_abi = json.load(f)
+ENS_CACHE_SIZE = 4096
+ENS_HIT_TTL_SECONDS = 6 * 60 * 60
+ENS_MISS_TTL_SECONDS = 15 * 60
 
-    return w3_client.eth.contract(address=contract_address, abi=contract_abi)
+MULTICALL3_ADDRESS = "0xcA11bde05977b3631167028862bE2a173976CA11"
+MULTICALL3_ABI = [
+    {
+        "inputs": [
+            {
+                "components": [
+                    {"name": "target", "type": "address"},
+                    {"name": "allowFailure", "type": "bool"},
+                    {"name": "callData", "type": "bytes"},
+                ],
+                "name": "calls",
+                "type": "tuple[]",
+            }
+        ],
+        "name": "aggregate3",
+        "outputs": [
+            {
+                "components": [{"name": "success", "type": "bool"}, {"name": "returnData", "type": "bytes"}],
+                "name": "returnData",
+                "type": "tuple[]",
+            }
+        ],
+        "stateMutability": "payable",
+        "type": "function",
+    },
+    {
+        "inputs": [{"name": "addr", "type": "address"}],
+        "name": "getEthBalance",
+        "outputs": [{"name": "balance", "type": "uint256"}],
+        "stateMutability": "view",
+        "type": "function",
+    },
+]
 
+# ENS ReverseRecords: batched, forward-verified reverse resolution in a single eth_call
+ENS_REVERSE_RECORDS_ADDRESS = "0x3671aE578E63FdF66ad4F3E12CC0c0d71Ac7510C"
+ENS_REVERSE_RECORDS_ABI = [
+    {
+        "inputs": [{"name": "addresses", "type": "address[]"}],
+        "name": "getNames",
+        "outputs": [{"name": "r", "type": "string[]"}],
+        "stateMutability": "view",
+        "type": "function",
+    }
+]
 
-def get_ens_primary_name_for_address(wallet_address: str) -> str:
-    wallet_address = Web3.toChecksumAddress(wallet_address)
-    ens_name = ENS.fromWeb3(w3_client).name(wallet_address)
-    return ens_name
+SUBSCRIPTION_ID_PATTERN = re.compile(r'"subscription"\s*:\s*"([^"]+)"')
+
+
+class ChainClient:
+    def __init__(self, provider_url: str, max_concurrent_requests: int = MAX_CONCURRENT_REQUESTS):
+        self.provider_url = provider_url
+        self.max_concurrent_requests = max_concurrent_requests
+        self._ws = None
+        self._reader_task = None
+        self._request_ids = itertools.count(1)
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._notifications: Optional[asyncio.Queue] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._connect_lock: Optional[asyncio.Lock] = None
+        # subscription id -> check on the raw frame, notifications failing it are dropped before parsing
+        self.prefilters: Dict[str, Callable[[str], bool]] = {}
+        self.filtered = 0
+
+    @property
+    def connected(self) -> bool:
+        return self._ws is not None and self._ws.open
+
+    async def connect(self):
+        await self.close()
+        self.prefilters.clear()
+        self._semaphore = asyncio.Semaphore(self.max_concurrent_requests)
+        self._notifications = asyncio.Queue()
+        self._ws = await websockets.connect(self.provider_url, max_size=None)
+        self._reader_task = asyncio.ensure_future(self._reader(self._ws, self._notifications))
+
+    async def close(self):
+        if self._ws is not None:
+            await self._ws.close()
+        if self._reader_task is not None:
+            await asyncio.gather(self._reader_task, return_exceptions=True)
+        self._ws = None
+        self._reader_task = None
+
+    async def _reader(self, ws, notifications: asyncio.Queue):
+        try:
+            while True:
+                frame = await ws.recv()
+                if self.prefilters and isinstance(frame, str) and '"eth_subscription"' in frame:
+                    match = SUBSCRIPTION_ID_PATTERN.search(frame)
+                    prefilter = self.prefilters.get(match.group(1)) if match else None
+                    if prefilter is not None and not prefilter(frame):
+                        self.filtered += 1
+                        continue
+
+                message = fastjson.loads(frame)
+                if message.get("method") == "eth_subscription":
+                    notifications.put_nowait(message)
+                    continue
+
+                future = self._pending.pop(message.get("id"), None)
+                if future is not None and not future.done():
+                    future.set_result(message)
+        except ConnectionClosed as e:
+            error = e
+        except Exception as e:
+            logger.warning(f"unexpected error reading from websocket: {e}")
+            error = e
+
+        for request_id, future in list(self._pending.items()):
+            if not future.done():
+                future.set_exception(error)
+            self._pending.pop(request_id, None)
+        notifications.put_nowait(error)
+
+    async def ensure_connected(self):
+        if self._connect_lock is None:
+            self._connect_lock = asyncio.Lock()
+
+        async with self._connect_lock:
+            if not self.connected:
+                await self.connect()
+
+    async def request(self, method: str, params: List[Any]) -> Any:
+        if not self.connected:
+            await self.ensure_connected()
+
+        metrics.inc("rpc_requests_total", method=method)
+        trace = current_trace.get()
+        if trace is not None:
+            trace.rpc_calls += 1
+
+        async with self._semaphore:
+            request_id = next(self._request_ids)
+            future = asyncio.get_event_loop().create_future()
+            self._pending[request_id] = future
+            try:
+                with metrics.time("rpc_request_seconds", method=method):
+                    await self._ws.send(
+                        fastjson.dumps({"jsonrpc": "2.0", "id": request_id, "method": method, "params": params})
+                    )
+                    response = await asyncio.wait_for(future, timeout=REQUEST_TIMEOUT_SECONDS)
+            finally:
+                self._pending.pop(request_id, None)
+
+        if "error" in response:
+            raise ValueError(response.get("error"))
+
+        return response.get("result")
+
+    async def subscribe(self, params: List[Any]) -> str:
+        return await self.request("eth_subscribe", params)
+
+    async def notifications(self):
+        notifications = self._notifications
+        while True:
+            message = await notifications.get()
+            if isinstance(message, Exception):
+                raise message
+            yield message
+
+    async def call(self, contract_function, block_identifier: str = "latest"):
+        tx = {"to": contract_function.address, "data": to_hex(contract_function.encode())}
+        result = await self.request("eth_call", [tx, block_identifier])
+        return contract_function.decode_output(to_bytes(hexstr=result))
+
+
+chain_client = ChainClient(settings.W3_WS_PROVIDER_URL)
+multicall_contract = Contract(MULTICALL3_ADDRESS, MULTICALL3_ABI)
+
+
+async def multicall(contract_functions: list) -> list:
+    calls = [(f.address, True, f.encode()) for f in contract_functions]
+    results = await chain_client.call(multicall_contract.functions.aggregate3(calls))
+
+    decoded = []
+    for contract_function, (success, return_data) in zip(contract_functions, results):
+        if not success:
+            logger.debug(f"multicall to {contract_function.fn_name} failed")
+            decoded.append(None)
+            continue
+
+        decoded.append(contract_function.decode_output(return_data))
+
+    return decoded
+
+
+class ENSNameResolver:
+    def __init__(
+        self,
+        maxsize: int = ENS_CACHE_SIZE,
+        hit_ttl_seconds: float = ENS_HIT_TTL_SECONDS,
+        miss_ttl_seconds: float = ENS_MISS_TTL_SECONDS,
+    ):
+        self.cache = TTLCache(maxsize=maxsize, ttl_seconds=hit_ttl_seconds)
+        self.miss_ttl_seconds = miss_ttl_seconds
+        self.loader = BatchLoader(self._load_batch, window_seconds=0.01, max_batch_size=100)
+        self.reverse_records = Contract(ENS_REVERSE_RECORDS_ADDRESS, ENS_REVERSE_RECORDS_ABI)
+
+    async def _load_batch(self, addresses: List[str]) -> List[Optional[str]]:
+        names = [name or None for name in await chain_client.call(self.reverse_records.functions.getNames(addresses))]
+        for address, name in zip(addresses, names):
+            self.remember(address, name)
+
+        return names
+
+    def remember(self, address: str, name: Optional[str]):
+        ttl_seconds = None if name else self.miss_ttl_seconds
+        self.cache.set(to_checksum_address(address), name or None, ttl_seconds=ttl_seconds)
+
+    async def get_name(self, address: str) -> Optional[str]:
+        address = to_checksum_address(address)
+        name = self.cache.get(address)
+        if name is not MISSING:
+            return name
+
+        return await self.loader.load(address)
+
+    async def get_names(self, addresses: List[str]) -> Dict[str, Optional[str]]:
+        names = {address: self.cache.get(address) for address in map(to_checksum_address, addresses)}
+        missing = [address for address, name in names.items() if name is MISSING]
+        # everything not cached goes out in the same reverse records call
+        names.update(zip(missing, await self.loader.load_many(missing)))
+        return names
+
+
+ens_resolver = ENSNameResolver()
+
+
+async def get_ens_primary_name_for_address(wallet_address: str) -> Optional[str]:
+    return await ens_resolver.get_name(wallet_address)
+
+
+def _short_address(address: str) -> str:
+    return f"{address[:5]}...{address[-4:]}"
 
 
 async def get_wallet_short_name(address: str, check_ens: bool = True) -> str:
-    address = Web3.toChecksumAddress(address)
-    short_address = f"{address[:5]}...{address[-4:]}"
+    address = to_checksum_address(address)
+    short_address = _short_address(address)
     if check_ens:
         try:
-            ens_name = get_ens_primary_name_for_address(address)
+            with metrics.time("stage_seconds", stage="ens"):
+                ens_name = await get_ens_primary_name_for_address(address)
             short_address = ens_name or short_address
         except Exception:
             pass
@@ -35,6 +275,12 @@ async def get_wallet_short_name(address: str, check_ens: bool = True) -> str:
     return short_address
 
 
-async def get_wallet_balance(wallet_address: str):
-    wallet_address = Web3.toChecksumAddress(wallet_address)
-    return w3_client.eth.get_balance(wallet_address)
+async def get_wallet_short_names(addresses: List[str]) -> List[str]:
+    addresses = [to_checksum_address(address) for address in addresses]
+    try:
+        with metrics.time("stage_seconds", stage="ens"):
+            names = await ens_resolver.get_names(addresses)
+    except Exception:
+        names = {}
+
+    return [names.get(address) or _short_address(address) for address in addresses]
@@ -1,17 +1,26 @@
 import asyncio
 import functools
-import json
 import logging
 import signal
-from asyncio import CancelledError, Queue
+import time
+from asyncio import FIRST_COMPLETED
 from datetime import datetime
+from typing import Awaitable, List, Optional, Tuple
 
-import websockets
-from web3 import Web3
-from websockets.exceptions import ConnectionClosedError
+from eth_utils import from_wei, to_int
 
 import settings
-from helpers.cloudinary import upload_image
+from helpers.auction import get_auction_state, refresh_auction_state
+from helpers.backfill import block_cursor, get_missed_logs
+from helpers.clock import AuctionEndScheduler, chain_clock
+from helpers.contracts import contract_registry
+from helpers.dedup import PENDING_LOG_INDEX
+from helpers.events import decode_auction_bid, decode_event, selector_prefilter
+from helpers.fanin import ProviderFanIn
+from helpers.houses import NOUNS_AUCTION_HOUSE_ADDRESS, AuctionHouse, auction_houses
+from helpers.images import image_pipeline
+from helpers.ledger import BidStats
+from helpers.metrics import COUNT_BUCKETS, EventTrace, MetricsExporter, current_trace, metrics
 from helpers.newshades import (
     create_finalized_auction_message,
     create_new_auction_message,
@@ -19,29 +28,30 @@ from helpers.newshades import (
     new_pending_bid_message,
     new_pending_settlement_message,
 )
-from helpers.nounoclock import get_bid_notes
-from helpers.nouns import (
-    get_curr_auction_remaining_seconds,
-    get_current_auction,
-    get_current_noun_id,
-    get_noun_metadata,
-)
-from helpers.subgraph import NounsSubgraphClient
-from helpers.timer import AsyncTimer
-from helpers.w3 import get_contract, get_wallet_balance
-
-logging.basicConfig(level=logging.INFO)
+from helpers.nounoclock import bid_notes_cache, get_bid_notes
+from helpers.nouns import get_bidder_profile, get_current_auction, get_token_uri
+from helpers.ownership import TRANSFER_TOPIC, OwnershipIndex
+from helpers.scheduler import Lane, PriorityScheduler
+from helpers.sessions import http_sessions
+from helpers.snapshot import state_snapshot
+from helpers.subgraph import subgraph_client
+from helpers.w3 import ChainClient, chain_client, ens_resolver
+
+logging.basicConfig(level=settings.LOG_LEVEL)
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
 
-NO_CONSUMERS = 5
+MIN_CONSUMERS = 2
+MAX_CONSUMERS = 10
+STALE_PENDING_TRANSACTION_SECONDS = 60
 PENDING_BID_THRESHOLD_SECONDS = 1_800
 SERIOUS_BID_THRESHOLD_ETH = 50
+STATS_TIMEOUT_SECONDS = 2
 FOMO_SETTLER_CONTRACT_ADDRESS = "0xb2341612271e122ff20905c9e389c3d7f0F222a1"
 
-auction_timer: AsyncTimer = AsyncTimer()
-
-w3_client = Web3(Web3.WebsocketProvider(settings.W3_WS_PROVIDER_URL))
+resync_lock: Optional[asyncio.Lock] = None
+# set by the first stop signal to drain and exit, by a second one to skip the rest of the drain
+stop_requested: Optional[asyncio.Event] = None
+drain_cancelled: Optional[asyncio.Event] = None
 
 SUBSCRIPTIONS = [
     {
@@ -49,7 +59,7 @@ SUBSCRIPTIONS = [
         "params": [
             "logs",
             {
-                "address": settings.AUCTION_HOUSE_CONTRACT_ADDRESS,
+                "address": auction_houses.addresses,
                 "topics": ["0x1159164c56f277e6fc99c11731bd380e0347deb969b75523398734c252706ea3"],
             },
         ],
@@ -59,100 +69,217 @@ SUBSCRIPTIONS = [
         "params": [
             "logs",
             {
-                "address": settings.AUCTION_HOUSE_CONTRACT_ADDRESS,
+                "address": auction_houses.addresses,
                 "topics": ["0xc9f72b276a388619c6d185d146697036241880c36654b1a3ffdad07c24038d99"],
             },
         ],
     },
+    {
+        "type": "auction-extended",
+        "params": [
+            "logs",
+            {
+                "address": auction_houses.addresses,
+                "topics": ["0x6e912a3a9105bdd2af817ba5adc14e6c127c1035b5b648faa29ca0d58ab8ff4e"],
+            },
+        ],
+    },
+    {
+        "type": "auction-created",
+        "params": [
+            "logs",
+            {
+                "address": auction_houses.addresses,
+                "topics": ["0xd6eddd1118d71820909c1197aa966dbc15ed6f508554252169cc3d5ccac756ca"],
+            },
+        ],
+    },
     {
         "type": "pending-transactions",
         "params": [
             "alchemy_pendingTransactions",
-            {"toAddress": [settings.AUCTION_HOUSE_CONTRACT_ADDRESS], "hashesOnly": False},
+            {"toAddress": auction_houses.addresses, "hashesOnly": False},
         ],
     },
+    {
+        "type": "transfers",
+        "params": ["logs", {"address": auction_houses.token_addresses, "topics": [TRANSFER_TOPIC]}],
+    },
+    {
+        "type": "new-heads",
+        "params": ["newHeads"],
+    },
 ]
 
-past_bids = set()
 
+async def get_noun_image_url(house: AuctionHouse, noun_id: str) -> str:
+    token_uri = await get_token_uri(noun_id, house.token_address)
+    return await image_pipeline.upload_token_image(f"{noun_id}_{house.token_address}", token_uri)
 
-async def handle_new_auction_event(noun_id: str):
-    token_metadata = await get_noun_metadata(noun_id)
-    image_id = f"{noun_id}_{settings.TOKEN_CONTRACT_ADDRESS}"
-    image_url = await upload_image(image_id=image_id, image=token_metadata.get("image"))
-    await create_new_auction_message(noun_id, image_url)
 
+async def handle_new_auction_event(house: AuctionHouse, noun_id: str, image_url: Awaitable[str]):
+    await create_new_auction_message(
+        noun_id,
+        await image_url,
+        noun_url=house.get_noun_url(noun_id),
+        dispatcher=house.dispatcher,
+        house_name=house.label,
+    )
 
-async def finalize_auction():
-    logger.info("finalizing auction...")
-    contract = get_contract(settings.AUCTION_HOUSE_CONTRACT_ADDRESS)
-    curr_auction_info = contract.functions.auction().call()
-    noun_id, wei_amount, _, _, bidder, _ = curr_auction_info
 
-    amount = Web3.fromWei(wei_amount, "ether")
+async def finalize_auction(house: AuctionHouse, noun_id: int) -> Optional[int]:
+    logger.info(f"finalizing {house.name} auction for noun {noun_id}...")
+    settlement = house.state.settlements.get(noun_id)
+    if settlement is not None:
+        bidder, wei_amount = settlement
+    else:
+        # bid and extension logs can still be queued behind the workers, the contract has the final high bid
+        auction = await get_current_auction(house.address)
+        if auction.get("noun_id") != noun_id:
+            # settled and the next auction created before its AuctionSettled log got here. the scheduler retries
+            raise LookupError(f"auction for noun {noun_id} was settled but its settlement log wasn't seen yet")
+        if not auction.get("settled") and auction.get("end_time") > chain_clock.now():
+            logger.info(f"> auction for noun {noun_id} was extended. not over yet...")
+            return auction.get("end_time")
+        wei_amount, bidder = auction.get("wei_amount"), auction.get("bidder")
+
+    amount = from_wei(wei_amount, "ether")
     logger.info(f"> auction for noun {noun_id} ended. winner was {bidder} with their bid for Ξ{amount:.2f}")
-    await create_finalized_auction_message(noun_id, bidder, amount)
+
+    ledger = house.ledger.get(noun_id)
+    await create_finalized_auction_message(
+        noun_id,
+        bidder,
+        amount,
+        leaderboard=house.ledger.leaderboard(noun_id),
+        bid_count=len(ledger) if ledger is not None else 0,
+        bidder_count=len(ledger.by_bidder) if ledger is not None else 0,
+        dispatcher=house.dispatcher,
+        house_name=house.label,
+    )
+
+    # after the message, so a retried finalize doesn't append the bids twice
+    try:
+        house.ledger.write_csv(noun_id)
+    except OSError as e:
+        logger.warning(f"couldn't write the bids on noun {noun_id} to the ledger file: {e}")
+    return None
 
 
-async def setup_auction():
-    auction = await get_current_auction()
-    end_time = auction.get("end_time")
-    noun_id = auction.get("noun_id")
-    end_date = datetime.fromtimestamp(end_time)
-    if end_date < datetime.now():
-        logger.info(f"> no auction ongoing. latest was: {noun_id}")
+async def setup_auction(house: AuctionHouse, refresh: bool = True):
+    auction = await refresh_auction_state(house.state) if refresh else house.state
+    noun_id = auction.noun_id
+    if auction.remaining_seconds < 0:
+        logger.info(f"> no {house.name} auction ongoing. latest was: {noun_id}")
         return
 
-    logger.info(f"ongoing auction: {noun_id}")
-    await handle_auction_end()
+    logger.info(f"ongoing {house.name} auction: {noun_id}")
+    if house.bid_notes:
+        bid_notes_cache.track(noun_id)
+    await handle_auction_end(house)
+
+
+async def process_auction_settled(house: AuctionHouse, log: dict):
+    args = decode_event("AuctionSettled", log)
+    with metrics.time("stage_seconds", stage="state"):
+        house.state.apply_settled(args.get("nounId"), args.get("winner"), args.get("amount"))
+    logger.info(f"> {house.name} auction for noun {args.get('nounId')} settled")
+
+
+async def process_auction_extended(house: AuctionHouse, log: dict):
+    args = decode_event("AuctionExtended", log)
+    noun_id, end_time = args.get("nounId"), args.get("endTime")
+    with metrics.time("stage_seconds", stage="state"):
+        extended = house.state.apply_extended(noun_id, end_time)
+    if extended:
+        logger.info(f"> auction for noun {noun_id} extended to {datetime.fromtimestamp(end_time).isoformat()}")
+        await handle_auction_end(house)
+
+
+async def process_new_auction(house: AuctionHouse, log: dict):
+    args = decode_event("AuctionCreated", log)
+    noun_id = args.get("nounId")
+    with metrics.time("stage_seconds", stage="state"):
+        created = house.state.apply_created(noun_id, args.get("startTime"), args.get("endTime"))
+    # a retried job finds the auction tracked but not announced yet
+    if not created and (noun_id != house.state.noun_id or house.state.announced):
+        logger.info(f"> already tracking {house.name} auction for noun {noun_id}. ignore...")
+        return
 
+    # the image is the slow part of the announcement, start on it before anything else
+    image_url = asyncio.ensure_future(get_noun_image_url(house, noun_id))
 
-async def process_new_auction():
-    auction = await get_current_auction()
-    noun_id = auction.get("noun_id")
-    end_time = auction.get("end_time")
-    end_date = datetime.fromtimestamp(end_time)
+    end_date = datetime.fromtimestamp(args.get("endTime"))
+    if house.bid_notes:
+        bid_notes_cache.track(noun_id)
 
-    logger.info(f"> new auction started for noun id {noun_id}. ends at {end_date.isoformat()}")
+    logger.info(f"> new {house.name} auction started for noun id {noun_id}. ends at {end_date.isoformat()}")
     try:
-        await handle_new_auction_event(noun_id)
+        await handle_auction_end(house)
+        await handle_new_auction_event(house, noun_id, image_url)
     except asyncio.exceptions.TimeoutError as e:
         logger.warning(f"issues posting new auction for noun {noun_id}: {e}")
-    await handle_auction_end()
-
-
-async def process_pending_transaction(tx: dict):
-    contract = get_contract(settings.AUCTION_HOUSE_CONTRACT_ADDRESS)
-    func, args = contract.decode_function_input(tx.get("input"))
-    str_func = func.function_identifier
-    if str_func == "settleCurrentAndCreateNewAuction":
-        logger.info("> pending transaction for settleCurrentAndCreateNewAuction. ignore...")
-        # await process_pending_settlement(tx)
-    elif str_func == "createBid":
-        await process_new_bid(tx, pending=True)
-    else:
-        logger.info(f"> unknown pending transaction for function: {str_func} {args}")
+    except Exception:
+        image_url.cancel()
+        await asyncio.gather(image_url, return_exceptions=True)
+        raise
+    house.state.announced = True
 
 
-async def handle_auction_end():
-    seconds_remaining = await get_curr_auction_remaining_seconds()
-    global auction_timer
-    if seconds_remaining < 0:
-        await finalize_auction()
-    else:
-        if auction_timer is not None:
-            auction_timer.cancel()
+async def process_pending_bid(house: AuctionHouse, tx: dict):
+    await process_new_bid(house, tx, pending=True)
+
+
+async def ignore_pending_settlement(house: AuctionHouse, tx: dict):
+    logger.debug("> pending transaction for settleCurrentAndCreateNewAuction. ignore...")
+    # await process_pending_settlement(house, tx)
 
-        auction_timer = AsyncTimer(seconds_remaining + 1, handle_auction_end)
-        logger.info(f"created new timer for {seconds_remaining} seconds.")
+
+# forks share the auction house ABI, so the selectors are the same for every house
+PENDING_TRANSACTION_HANDLERS = {
+    contract_registry.get_function_selector(NOUNS_AUCTION_HOUSE_ADDRESS, name): handler
+    for name, handler in [
+        ("createBid", process_pending_bid),
+        ("settleCurrentAndCreateNewAuction", ignore_pending_settlement),
+    ]
+}
+
+
+async def process_pending_transaction(house: AuctionHouse, tx: dict):
+    selector = (tx.get("input") or "")[:10].lower()
+    handler = PENDING_TRANSACTION_HANDLERS.get(selector)
+    if handler is None:
+        logger.debug("> unknown pending transaction for selector: %s", selector)
+        return
+
+    await handler(house, tx)
+
+
+async def handle_auction_end(house: AuctionHouse):
+    auction = await get_auction_state(house.state)
+    auction_end_scheduler.schedule((house.address, auction.noun_id), auction.end_time)
+
+
+async def end_auction(key: Tuple[str, int]) -> Optional[int]:
+    auction_house_address, noun_id = key
+    return await finalize_auction(auction_houses.get(auction_house_address), noun_id)
+
+
+# finalizes on the first block at or past each auction's end time
+auction_end_scheduler = AuctionEndScheduler(end_auction)
 
 
 async def _get_subgraph_bid(tx_hash):
+    with metrics.time("stage_seconds", stage="subgraph"):
+        return await _poll_subgraph_bid(tx_hash)
+
+
+async def _poll_subgraph_bid(tx_hash):
     retries = 0
     while retries < 3:
-        bid = await NounsSubgraphClient().get_bid(tx_hash)
+        bid = await subgraph_client.get_bid(tx_hash)
         if not bid:
-            logger.debug(f"couldn't find transaction: {tx_hash}. retrying in 3s...")
+            logger.debug("couldn't find transaction: %s. retrying in 3s...", tx_hash)
             retries += 1
             await asyncio.sleep(3)
             continue
@@ -162,164 +289,599 @@ async def _get_subgraph_bid(tx_hash):
     return None
 
 
-async def process_new_bid(tx: dict, pending: bool = False):
-    tx_hash = tx.get("transactionHash")
+async def _get_bid_note(noun_id, bidder: str, weth_amount: int) -> Optional[str]:
+    try:
+        with metrics.time("stage_seconds", stage="notes"):
+            return await get_bid_notes(noun_id=str(noun_id), bidder_address=bidder, bidder_weth=weth_amount)
+    except Exception as e:
+        logger.warning(f"issue fetching bid notes: {e}")
+        return None
+
+
+async def _get_stats_text(house: AuctionHouse, bidder: str) -> Optional[str]:
+    try:
+        with metrics.time("stage_seconds", stage="stats"):
+            profile = await asyncio.wait_for(
+                get_bidder_profile(bidder, house.token_address, house.ownership), timeout=STATS_TIMEOUT_SECONDS
+            )
+    except asyncio.TimeoutError:
+        logger.warning(f"fetching stats for {bidder} took longer than {STATS_TIMEOUT_SECONDS}s. skipping...")
+        return None
+    except Exception as e:
+        logger.warning(f"issue fetching stats: {e}")
+        return None
+
+    if profile.wallet_balance is None:
+        return None
+
+    wallet_balance = from_wei(profile.wallet_balance, "ether")
+    stats_text = f"Ξ{wallet_balance:.2f} left in wallet"
+
+    if profile.holding_nouns:
+        stats_text = f"{profile.holding_nouns} noun(s) and " + stats_text
+
+    return stats_text
+
+
+def _ordinal(n: int) -> str:
+    suffix = "th" if 10 <= n % 100 <= 20 else {1: "st", 2: "nd", 3: "rd"}.get(n % 10, "th")
+    return f"{n}{suffix}"
+
+
+def _format_remaining(seconds: int) -> str:
+    hours, minutes = seconds // 3600, seconds % 3600 // 60
+    if hours:
+        return f"{hours}h {minutes}m"
+    return f"{minutes}m {seconds % 60}s"
+
+
+def _get_ledger_text(house: AuctionHouse, bid_stats: Optional[BidStats]) -> Optional[str]:
+    if bid_stats is None:
+        return None
+
+    parts = []
+    if bid_stats.increase is not None:
+        parts.append(f"+{bid_stats.increase:.1%} over the last bid")
+    if bid_stats.bidder_bid_count > 1:
+        parts.append(f"their {_ordinal(bid_stats.bidder_bid_count)} bid")
+    # as of the bid's block, so backfilled bids don't show the time left when they were replayed
+    remaining_seconds = house.state.end_time - bid_stats.timestamp
+    if remaining_seconds > 0:
+        parts.append(f"{_format_remaining(remaining_seconds)} left")
+
+    return ", ".join(parts) or None
+
+
+async def _no_result() -> Optional[str]:
+    return None
+
+
+async def _get_block_timestamp(log: dict) -> int:
+    block_number = to_int(hexstr=log.get("blockNumber"))
+    block_timestamp = chain_clock.block_time(block_number)
+    if block_timestamp is not None:
+        return block_timestamp
+
+    # backfilled logs, or a log that beat its block's newHeads notification
+    try:
+        with metrics.time("stage_seconds", stage="block"):
+            block = await chain_client.request("eth_getBlockByNumber", [hex(block_number), False])
+        block_timestamp = to_int(hexstr=block.get("timestamp"))
+    except Exception as e:
+        logger.warning(f"couldn't get the time of block {block_number}: {e}. using the chain clock")
+        return int(chain_clock.now())
+
+    chain_clock.remember(block_number, block_timestamp)
+    return block_timestamp
+
+
+async def process_new_bid(house: AuctionHouse, tx: dict, pending: bool = False):
+    tx_hash = tx.get("transactionHash") or tx.get("hash")
+    noun_id = house.state.noun_id
     bidder = tx.get("from")
-    value = tx.get("value")
+    weth_amount = 0
+    log_index = PENDING_LOG_INDEX
+    decoded = False
+
+    if pending:
+        weth_amount = to_int(hexstr=tx.get("value", "0x0"))
+        if not weth_amount:
+            logger.debug("> pending bid without value from %s. ignore...", bidder)
+            return
 
-    if value:
-        weth_amount = value
-        amount = Web3.fromWei(Web3.toInt(hexstr=value), "ether")
+        # a log for a newer noun marks the state stale, refresh it before filing the bid under a noun
+        auction = await get_auction_state(house.state)
+        noun_id = auction.noun_id
+        pending_bid, replaced = house.pending.add(tx, noun_id, weth_amount)
+        if pending_bid is None:
+            logger.debug("> pending bid %s already tracked or mined. ignore...", tx_hash)
+            return
+        if replaced is not None:
+            logger.info(
+                f"> pending bid {replaced.tx_hash} from {bidder} replaced by {tx_hash} "
+                f"(Ξ{from_wei(replaced.wei_amount, 'ether'):.2f} -> Ξ{from_wei(weth_amount, 'ether'):.2f})"
+            )
+
+        # only announce pending bids within 30 mins of auction end
+        if auction.remaining_seconds >= PENDING_BID_THRESHOLD_SECONDS:
+            return
+
+        # speed-ups and bids the contract would reject anyway stay quiet
+        if not house.pending.is_material(pending_bid, auction.wei_amount, replaced):
+            logger.debug("> pending bid %s doesn't raise the high bid enough. ignore...", tx_hash)
+            return
+        pending_bid.announced = True
     else:
-        transaction = w3_client.eth.getTransaction(tx_hash)
-        weth_amount = transaction.get("value")
-        amount = Web3.fromWei(weth_amount, "ether")
-        bidder = transaction.get("from")
+        log_index = to_int(hexstr=tx.get("logIndex", "0x0"))
+        house.pending.remove_mined(tx_hash)
+        try:
+            bid = decode_auction_bid(tx)
+            with metrics.time("stage_seconds", stage="state"):
+                house.state.apply_bid(bid.noun_id, bid.bidder, bid.wei_amount)
+            noun_id, bidder, weth_amount = bid.noun_id, bid.bidder, bid.wei_amount
+            decoded = True
+        except Exception as e:
+            logger.warning(f"couldn't decode bid log for transaction {tx_hash}: {e}")
 
-    if not amount or amount == 0:
-        bid = await _get_subgraph_bid(tx_hash)
+    if pending:
+        claimed = house.deduplicator.claim_pending_bid(noun_id, tx_hash)
+    else:
+        claimed = house.deduplicator.claim_bid(noun_id, tx_hash, log_index)
+    if not claimed:
+        logger.warning("already saw transaction %s", tx_hash)
+        return
+
+    # the ledger skips bids that don't raise the last one, so a retried announcement isn't counted twice
+    bid_stats = house.ledger.record(noun_id, bidder, weth_amount, await _get_block_timestamp(tx)) if decoded else None
+
+    try:
+        await _announce_bid(house, tx_hash, noun_id, bidder, weth_amount, pending, bid_stats)
+    except Exception:
+        house.deduplicator.release_bid(noun_id, tx_hash, log_index)
+        if pending:
+            house.pending.discard(tx_hash)
+        raise
+
+
+async def _announce_bid(
+    house: AuctionHouse,
+    tx_hash: str,
+    noun_id: int,
+    bidder: str,
+    weth_amount: int,
+    pending: bool,
+    bid_stats: Optional[BidStats] = None,
+):
+    if not weth_amount:
+        bid = await _get_subgraph_bid(tx_hash) if house.subgraph else None
         if not bid:
             logger.warning(f"couldn't find info on transaction: {tx_hash}. ignoring bid...")
             return
 
         weth_amount = int(bid.get("amount", "0"))
-        amount = Web3.fromWei(weth_amount, "ether")
+        bidder = bidder or bid.get("bidder", {}).get("id")
 
-    logger.info(f"> new bid of Ξ{amount:.2f} from {bidder} {'(pending)' if pending else ''}")
+    amount = from_wei(weth_amount, "ether")
 
-    if not pending:
-        if tx_hash in past_bids:
-            logger.warning(f"already saw transaction {tx_hash}")
-            return
+    logger.info("> new bid of Ξ%.2f from %s%s", amount, bidder, " (pending)" if pending else "")
 
-        try:
-            noun_id = str(await get_current_noun_id())
-            bid_note = await get_bid_notes(noun_id=noun_id, bidder_address=bidder, bidder_weth=weth_amount)
-        except Exception as e:
-            logger.warning("issue fetching bid notes", e)
-            bid_note = None
-
-        stats_text = None
-        if amount > SERIOUS_BID_THRESHOLD_ETH:
-            try:
-                holding_nouns = len(await NounsSubgraphClient().get_holding_nouns(bidder.lower()))
-                wallet_weth_balance = await get_wallet_balance(bidder)
-                wallet_balance = Web3.fromWei(wallet_weth_balance, "ether")
-
-                stats_text = f"Ξ{wallet_balance:.2f} left in wallet"
-
-                if holding_nouns > 0:
-                    stats_text = f"{holding_nouns} noun(s) and " + stats_text
-            except Exception as e:
-                logger.warning(f"issue fetching stats: {e}")
-                stats_text = None
-
-        await new_bid_message(amount, bidder, bid_note=bid_note, stats_text=stats_text)
-        past_bids.add(tx_hash)
+    if not pending:
+        bid_note, stats_text = await asyncio.gather(
+            _get_bid_note(noun_id, bidder, weth_amount) if house.bid_notes else _no_result(),
+            _get_stats_text(house, bidder) if amount > SERIOUS_BID_THRESHOLD_ETH else _no_result(),
+        )
+
+        await new_bid_message(
+            amount,
+            bidder,
+            bid_note=bid_note,
+            stats_text=stats_text,
+            ledger_text=_get_ledger_text(house, bid_stats),
+            noun_id=noun_id,
+            dispatcher=house.dispatcher,
+            house_name=house.label,
+        )
     else:
-        # check within 30 mins of auction end
-        remaining_seconds = await get_curr_auction_remaining_seconds()
-        if remaining_seconds < PENDING_BID_THRESHOLD_SECONDS:
-            await new_pending_bid_message(amount, bidder)
+        await new_pending_bid_message(
+            amount,
+            bidder,
+            noun_id=noun_id,
+            dispatcher=house.dispatcher,
+            house_name=house.label,
+            auction_house_address=house.address,
+        )
 
 
-async def process_pending_settlement(tx: dict):
+async def process_pending_settlement(house: AuctionHouse, tx: dict):
     settler = tx.get("from")
     if settler.lower() == FOMO_SETTLER_CONTRACT_ADDRESS.lower():
         logger.info(f"> FOMO nouns trying to settle auction")
         return
 
     logger.info(f"> new attempt to manually settle auction from {settler}")
-    await new_pending_settlement_message(settler=settler)
+    await new_pending_settlement_message(
+        settler=settler, noun_id=house.state.noun_id, dispatcher=house.dispatcher, house_name=house.label
+    )
 
 
-async def process_message(message: dict, subs: dict):
-    message_sub = message.get("params").get("subscription")
-    message_type = subs[message_sub].get("type")
-    logger.info(f"message_type {message_type} {message}")
+async def process_message(message_type: str, result):
+    logger.debug("message_type %s %s", message_type, result)
 
-    result = message.get("params").get("result")
+    # logs carry the emitting auction house, pending transactions the one they are sent to
+    house = auction_houses.get(result.get("address") or result.get("to"))
+    if house is None:
+        logger.warning("no auction house tracked for %s message. ignore...", message_type)
+        return
 
     if message_type == "bids":
-        await process_new_bid(result)
+        await process_new_bid(house, result)
     elif message_type == "auction-settled":
-        await process_new_auction()
+        await process_auction_settled(house, result)
+    elif message_type == "auction-extended":
+        await process_auction_extended(house, result)
+    elif message_type == "auction-created":
+        await process_new_auction(house, result)
     elif message_type == "pending-transactions":
-        await process_pending_transaction(result)
+        await process_pending_transaction(house, result)
 
 
-async def create_subscriptions(ws_client) -> dict:
-    subs = {}
-    for subscription in SUBSCRIPTIONS:
-        ws_message = {
-            "jsonrpc": "2.0",
-            "id": 2,
-            "method": "eth_subscribe",
-            "params": subscription.get("params"),
-        }
-        await ws_client.send(json.dumps(ws_message))
-        connect_msg = await ws_client.recv()
-        logger.info(f"connected: {connect_msg}")
-        subscription_id = json.loads(connect_msg).get("result")
-        subs[subscription_id] = {"type": subscription.get("type")}
+LOG_SUBSCRIPTION_TYPES = {
+    subscription.get("params")[1].get("topics")[0].lower(): subscription.get("type")
+    for subscription in SUBSCRIPTIONS
+    # token transfers catch up through their ownership index instead
+    if subscription.get("params")[0] == "logs" and subscription.get("type") != "transfers"
+}
 
-    return subs
 
+def _log_noun_id(log: dict) -> int:
+    # every auction house event has the noun id as its first indexed argument
+    return to_int(hexstr=log.get("topics")[1])
 
-async def consumer(queue):
-    while True:
-        task = await queue.get()
-        try:
-            await process_message(task.get("message"), subs=task.get("subs"))
-        except Exception as e:
-            logger.warning(f"problems handling {task}: {e}. sleeping and trying again")
-            await asyncio.sleep(3)
-            await queue.put({"message": task.get("message"), "subs": task.get("subs")})
 
+async def backfill_missed_logs():
+    logs = await get_missed_logs(auction_houses.addresses, [list(LOG_SUBSCRIPTION_TYPES)])
 
-async def noun_listener(queue: Queue):
-    for i in range(NO_CONSUMERS):
-        asyncio.ensure_future(consumer(queue))
+    # bids on auctions that ended while we weren't listening aren't news anymore
+    latest_nouns = {house.address: house.state.noun_id or 0 for house in auction_houses}
+    for log in logs:
+        if LOG_SUBSCRIPTION_TYPES[log.get("topics")[0].lower()] == "auction-created":
+            address = auction_houses.get(log.get("address")).address
+            latest_nouns[address] = max(latest_nouns[address], _log_noun_id(log))
 
-    while True:
-        try:
-            await setup_auction()
-            async with websockets.connect(settings.W3_WS_PROVIDER_URL) as websocket:
-                retries = 0
-                subs_dict = await create_subscriptions(websocket)
-
-                async for str_message in websocket:
-                    message = json.loads(str_message)
-                    await q.put({"message": message, "subs": subs_dict})
-
-        except (ConnectionClosedError, asyncio.TimeoutError):
-            if retries == 0:
-                retries += 1
-                continue
-            if retries >= 10:
-                raise Exception("Connection to websocket %s failed > 10 times")
+    skipped = 0
+    for log in logs:
+        message_type = LOG_SUBSCRIPTION_TYPES[log.get("topics")[0].lower()]
+        if message_type == "bids" and _log_noun_id(log) < latest_nouns[auction_houses.get(log.get("address")).address]:
+            skipped += 1
+            continue
+        fan_in.publish(message_type, log)
 
-            retries += 1
-            backoff = max(3, min(60, 2**retries))
-            logger.info(f"Connection to websocket was closed, retry in {backoff} seconds. ({retries} attempts)")
-            await asyncio.sleep(backoff)
-        except CancelledError:
-            return
+    if skipped:
+        logger.info(f"skipped {skipped} backfilled bid(s) on past auctions")
 
 
-def shutdown(loop):
-    logging.info("received stop signal, cancelling tasks...")
-    for task in asyncio.all_tasks():
+async def sync_ownership(index: OwnershipIndex):
+    try:
+        await index.sync()
+    except Exception as e:
+        logger.warning(f"issue indexing owners of {index.token_address}: {e}")
+
+
+async def resync():
+    global resync_lock
+    if resync_lock is None:
+        resync_lock = asyncio.Lock()
+
+    # providers connect concurrently, only the first one needs to refresh the auctions
+    async with resync_lock:
+        chain_clock.observe(await chain_client.request("eth_getBlockByNumber", ["latest", False]))
+        await asyncio.gather(*(setup_auction(house) for house in auction_houses if house.state.stale))
+        # the first index of all transfers can take a while, holdings come from the token contract until it is done
+        for index in auction_houses.ownership_indexes:
+            asyncio.ensure_future(sync_ownership(index))
+        # live notifications buffer in the client while the gap since the last seen block is replayed
+        await backfill_missed_logs()
+
+
+fan_in = ProviderFanIn(
+    [chain_client] + [ChainClient(url) for url in settings.W3_WS_EXTRA_PROVIDER_URLS],
+    SUBSCRIPTIONS,
+    on_connect=resync,
+    # most of the mempool stream is calls we don't handle, skip them before they are parsed or queued
+    prefilters={"pending-transactions": selector_prefilter(PENDING_TRANSACTION_HANDLERS)},
+)
+
+# settlements and auction lifecycle first, then confirmed bids, then mempool noise
+MESSAGE_LANES = {
+    "auction-settled": "auction",
+    "auction-created": "auction",
+    "auction-extended": "auction",
+    "bids": "bids",
+    "pending-transactions": "pending",
+}
+
+
+async def consume(task: dict):
+    message_type = task.get("type")
+    trace = EventTrace(message_type, task.get("received_at"))
+    token = current_trace.set(trace)
+    metrics.observe("stage_seconds", time.monotonic() - trace.received_at, stage="queue")
+    try:
+        await process_message(message_type, task.get("result"))
+    finally:
+        current_trace.reset(token)
+        metrics.inc("events_processed_total", type=message_type)
+        metrics.observe("event_processing_seconds", time.monotonic() - trace.received_at, type=message_type)
+        metrics.observe("rpc_calls_per_event", trace.rpc_calls, buckets=COUNT_BUCKETS, type=message_type)
+
+
+def create_scheduler() -> PriorityScheduler:
+    lanes = [
+        Lane("auction", priority=0, maxsize=100),
+        Lane("bids", priority=1, maxsize=1_000),
+        Lane("pending", priority=2, maxsize=200, drop_oldest=True, stale_seconds=STALE_PENDING_TRANSACTION_SECONDS),
+    ]
+    return PriorityScheduler(
+        consume,
+        lanes,
+        min_workers=MIN_CONSUMERS,
+        max_workers=MAX_CONSUMERS,
+        # the cursor only moves past a block once its logs are handled (or given up on)
+        on_done=lambda task: block_cursor.release(task.get("block_number")),
+    )
+
+
+def register_metrics(scheduler: PriorityScheduler):
+    metrics.describe("stage_seconds", "time spent per processing stage")
+    metrics.describe("event_latency_seconds", "from first arrival of an event to its webhook delivery")
+    metrics.describe("event_processing_seconds", "from first arrival of an event to the end of its handler")
+
+    for lane in scheduler.lanes:
+        metrics.collect("queue_depth", lambda lane=lane: len(lane.jobs), queue=lane.name)
+        metrics.collect("jobs_dropped_total", functools.partial(getattr, lane, "dropped"), "counter", lane=lane.name)
+    metrics.collect("jobs_retried_total", lambda: scheduler.retried, "counter")
+    metrics.collect("jobs_failed_total", lambda: scheduler.failed, "counter")
+
+    for dispatcher in auction_houses.dispatchers:
+        url = dispatcher.webhook_url
+        metrics.collect("queue_depth", lambda dispatcher=dispatcher: dispatcher.queue.qsize(), queue=f"webhook {url}")
+        for counter in ["sent", "failed", "dropped", "coalesced", "retried"]:
+            metrics.collect(
+                f"webhook_{counter}_total", functools.partial(getattr, dispatcher, counter), "counter", webhook=url
+            )
+
+    for name, cache in [
+        ("ens", ens_resolver.cache),
+        ("bid_notes", bid_notes_cache),
+        ("images", image_pipeline),
+        ("seen_events", fan_in.seen),
+    ]:
+        metrics.collect("cache_hits_total", functools.partial(getattr, cache, "hits"), "counter", cache=name)
+        metrics.collect("cache_misses_total", functools.partial(getattr, cache, "misses"), "counter", cache=name)
+
+    for house in auction_houses:
+        metrics.collect("pending_bids", functools.partial(len, house.pending), house=house.name)
+        for stat in ["replaced", "expired", "mined"]:
+            metrics.collect(
+                f"pending_bids_{stat}_total",
+                functools.partial(getattr, house.pending, stat),
+                "counter",
+                house=house.name,
+            )
+
+    for index in auction_houses.ownership_indexes:
+        metrics.collect("indexed_tokens", functools.partial(len, index), token=index.token_address)
+
+    for provider in fan_in.providers:
+        for stat in ["arrivals", "first_arrivals"]:
+            metrics.collect(
+                f"provider_{stat}_total", functools.partial(getattr, provider, stat), "counter", provider=provider.name
+            )
+        metrics.collect(
+            "provider_lag_seconds", functools.partial(getattr, provider, "average_lag"), provider=provider.name
+        )
+        metrics.collect(
+            "frames_filtered_total",
+            functools.partial(getattr, provider.client, "filtered"),
+            "counter",
+            provider=provider.name,
+        )
+
+
+def summarize_metrics() -> str:
+    latency = metrics.merged_histogram("event_latency_seconds")
+    processed = metrics.total("events_processed_total")
+    rpc_calls = metrics.merged_histogram("rpc_calls_per_event").sum
+    sent = sum(dispatcher.sent for dispatcher in auction_houses.dispatchers)
+    failed = sum(dispatcher.failed for dispatcher in auction_houses.dispatchers)
+    ens_lookups = ens_resolver.cache.hits + ens_resolver.cache.misses
+
+    p50, p99 = latency.quantile(0.5), latency.quantile(0.99)
+    return (
+        f"{processed:.0f} events processed, {rpc_calls / max(processed, 1):.1f} rpc calls/event, "
+        f"{sent} webhooks sent ({failed} failed), "
+        f"end-to-end p50 <= {p50 if p50 is not None else '-'}s p99 <= {p99 if p99 is not None else '-'}s, "
+        f"ens cache hit rate {ens_resolver.cache.hits / max(ens_lookups, 1):.0%}"
+    )
+
+
+def capture_state() -> dict:
+    return {
+        "block_number": block_cursor.block_number,
+        "houses": {
+            house.address: {
+                "auction": None if house.state.stale else house.state.as_dict(),
+                "seen_events": house.deduplicator.export(),
+                "bids": house.ledger.export(),
+            }
+            for house in auction_houses
+        },
+        "ens": ens_resolver.cache.export(),
+        "bid_notes": bid_notes_cache.export(),
+        "images": image_pipeline.uploads,
+    }
+
+
+def restore_state(state: dict) -> List[AuctionHouse]:
+    if not state:
+        return []
+
+    ens_resolver.cache.restore(state.get("ens", []))
+    bid_notes_cache.restore(state.get("bid_notes"))
+    image_pipeline.uploads.update(state.get("images", {}))
+
+    # auction state is only as current as the snapshot's block, the backfill replays everything after it.
+    # a cursor checkpointed past it (after a crash) would skip part of that, so the auctions are refreshed instead
+    block_number = state.get("block_number")
+    warm = block_number is not None and (block_cursor.block_number or 0) <= block_number
+    if warm:
+        block_cursor.advance(block_number)
+
+    restored = []
+    for house in auction_houses:
+        saved = state.get("houses", {}).get(house.address, {})
+        house.deduplicator.restore(saved.get("seen_events", []))
+        house.ledger.restore(saved.get("bids", []))
+        if warm and saved.get("auction") is not None:
+            house.state.seed(saved.get("auction"))
+            restored.append(house)
+
+    logger.info(
+        f"restored {len(restored)} auction(s), {len(ens_resolver.cache)} ens name(s) and "
+        f"{len(image_pipeline.uploads)} image(s) from the state snapshot at block {block_number}"
+    )
+    return restored
+
+
+async def ingest(scheduler: PriorityScheduler):
+    # first arrival of each log / pending tx / block across all providers
+    async for message_type, result in fan_in.messages():
+        if message_type == "new-heads":
+            auction_end_scheduler.on_block(chain_clock.observe(result))
+            continue
+        if message_type == "transfers":
+            auction_houses.get_ownership(result.get("address")).apply(result)
+            continue
+        if result.get("removed"):
+            # auction logs dropped by a reorg were announced already, only the ownership index rolls back
+            logger.info("> %s log %s removed by a reorg. ignore...", message_type, result.get("transactionHash"))
+            continue
+
+        payload = {
+            "type": message_type,
+            "result": result,
+            "received_at": time.monotonic(),
+            # pending transactions have no block
+            "block_number": block_cursor.track(result.get("blockNumber")),
+        }
+        await scheduler.put(MESSAGE_LANES[message_type], payload)
+
+
+async def drain_queues(scheduler: PriorityScheduler):
+    await scheduler.drain()
+    await asyncio.gather(*(dispatcher.drain() for dispatcher in auction_houses.dispatchers))
+
+
+async def drain(scheduler: PriorityScheduler):
+    started_at = time.monotonic()
+    draining = asyncio.ensure_future(drain_queues(scheduler))
+    cancelled = asyncio.ensure_future(drain_cancelled.wait())
+    await asyncio.wait([draining, cancelled], timeout=settings.SHUTDOWN_DRAIN_SECONDS, return_when=FIRST_COMPLETED)
+    drained = draining.done()
+    for task in [draining, cancelled]:
         task.cancel()
+    await asyncio.gather(draining, cancelled, return_exceptions=True)
+
+    if drained:
+        logger.info(f"drained queues in {time.monotonic() - started_at:.1f}s")
+    else:
+        unsent = sum(dispatcher.queue.qsize() for dispatcher in auction_houses.dispatchers)
+        logger.warning(f"stopping with {scheduler.depth} queued event(s) and {unsent} unsent webhook message(s)")
+
+
+async def noun_listener(scheduler: PriorityScheduler):
+    global stop_requested, drain_cancelled
+    stop_requested, drain_cancelled = asyncio.Event(), asyncio.Event()
+    # the websocket handshakes run while the local state loads, the providers reuse the connections
+    connecting = asyncio.gather(
+        *(provider.client.ensure_connected() for provider in fan_in.providers), return_exceptions=True
+    )
+
+    register_metrics(scheduler)
+    metrics_exporter = MetricsExporter(summarize=summarize_metrics)
+    await metrics_exporter.start()
+    http_sessions.open()
+    for house in auction_houses:
+        house.deduplicator.open()
+    for dispatcher in auction_houses.dispatchers:
+        dispatcher.start()
+    block_cursor.load()
+    image_pipeline.load()
+    for index in auction_houses.ownership_indexes:
+        index.load()
+    restored = restore_state(state_snapshot.load())
+    scheduler.start()
+    auction_end_scheduler.start()
+    # restored auctions get their end scheduled and notes tracked without asking the chain again
+    await asyncio.gather(*(setup_auction(house, refresh=False) for house in restored))
+    await connecting
+    fan_in.start()
+
+    ingestion = asyncio.ensure_future(ingest(scheduler))
+    stopping = asyncio.ensure_future(stop_requested.wait())
+    try:
+        await asyncio.wait([ingestion, stopping], return_when=FIRST_COMPLETED)
+    finally:
+        # stop taking in new events, finish the ones already queued while the connections are still up
+        for task in [ingestion, stopping]:
+            task.cancel()
+        await asyncio.gather(ingestion, stopping, return_exceptions=True)
+        await fan_in.stop()
+        await drain(scheduler)
+
+        await scheduler.close()
+        await auction_end_scheduler.close()
+        state_snapshot.save(capture_state())
+        await fan_in.close()
+        await metrics_exporter.close()
+        await subgraph_client.close()
+        for dispatcher in auction_houses.dispatchers:
+            await dispatcher.close()
+        await http_sessions.close()
+        for house in auction_houses:
+            house.deduplicator.close()
+        block_cursor.save()
+        image_pipeline.close()
+        for index in auction_houses.ownership_indexes:
+            index.save()
+
+        # background work like note refreshes and the ownership sync
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    if not ingestion.cancelled() and ingestion.exception() is not None:
+        raise ingestion.exception()
+
+
+def shutdown(loop):
+    if stop_requested is None or not stop_requested.is_set():
+        logging.info("received stop signal, draining queues (send it again to stop right away)...")
+        if stop_requested is not None:
+            stop_requested.set()
+        return
+
+    logging.info("received second stop signal, stopping without draining...")
+    drain_cancelled.set()
 
 
-q = Queue()
 loop = asyncio.get_event_loop()
 loop.add_signal_handler(signal.SIGHUP, functools.partial(shutdown, loop))
 loop.add_signal_handler(signal.SIGTERM, functools.partial(shutdown, loop))
 loop.add_signal_handler(signal.SIGINT, functools.partial(shutdown, loop))
 
 try:
-    loop.run_until_complete(noun_listener(q))
+    loop.run_until_complete(noun_listener(create_scheduler()))
 finally:
     loop.close()
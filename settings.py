@@ -4,9 +4,51 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+
 TOKEN_CONTRACT_ADDRESS = os.getenv("TOKEN_ADDRESS", "0x9C8fF314C9Bc7F6e59A9d9225Fb22946427eDC03")
 AUCTION_HOUSE_CONTRACT_ADDRESS = os.getenv("AUCTION_HOUSE_ADDRESS", "0x830BD73E4184ceF73443C15111a1DF14e495C706")
 CLOUDINARY_URL = os.getenv("CLOUDINARY_URL")
 
 NS_WEBHOOK_URL = os.getenv("NS_WEBHOOK_URL")
+NOUNS_SUBGRAPH_URL = os.getenv("NOUNS_SUBGRAPH_URL", "https://api.thegraph.com/subgraphs/name/nounsdao/nouns-subgraph")
+NOUN_O_CLOCK_URL = os.getenv("NOUN_O_CLOCK_URL", "https://noc-app-prod.herokuapp.com")
 W3_WS_PROVIDER_URL = os.getenv("W3_WS_PROVIDER_URL")
+# extra websocket providers (comma separated) whose subscriptions are merged with the main one
+W3_WS_EXTRA_PROVIDER_URLS = [
+    url.strip() for url in os.getenv("W3_WS_EXTRA_PROVIDER_URLS", "").split(",") if url.strip()
+]
+
+HTTP_TIMEOUT_SECONDS = float(os.getenv("HTTP_TIMEOUT_SECONDS", "10"))
+HTTP_CONNECTIONS_PER_HOST = int(os.getenv("HTTP_CONNECTIONS_PER_HOST", "10"))
+
+NS_WEBHOOK_QUEUE_SIZE = int(os.getenv("NS_WEBHOOK_QUEUE_SIZE", "100"))
+# optional cap on webhook posts, off unless a rate is set. 429s are retried either way
+NS_WEBHOOK_RATE_PER_SECOND = float(os.getenv("NS_WEBHOOK_RATE_PER_SECOND", "0"))
+NS_WEBHOOK_BURST = int(os.getenv("NS_WEBHOOK_BURST", "5"))
+
+DEDUP_DB_PATH = os.getenv("DEDUP_DB_PATH")
+BLOCK_CURSOR_PATH = os.getenv("BLOCK_CURSOR_PATH")
+
+# optional directory keeping a snapshot of who holds which token, one file per token contract
+OWNERSHIP_SNAPSHOT_DIR = os.getenv("OWNERSHIP_SNAPSHOT_DIR")
+# where the first index of the token transfers starts, the Nouns token deployment by default
+OWNERSHIP_START_BLOCK = int(os.getenv("OWNERSHIP_START_BLOCK", "12985438"))
+
+# optional JSON file keeping auction state, seen events and hot caches across restarts
+STATE_SNAPSHOT_PATH = os.getenv("STATE_SNAPSHOT_PATH")
+# how long a stop signal waits for queued events and webhook messages before exiting
+SHUTDOWN_DRAIN_SECONDS = float(os.getenv("SHUTDOWN_DRAIN_SECONDS", "20"))
+
+# optional CSV file every settled auction's bids are appended to, for offline analysis
+BID_LEDGER_PATH = os.getenv("BID_LEDGER_PATH")
+
+# optional JSON file listing the auction houses to track in one process (see helpers/houses.py)
+AUCTION_HOUSES_CONFIG = os.getenv("AUCTION_HOUSES_CONFIG")
+
+# optional JSON file remembering uploaded noun images by content hash
+IMAGE_CACHE_PATH = os.getenv("IMAGE_CACHE_PATH")
+
+# local Prometheus endpoint (GET /metrics), off unless a port is set
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0")) or None
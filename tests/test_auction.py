@@ -0,0 +1,29 @@
+from helpers.auction import MAX_SETTLEMENTS, AuctionState
+
+ETH = 10**18
+
+
+def test_settlement_is_kept_after_the_next_auction_is_created():
+    state = AuctionState("0xhouse")
+    state.apply_created(700, 0, 1_000)
+    state.apply_bid(700, "0xa", 5 * ETH)
+    state.apply_settled(700, "0xa", 5 * ETH)
+    state.apply_created(701, 1_000, 2_000)
+
+    assert (state.noun_id, state.settled, state.wei_amount) == (701, False, 0)
+    assert state.settlements[700] == ("0xa", 5 * ETH)
+
+
+def test_settlement_log_behind_the_next_auction_is_kept():
+    state = AuctionState("0xhouse")
+    state.apply_created(700, 0, 1_000)
+    state.apply_created(701, 1_000, 2_000)
+    assert not state.apply_settled(700, "0xa", 5 * ETH)
+    assert state.settlements[700] == ("0xa", 5 * ETH)
+
+
+def test_only_the_latest_settlements_are_kept():
+    state = AuctionState("0xhouse")
+    for noun_id in range(MAX_SETTLEMENTS + 1):
+        state.apply_settled(noun_id, "0xa", ETH)
+    assert list(state.settlements) == list(range(1, MAX_SETTLEMENTS + 1))
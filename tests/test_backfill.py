@@ -0,0 +1,42 @@
+from helpers.backfill import BlockCursor
+
+
+def test_cursor_stays_at_the_lowest_block_still_in_flight():
+    cursor = BlockCursor(path=None)
+    first, second = cursor.track("0x64"), cursor.track(101)
+    assert (first, second) == (100, 101)
+
+    cursor.release(second)
+    assert cursor.block_number == 100
+    cursor.advance(120)
+    assert cursor.block_number == 100
+
+    cursor.release(first)
+    assert cursor.block_number == 101
+    cursor.advance(120)
+    assert cursor.block_number == 120
+
+
+def test_cursor_counts_every_log_in_a_block():
+    cursor = BlockCursor(path=None)
+    cursor.advance(99)
+    cursor.track(100)
+    cursor.track(100)
+    cursor.track(102)
+
+    cursor.release(100)
+    cursor.release(102)
+    # the cursor block itself is read again by the next backfill
+    assert cursor.block_number == 100
+    cursor.release(100)
+    assert cursor.block_number == 102
+
+
+def test_cursor_is_checkpointed_to_disk(tmp_path):
+    path = str(tmp_path / "cursor.json")
+    cursor = BlockCursor(path=path)
+    cursor.release(cursor.track(100))
+
+    restored = BlockCursor(path=path)
+    restored.load()
+    assert restored.block_number == 100
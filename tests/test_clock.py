@@ -0,0 +1,99 @@
+import asyncio
+
+from helpers.clock import AuctionEndScheduler, ChainClock
+
+KEY = ("0xhouse", 700)
+
+
+def run(coroutine):
+    return asyncio.run(asyncio.wait_for(coroutine, timeout=5))
+
+
+def test_auction_ends_once_on_the_first_block_past_its_end():
+    ended = []
+
+    async def on_end(key):
+        ended.append(key)
+
+    async def main():
+        scheduler = AuctionEndScheduler(on_end, clock=ChainClock())
+        scheduler.schedule(KEY, 1_000)
+        scheduler.on_block(999)
+        await asyncio.sleep(0.01)
+        assert ended == []
+
+        scheduler.on_block(1_000)
+        await asyncio.sleep(0.01)
+        # a late extension log for an auction that already ended doesn't end it again
+        scheduler.schedule(KEY, 1_100)
+        scheduler.on_block(1_100)
+        await asyncio.sleep(0.01)
+
+    run(main())
+    assert ended == [KEY]
+
+
+def test_auction_still_running_on_chain_is_rescheduled():
+    ended = []
+
+    async def on_end(key):
+        ended.append(key)
+        return 1_300 if len(ended) == 1 else None
+
+    async def main():
+        scheduler = AuctionEndScheduler(on_end, clock=ChainClock())
+        scheduler.schedule(KEY, 1_000)
+        scheduler.on_block(1_000)
+        await asyncio.sleep(0.01)
+        assert scheduler.deadlines == {KEY: 1_300}
+
+        scheduler.on_block(1_300)
+        await asyncio.sleep(0.01)
+        assert scheduler.deadlines == {}
+
+    run(main())
+    assert ended == [KEY, KEY]
+
+
+def test_failed_end_is_retried():
+    ended = []
+
+    async def on_end(key):
+        ended.append(key)
+        if len(ended) == 1:
+            raise ValueError("rpc error")
+
+    async def main():
+        scheduler = AuctionEndScheduler(on_end, clock=ChainClock(), retry_delay_seconds=0.01)
+        scheduler.schedule(KEY, 1_000)
+        scheduler.on_block(1_000)
+        await asyncio.sleep(0.05)
+
+    run(main())
+    assert ended == [KEY, KEY]
+
+
+def test_end_is_given_up_after_max_attempts():
+    ended = []
+
+    async def on_end(key):
+        ended.append(key)
+        raise ValueError("rpc error")
+
+    async def main():
+        scheduler = AuctionEndScheduler(on_end, clock=ChainClock(), retry_delay_seconds=0.01, max_attempts=3)
+        scheduler.schedule(KEY, 1_000)
+        scheduler.on_block(1_000)
+        await asyncio.sleep(0.1)
+
+    run(main())
+    assert ended == [KEY] * 3
+
+
+def test_clock_keeps_the_time_of_recent_blocks():
+    clock = ChainClock()
+    clock.observe({"number": hex(100), "timestamp": hex(1_000)})
+    # older blocks, e.g. fetched for a backfilled log, don't move the clock
+    clock.remember(90, 880)
+    assert (clock.block_time(100), clock.block_time(90), clock.block_time(91)) == (1_000, 880, None)
+    assert clock.block_number == 100
@@ -0,0 +1,96 @@
+from helpers.dedup import PENDING_LOG_INDEX, EventDeduplicator
+
+TX_HASH = "0xABC"
+
+
+def test_confirmed_bid_is_claimed_once():
+    deduplicator = EventDeduplicator(path=None)
+    assert deduplicator.claim_bid(700, TX_HASH, 3)
+    assert not deduplicator.claim_bid(700, TX_HASH, 3)
+    assert not deduplicator.claim_bid(700, TX_HASH.lower(), 3)
+    # another log in the same transaction is another event
+    assert deduplicator.claim_bid(700, TX_HASH, 4)
+
+
+def test_pending_bid_is_claimed_once_and_not_after_it_confirms():
+    deduplicator = EventDeduplicator(path=None)
+    assert deduplicator.claim_pending_bid(700, TX_HASH)
+    assert not deduplicator.claim_pending_bid(700, TX_HASH)
+
+    assert deduplicator.claim_bid(700, TX_HASH, 3)
+    assert not deduplicator.claim_pending_bid(700, TX_HASH)
+
+
+def test_pending_bid_seen_after_its_log_is_ignored():
+    deduplicator = EventDeduplicator(path=None)
+    assert deduplicator.claim_bid(700, TX_HASH, 3)
+    assert not deduplicator.claim_pending_bid(700, TX_HASH)
+
+
+def test_release_lets_a_bid_be_claimed_again():
+    deduplicator = EventDeduplicator(path=None)
+    assert deduplicator.claim_bid(700, TX_HASH, 3)
+    deduplicator.release_bid(700, TX_HASH, 3)
+    assert deduplicator.claim_bid(700, TX_HASH, 3)
+
+    assert deduplicator.claim_pending_bid(700, "0xdef")
+    deduplicator.release_bid(700, "0xdef")
+    assert deduplicator.claim_pending_bid(700, "0xdef")
+
+
+def test_releasing_a_pending_bid_keeps_its_confirmation():
+    deduplicator = EventDeduplicator(path=None)
+    assert deduplicator.claim_bid(700, TX_HASH, 3)
+    deduplicator.release_bid(700, TX_HASH, PENDING_LOG_INDEX)
+    assert not deduplicator.claim_pending_bid(700, TX_HASH)
+
+
+def test_oldest_auctions_are_evicted():
+    deduplicator = EventDeduplicator(path=None, max_auctions=2)
+    for noun_id in [700, 701, 702]:
+        assert deduplicator.claim_bid(noun_id, TX_HASH, 0)
+
+    assert [row[0] for row in deduplicator.export()] == [701, 701, 702, 702]
+    assert deduplicator.claim_bid(700, TX_HASH, 0)
+
+
+def test_export_and_restore_round_trip():
+    deduplicator = EventDeduplicator(path=None)
+    deduplicator.claim_bid(700, TX_HASH, 3)
+    deduplicator.claim_pending_bid(700, "0xdef")
+
+    restored = EventDeduplicator(path=None)
+    restored.restore(deduplicator.export())
+    assert restored.export() == deduplicator.export()
+    assert not restored.claim_bid(700, TX_HASH, 3)
+    assert not restored.claim_pending_bid(700, "0xdef")
+
+
+def test_seen_events_persist_per_scope(tmp_path):
+    path = str(tmp_path / "seen.db")
+    deduplicator = EventDeduplicator(path=path, scope="house-a")
+    deduplicator.open()
+    deduplicator.claim_bid(700, TX_HASH, 3)
+    deduplicator.close()
+
+    reopened = EventDeduplicator(path=path, scope="house-a")
+    reopened.open()
+    assert not reopened.claim_bid(700, TX_HASH, 3)
+    reopened.close()
+
+    other = EventDeduplicator(path=path, scope="house-b")
+    other.open()
+    assert other.claim_bid(700, TX_HASH, 3)
+    other.close()
+
+
+def test_confirmed_bid_is_written_in_one_transaction(tmp_path):
+    deduplicator = EventDeduplicator(path=str(tmp_path / "seen.db"), scope="house-a")
+    deduplicator.open()
+    statements = []
+    deduplicator._db.set_trace_callback(statements.append)
+    deduplicator.claim_bid(700, TX_HASH, 3)
+    deduplicator.close()
+
+    assert statements[0] == "BEGIN" and statements[-1] == "COMMIT"
+    assert sum(statement.startswith("INSERT") for statement in statements) == 2
@@ -0,0 +1,57 @@
+import asyncio
+
+from helpers.fanin import ProviderFanIn
+from helpers.ownership import TRANSFER_TOPIC, OwnershipIndex
+
+TOKEN = "0x9C8fF314C9Bc7F6e59A9d9225Fb22946427eDC03"
+SENDER = "0x" + "1" * 40
+RECIPIENT = "0x" + "2" * 40
+
+
+def transfer_log(removed: bool = False) -> dict:
+    return {
+        "address": TOKEN,
+        "topics": [TRANSFER_TOPIC, "0x" + "0" * 24 + SENDER[2:], "0x" + "0" * 24 + RECIPIENT[2:], hex(700)],
+        "transactionHash": "0xABC",
+        "blockNumber": hex(100),
+        "logIndex": "0x1",
+        "removed": removed,
+    }
+
+
+def published(fan_in: ProviderFanIn) -> list:
+    messages = []
+    while not fan_in._queue.empty():
+        messages.append(fan_in._queue.get_nowait())
+    return messages
+
+
+def test_duplicate_logs_are_forwarded_once():
+    async def main():
+        fan_in = ProviderFanIn([], [])
+        fan_in._queue = asyncio.Queue()
+        fan_in.publish("transfers", transfer_log())
+        fan_in.publish("transfers", transfer_log())
+        return published(fan_in)
+
+    assert len(asyncio.run(main())) == 1
+
+
+def test_reorged_transfer_rolls_back_the_owner():
+    async def main():
+        fan_in = ProviderFanIn([], [])
+        fan_in._queue = asyncio.Queue()
+        fan_in.publish("transfers", transfer_log())
+        fan_in.publish("transfers", transfer_log(removed=True))
+        fan_in.publish("transfers", transfer_log(removed=True))
+        return published(fan_in)
+
+    messages = asyncio.run(main())
+    assert [result.get("removed") for _, result in messages] == [False, True]
+
+    index = OwnershipIndex(TOKEN, snapshot_dir=None)
+    index.ready = True
+    index.apply(messages[0][1])
+    assert (index.owners[700], index.holding_count(RECIPIENT)) == (RECIPIENT, 1)
+    index.apply(messages[1][1])
+    assert (index.owners[700], index.holding_count(RECIPIENT)) == (SENDER, 0)
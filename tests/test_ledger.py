@@ -0,0 +1,90 @@
+import csv
+from decimal import Decimal
+
+from helpers.ledger import BidLedger
+
+ETH = 10**18
+
+
+def test_record_returns_bid_stats():
+    ledger = BidLedger("0xhouse", csv_path=None)
+    first = ledger.record(700, "0xA", ETH, 100)
+    assert (first.bid_count, first.bidder_bid_count, first.increase) == (1, 1, None)
+
+    ledger.record(700, "0xB", 2 * ETH, 110)
+    third = ledger.record(700, "0xa", 3 * ETH, 120)
+    assert (third.bid_count, third.bidder_bid_count, third.timestamp) == (3, 2, 120)
+    assert third.increase == 0.5
+
+
+def test_bids_that_dont_raise_the_high_bid_are_skipped():
+    ledger = BidLedger("0xhouse", csv_path=None)
+    ledger.record(700, "0xA", 2 * ETH, 100)
+    assert ledger.record(700, "0xB", 2 * ETH, 110) is None
+    assert ledger.record(700, "0xB", ETH, 110) is None
+    assert len(ledger.get(700)) == 1
+
+
+def test_high_bid_and_bidder_history():
+    ledger = BidLedger("0xhouse", csv_path=None)
+    ledger.record(700, "0xA", ETH, 100)
+    ledger.record(700, "0xB", 2 * ETH, 110)
+    ledger.record(700, "0xA", 3 * ETH, 120)
+
+    auction = ledger.get(700)
+    assert auction.high_bid == (ledger.bidder_id("0xa"), 3 * 10**9)
+    assert auction.history(ledger.bidder_id("0xA")) == [(10**9, 100), (3 * 10**9, 120)]
+    assert len(ledger.bidders) == 2
+
+
+def test_amounts_beyond_64_bits_of_wei_are_kept_in_gwei():
+    ledger = BidLedger("0xhouse", csv_path=None)
+    ledger.record(700, "0xA", 1_000 * ETH + 1, 100)
+    assert ledger.leaderboard(700) == [("0xa", Decimal(1_000))]
+
+
+def test_leaderboard_ranks_each_bidder_by_their_best_bid():
+    ledger = BidLedger("0xhouse", csv_path=None)
+    for bidder, amount in [("0xA", 1), ("0xB", 2), ("0xA", 3), ("0xC", 4), ("0xD", 5)]:
+        ledger.record(700, bidder, amount * ETH, 100)
+
+    assert ledger.leaderboard(700) == [("0xd", Decimal(5)), ("0xc", Decimal(4)), ("0xa", Decimal(3))]
+    assert ledger.leaderboard(701) == []
+
+
+def test_only_the_latest_auctions_are_kept():
+    ledger = BidLedger("0xhouse", csv_path=None, max_auctions=2)
+    for noun_id in [700, 701, 702]:
+        ledger.record(noun_id, "0xA", ETH, 100)
+    assert sorted(ledger.auctions) == [701, 702]
+
+
+def test_export_and_restore_round_trip():
+    ledger = BidLedger("0xhouse", csv_path=None)
+    ledger.record(700, "0xA", ETH, 100)
+    ledger.record(700, "0xB", 2 * ETH, 110)
+    ledger.record(701, "0xB", ETH, 200)
+
+    restored = BidLedger("0xhouse", csv_path=None)
+    restored.restore(ledger.export())
+    assert restored.export() == ledger.export()
+    assert restored.record(700, "0xB", 2 * ETH, 110) is None
+
+
+def test_settled_auction_is_appended_to_the_csv(tmp_path):
+    path = tmp_path / "bids.csv"
+    ledger = BidLedger("0xhouse", csv_path=str(path))
+    ledger.record(700, "0xA", ETH, 100)
+    ledger.record(700, "0xB", 15 * ETH // 10, 110)
+    ledger.write_csv(700)
+    ledger.record(701, "0xA", ETH, 200)
+    ledger.write_csv(701)
+
+    with open(path) as f:
+        rows = list(csv.reader(f))
+    assert rows == [
+        ["auction_house", "noun_id", "bid", "bidder", "amount_eth", "block_timestamp"],
+        ["0xhouse", "700", "1", "0xa", "1", "100"],
+        ["0xhouse", "700", "2", "0xb", "1.5", "110"],
+        ["0xhouse", "701", "1", "0xa", "1", "200"],
+    ]
@@ -0,0 +1,92 @@
+from helpers.mempool import PendingPool
+
+ETH = 10**18
+SENDER = "0xAbC0000000000000000000000000000000000001"
+
+
+def pending_tx(tx_hash: str, nonce: int = 0, sender: str = SENDER, gas_price: int = 10**10) -> dict:
+    return {"hash": tx_hash, "from": sender, "nonce": hex(nonce), "maxFeePerGas": hex(gas_price)}
+
+
+def test_bid_must_beat_the_high_bid_by_the_minimum_increment():
+    pool = PendingPool()
+    bid, _ = pool.add(pending_tx("0x1"), 700, 102 * ETH)
+    assert pool.is_material(bid, 100 * ETH)
+
+    bid, _ = pool.add(pending_tx("0x2", nonce=1), 700, 101 * ETH)
+    assert not pool.is_material(bid, 100 * ETH)
+
+
+def test_first_bid_of_an_auction_is_material():
+    pool = PendingPool()
+    bid, _ = pool.add(pending_tx("0x1"), 700, ETH)
+    assert pool.is_material(bid, 0)
+
+
+def test_bid_must_beat_what_was_already_announced_while_pending():
+    pool = PendingPool()
+    first, _ = pool.add(pending_tx("0x1", sender="0x" + "1" * 40), 700, 110 * ETH)
+    first.announced = True
+
+    lower, _ = pool.add(pending_tx("0x2", sender="0x" + "2" * 40), 700, 105 * ETH)
+    assert not pool.is_material(lower, 100 * ETH)
+    higher, _ = pool.add(pending_tx("0x3", sender="0x" + "3" * 40), 700, 115 * ETH)
+    assert pool.is_material(higher, 100 * ETH)
+
+    # bids announced on another noun don't count
+    other, _ = pool.add(pending_tx("0x4", sender="0x" + "4" * 40), 701, 5 * ETH)
+    assert pool.is_material(other, 0)
+
+
+def test_speed_up_replaces_the_bid_without_being_material():
+    pool = PendingPool()
+    bid, replaced = pool.add(pending_tx("0x1"), 700, 110 * ETH)
+    assert replaced is None
+    bid.announced = True
+
+    speedup, replaced = pool.add(pending_tx("0x2", gas_price=2 * 10**10), 700, 110 * ETH)
+    assert replaced is bid
+    assert speedup.announced
+    assert not pool.is_material(speedup, 100 * ETH, replaced)
+    assert (len(pool), pool.replaced) == (1, 1)
+
+
+def test_raised_replacement_is_material():
+    pool = PendingPool()
+    bid, _ = pool.add(pending_tx("0x1"), 700, 110 * ETH)
+    bid.announced = True
+
+    raised, replaced = pool.add(pending_tx("0x2"), 700, 120 * ETH)
+    assert not raised.announced
+    assert pool.is_material(raised, 100 * ETH, replaced)
+
+
+def test_seen_and_mined_transactions_are_not_tracked_again():
+    pool = PendingPool()
+    assert pool.add(pending_tx("0x1"), 700, ETH)[0] is not None
+    assert pool.add(pending_tx("0x1"), 700, ETH) == (None, None)
+
+    assert pool.remove_mined("0x1") is not None
+    assert pool.add(pending_tx("0x1"), 700, ETH) == (None, None)
+    assert (len(pool), pool.mined) == (0, 1)
+
+
+def test_discarded_bid_can_be_tracked_again():
+    pool = PendingPool()
+    pool.add(pending_tx("0xAB"), 700, ETH)
+    assert pool.discard("0xab") is not None
+    assert len(pool) == 0
+    assert pool.add(pending_tx("0xAB"), 700, ETH)[0] is not None
+
+
+def test_pool_is_bounded_and_expires_old_sightings():
+    pool = PendingPool(maxsize=2)
+    for nonce in range(3):
+        pool.add(pending_tx(f"0x{nonce}", nonce=nonce), 700, ETH)
+    assert (len(pool), pool.expired) == (2, 1)
+
+    pool = PendingPool(ttl_seconds=600)
+    old, _ = pool.add(pending_tx("0x1"), 700, ETH)
+    old.seen_at -= 601
+    pool.add(pending_tx("0x2", nonce=1), 700, ETH)
+    assert (len(pool), pool.expired) == (1, 1)
@@ -0,0 +1,210 @@
+import asyncio
+
+import pytest
+
+from helpers import scheduler as scheduler_module
+from helpers.scheduler import Lane, PriorityScheduler
+
+
+def create_lanes():
+    return [
+        Lane("auction", priority=0, maxsize=10),
+        Lane("bids", priority=1, maxsize=10),
+        Lane("pending", priority=2, maxsize=2, drop_oldest=True, stale_seconds=60),
+    ]
+
+
+def run(coroutine):
+    return asyncio.run(asyncio.wait_for(coroutine, timeout=5))
+
+
+def test_jobs_run_in_lane_priority_order():
+    handled = []
+
+    async def handler(payload):
+        handled.append(payload)
+
+    async def main():
+        scheduler = PriorityScheduler(handler, create_lanes(), min_workers=1)
+        scheduler.start()
+        # the worker only gets to run once everything is queued
+        await scheduler.put("pending", "pending-1")
+        await scheduler.put("bids", "bid-1")
+        await scheduler.put("auction", "created")
+        await scheduler.put("bids", "bid-2")
+        await scheduler.drain()
+        await scheduler.close()
+
+    run(main())
+    assert handled == ["created", "bid-1", "bid-2", "pending-1"]
+
+
+def test_full_drop_oldest_lane_drops_its_oldest_job():
+    handled = []
+
+    async def handler(payload):
+        handled.append(payload)
+
+    async def main():
+        scheduler = PriorityScheduler(handler, create_lanes(), min_workers=1)
+        scheduler.start()
+        for index in range(4):
+            await scheduler.put("pending", index)
+        assert scheduler.lanes_by_name["pending"].dropped == 2
+        await scheduler.drain()
+        await scheduler.close()
+
+    run(main())
+    assert handled == [2, 3]
+
+
+def test_full_lane_blocks_until_a_job_is_taken():
+    async def main():
+        scheduler = PriorityScheduler(asyncio.sleep, [Lane("bids", priority=0, maxsize=1)], min_workers=0)
+        scheduler.start()
+        await scheduler.put("bids", 0)
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(scheduler.put("bids", 0), timeout=0.05)
+        await scheduler.close()
+
+    run(main())
+
+
+def test_stale_jobs_are_dropped_before_their_first_attempt():
+    handled = []
+
+    async def handler(payload):
+        handled.append(payload)
+
+    async def main():
+        scheduler = PriorityScheduler(handler, create_lanes(), min_workers=1)
+        scheduler.start()
+        await scheduler.put("pending", "old")
+        scheduler.lanes_by_name["pending"].jobs[0].enqueued_at -= 120
+        await scheduler.put("pending", "new")
+        await scheduler.drain()
+        await scheduler.close()
+        return scheduler
+
+    scheduler = run(main())
+    assert handled == ["new"]
+    assert scheduler.lanes_by_name["pending"].dropped == 1
+
+
+def test_failed_jobs_are_retried_after_a_delay():
+    attempts = []
+
+    async def handler(payload):
+        attempts.append(asyncio.get_event_loop().time())
+        if len(attempts) == 1:
+            raise ValueError("flaky")
+
+    async def main():
+        scheduler = PriorityScheduler(handler, create_lanes(), min_workers=1, retry_delay_seconds=0.05)
+        scheduler.start()
+        await scheduler.put("bids", "bid")
+        await scheduler.drain()
+        await scheduler.close()
+        return scheduler
+
+    scheduler = run(main())
+    assert len(attempts) == 2
+    assert attempts[1] - attempts[0] >= 0.05
+    assert (scheduler.retried, scheduler.failed) == (1, 0)
+
+
+def test_retried_jobs_are_not_dropped_as_stale():
+    attempts = []
+
+    async def handler(payload):
+        attempts.append(payload)
+        if len(attempts) == 1:
+            raise ValueError("flaky")
+
+    async def main():
+        lanes = [Lane("pending", priority=0, maxsize=10, stale_seconds=0.01)]
+        scheduler = PriorityScheduler(handler, lanes, min_workers=1, retry_delay_seconds=0.05)
+        scheduler.start()
+        await scheduler.put("pending", "tx")
+        await scheduler.drain()
+        await scheduler.close()
+
+    run(main())
+    assert attempts == ["tx", "tx"]
+
+
+def test_jobs_are_given_up_after_max_attempts():
+    attempts = []
+
+    async def handler(payload):
+        attempts.append(payload)
+        raise ValueError("broken")
+
+    async def main():
+        scheduler = PriorityScheduler(handler, create_lanes(), min_workers=1, max_attempts=3, retry_delay_seconds=0.01)
+        scheduler.start()
+        await scheduler.put("bids", "bid")
+        await scheduler.drain()
+        await scheduler.close()
+        return scheduler
+
+    scheduler = run(main())
+    assert attempts == ["bid", "bid", "bid"]
+    assert (scheduler.retried, scheduler.failed) == (2, 1)
+
+
+def test_workers_scale_up_with_depth_and_idle_ones_are_cancelled(monkeypatch):
+    monkeypatch.setattr(scheduler_module, "SCALE_INTERVAL_SECONDS", 0.01)
+    running = []
+    release = None
+
+    async def handler(payload):
+        running.append(payload)
+        await release.wait()
+
+    async def main():
+        nonlocal release
+        release = asyncio.Event()
+        scheduler = PriorityScheduler(handler, create_lanes(), min_workers=1, max_workers=3)
+        scheduler.start()
+        for index in range(10):
+            await scheduler.put("bids", index)
+        await asyncio.sleep(0.1)
+        busy_workers = len(running)
+
+        release.set()
+        await scheduler.drain()
+        await asyncio.sleep(0.1)
+        idle_workers = len(scheduler._workers)
+        await scheduler.close()
+        return busy_workers, idle_workers
+
+    busy_workers, idle_workers = run(main())
+    assert busy_workers == 3
+    assert idle_workers == 1
+
+
+def test_on_done_runs_once_per_job_after_its_last_attempt():
+    done = []
+    attempts = []
+
+    async def handler(payload):
+        attempts.append(payload)
+        if payload == "broken" or len(attempts) == 1:
+            raise ValueError("flaky")
+
+    async def main():
+        scheduler = PriorityScheduler(
+            handler, create_lanes(), min_workers=1, max_attempts=2, retry_delay_seconds=0.01, on_done=done.append
+        )
+        scheduler.start()
+        await scheduler.put("bids", "flaky")
+        await scheduler.put("bids", "broken")
+        for index in range(3):
+            await scheduler.put("pending", index)
+        await scheduler.drain()
+        await scheduler.close()
+
+    run(main())
+    assert attempts.count("flaky") == 2
+    assert sorted(done, key=str) == [0, 1, 2, "broken", "flaky"]